@@ -4,3 +4,11 @@ ADMIN_EMAIL = "nocellos.app@gmail.com"
 ADMIN_EMAIL_PASSWORD = os.environ["EMAIL_PASSWORD"]
 ADMIN_EMAIL_USERNAME = "nocellos.app"
 SERVER_NAME = os.environ["SERVER_NAME"]
+
+XP_FLUSH_INTERVAL = float(os.environ.get("XP_FLUSH_INTERVAL", 5))
+XP_FLUSH_SIZE = int(os.environ.get("XP_FLUSH_SIZE", 1000))
+XP_BUFFER_MAX_SIZE = int(os.environ.get("XP_BUFFER_MAX_SIZE", 50000))
+
+REVIEW_FLUSH_INTERVAL = float(os.environ.get("REVIEW_FLUSH_INTERVAL", 1))
+REVIEW_FLUSH_SIZE = int(os.environ.get("REVIEW_FLUSH_SIZE", 5000))
+REVIEW_BUFFER_MAX_SIZE = int(os.environ.get("REVIEW_BUFFER_MAX_SIZE", 100000))
@@ -0,0 +1,322 @@
+from __future__ import annotations
+
+import codecs
+import csv
+import datetime
+import io
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import uuid
+import zipfile
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+from controllers.controller_database import ControllerDatabase
+from utils.review_event_buffer import ReviewEventRow
+from utils.scheduler import MIN_GRADE, MAX_GRADE
+
+IMPORT_FORMATS = ("csv", "tsv", "apkg")
+EXPORT_MEDIA_TYPES = {
+    "jsonl": "application/x-ndjson",
+    "csv": "text/csv",
+}
+MAX_REPORTED_ERRORS = 100
+MAX_CARD_TEXT_LENGTH = 10000
+MAX_CARD_OPERATIONS = 1000
+MAX_REVIEW_LATENCY_MS = 24 * 60 * 60 * 1000
+# Window around the time a review event is received that its reviewed_at has to be in
+MAX_REVIEW_EVENT_AGE = datetime.timedelta(days=30)
+MAX_REVIEW_EVENT_CLOCK_SKEW = datetime.timedelta(hours=1)
+
+
+class ControllerCards:
+    @staticmethod
+    def import_cards(deck_id: int, file: BinaryIO, file_format: str, has_header: bool = False) -> Dict:
+        """
+        Used for importing cards from a file into a deck.
+        The file is read row by row and copied into the database in chunks,
+        all in one transaction, so memory use does not depend on the file size
+        :param deck_id: the id of the deck
+        :param file: the uploaded file, opened in binary mode
+        :param file_format: csv, tsv or apkg (an Anki export)
+        :param has_header: if true, the first row of a csv or tsv file is skipped
+        :return: {
+            "is_successful": bool, false if nothing was imported because of a database error,
+            "imported_count": int,
+            "error_count": int,
+            "errors": the first 100 rows that were skipped [{"row": int, "error": str}],
+        }
+        """
+        errors = []
+        counts = {"imported": 0, "errors": 0}
+
+        def on_error(row_number: int, error: str):
+            counts["errors"] += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append({"row": row_number, "error": error})
+
+        if file_format == "apkg":
+            rows = ControllerCards.read_anki_rows(file)
+        else:
+            delimiter = "\t" if file_format == "tsv" else ","
+            rows = ControllerCards.read_delimited_rows(file, delimiter, has_header)
+
+        def cards() -> Iterator[Tuple[str, str]]:
+            try:
+                for row_number, fields in rows:
+                    error = ControllerCards.validate_card_fields(fields)
+
+                    if error:
+                        on_error(row_number, error)
+                        continue
+
+                    counts["imported"] += 1
+                    yield fields[0], fields[1]
+            except (ValueError, KeyError, csv.Error, zipfile.BadZipFile, sqlite3.DatabaseError) as e:
+                # Raising makes copy_cards roll back everything copied so far
+                on_error(0, f"The file could not be read: {e}")
+                raise
+
+        is_successful = ControllerDatabase.copy_cards(deck_id, cards())
+
+        return {
+            "is_successful": is_successful,
+            "imported_count": counts["imported"] if is_successful else 0,
+            "error_count": counts["errors"],
+            "errors": errors,
+        }
+
+    @staticmethod
+    def export_cards(deck_id: int, file_format: str) -> Iterator[str]:
+        """
+        Used for exporting the cards of a deck as JSON Lines or csv.
+        The cards are read and written one batch at a time,
+        so memory use does not depend on the deck size
+        :param deck_id: the id of the deck
+        :param file_format: jsonl or csv
+        :return: an iterator of chunks of the file
+        """
+        if file_format == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(("card_uuid", "front_text", "back_text"))
+            yield buffer.getvalue()
+
+            for batch in ControllerDatabase.stream_deck_cards(deck_id):
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                writer.writerows(batch)
+                yield buffer.getvalue()
+        else:
+            for batch in ControllerDatabase.stream_deck_cards(deck_id):
+                yield "".join(
+                    json.dumps({"card_uuid": card_uuid, "front_text": front_text, "back_text": back_text}) + "\n"
+                    for card_uuid, front_text, back_text in batch
+                )
+
+    @staticmethod
+    def parse_card_operations(operations_json: str) -> Optional[Tuple[List, List, List]]:
+        """
+        Used for reading the operations of a batch card mutation.
+        The operations are a JSON list of objects like
+        {"action": "create", "front_text": str, "back_text": str},
+        {"action": "edit", "card_uuid": str, "front_text": str, "back_text": str} or
+        {"action": "delete", "card_uuid": str}
+        :param operations_json: the operations as a JSON string
+        :return: tuple of created_cards, edited_cards and deleted_card_uuids
+            like ControllerDatabase.apply_card_operations takes them, or None if an operation is invalid
+        """
+        created_cards = []
+        edited_cards = []
+        deleted_card_uuids = []
+
+        try:
+            operations = json.loads(operations_json)
+        except ValueError:
+            return None
+
+        if not isinstance(operations, list) or len(operations) > MAX_CARD_OPERATIONS:
+            return None
+
+        for operation in operations:
+            if not isinstance(operation, dict):
+                return None
+
+            action = operation.get("action")
+            card_uuid = str(operation.get("card_uuid", ""))
+            fields = [operation.get("front_text"), operation.get("back_text")]
+
+            if action in ("create", "edit"):
+                if not all(isinstance(text, str) for text in fields) \
+                        or ControllerCards.validate_card_fields(fields):
+                    return None
+
+            if action in ("edit", "delete"):
+                try:
+                    card_uuid = str(uuid.UUID(card_uuid))
+                except ValueError:
+                    return None
+
+            if action == "create":
+                created_cards.append((fields[0], fields[1]))
+            elif action == "edit":
+                edited_cards.append((card_uuid, fields[0], fields[1]))
+            elif action == "delete":
+                deleted_card_uuids.append(card_uuid)
+            else:
+                return None
+
+        return created_cards, edited_cards, deleted_card_uuids
+
+    @staticmethod
+    def parse_card_grades(grades_json: str) -> Optional[Dict[str, int]]:
+        """
+        Used for reading the reviews of a study session.
+        The reviews are a JSON list of objects like {"card_uuid": str, "grade": int},
+        when a card is in the list more than once, the last grade is used
+        :param grades_json: the reviews as a JSON string
+        :return: the grade of every card by card_uuid, or None if a review is invalid
+        """
+        result = {}
+
+        try:
+            reviews = json.loads(grades_json)
+        except ValueError:
+            return None
+
+        if not isinstance(reviews, list) or len(reviews) > MAX_CARD_OPERATIONS:
+            return None
+
+        for review in reviews:
+            if not isinstance(review, dict):
+                return None
+
+            grade = review.get("grade")
+            if not isinstance(grade, int) or isinstance(grade, bool) or not MIN_GRADE <= grade <= MAX_GRADE:
+                return None
+
+            try:
+                card_uuid = str(uuid.UUID(str(review.get("card_uuid", ""))))
+            except ValueError:
+                return None
+
+            result[card_uuid] = grade
+
+        return result
+
+    @staticmethod
+    def parse_review_events(user_id: int, events_json: str) -> Optional[List[ReviewEventRow]]:
+        """
+        Used for reading a batch of review events sent by a client.
+        The events are a JSON list of objects like
+        {"card_uuid": str, "grade": int, "latency_ms": int, "reviewed_at": ISO 8601 utc time},
+        reviewed_at is the time the event was received if not given,
+        and must be at most MAX_REVIEW_EVENT_AGE old and MAX_REVIEW_EVENT_CLOCK_SKEW ahead
+        :param user_id: the id of the user who reviewed the cards
+        :param events_json: the events as a JSON string
+        :return: list of rows for ControllerDatabase.copy_review_events, or None if an event is invalid
+        """
+        result = []
+        now = datetime.datetime.utcnow()
+
+        try:
+            events = json.loads(events_json)
+        except ValueError:
+            return None
+
+        if not isinstance(events, list) or len(events) > MAX_CARD_OPERATIONS:
+            return None
+
+        for event in events:
+            if not isinstance(event, dict):
+                return None
+
+            grade = event.get("grade")
+            latency_ms = event.get("latency_ms", 0)
+            if not all(isinstance(value, int) and not isinstance(value, bool) for value in (grade, latency_ms)):
+                return None
+
+            if not MIN_GRADE <= grade <= MAX_GRADE or not 0 <= latency_ms <= MAX_REVIEW_LATENCY_MS:
+                return None
+
+            try:
+                card_uuid = str(uuid.UUID(str(event.get("card_uuid", ""))))
+                reviewed_at = datetime.datetime.fromisoformat(event["reviewed_at"]) if "reviewed_at" in event else now
+            except (ValueError, TypeError):
+                return None
+
+            if reviewed_at.tzinfo is not None:
+                reviewed_at = reviewed_at.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+
+            if not now - MAX_REVIEW_EVENT_AGE <= reviewed_at <= now + MAX_REVIEW_EVENT_CLOCK_SKEW:
+                return None
+
+            result.append((user_id, card_uuid, grade, latency_ms, reviewed_at))
+
+        return result
+
+    @staticmethod
+    def validate_card_fields(fields: List[str]) -> str:
+        """
+        Checks if a row can be made into a card
+        :param fields: the fields of the row
+        :return: the error, or an empty string if the row is valid
+        """
+        result = ""
+
+        if len(fields) < 2:
+            result = "A row needs a front and a back text"
+        elif not fields[0].strip():
+            result = "The front text is empty"
+        elif max(len(fields[0]), len(fields[1])) > MAX_CARD_TEXT_LENGTH:
+            result = f"A text is longer than {MAX_CARD_TEXT_LENGTH} characters"
+
+        return result
+
+    @staticmethod
+    def read_delimited_rows(file: BinaryIO, delimiter: str, has_header: bool = False) -> Iterator[Tuple[int, List[str]]]:
+        """
+        Used for reading a csv or tsv file one row at a time
+        :param file: the file, opened in binary mode
+        :param delimiter: the column delimiter
+        :param has_header: if true, the first row is skipped
+        :return: an iterator of row numbers and the fields of the row
+        """
+        text_file = codecs.getreader("utf-8-sig")(file)
+        reader = csv.reader(text_file, delimiter=delimiter)
+
+        for row_number, fields in enumerate(reader, start=1):
+            if has_header and row_number == 1:
+                continue
+
+            if not fields:
+                continue
+
+            yield row_number, fields
+
+    @staticmethod
+    def read_anki_rows(file: BinaryIO) -> Iterator[Tuple[int, List[str]]]:
+        """
+        Used for reading the notes of an Anki .apkg export one at a time.
+        The first two fields of every note are the front and back text
+        :param file: the .apkg file, opened in binary mode
+        :return: an iterator of note numbers and the fields of the note
+        """
+        with tempfile.TemporaryDirectory() as temp_dir:
+            collection_path = os.path.join(temp_dir, "collection")
+
+            with zipfile.ZipFile(file) as apkg:
+                names = apkg.namelist()
+                collection_name = "collection.anki21" if "collection.anki21" in names else "collection.anki2"
+
+                with apkg.open(collection_name) as collection, open(collection_path, "wb") as collection_copy:
+                    shutil.copyfileobj(collection, collection_copy)
+
+            conn = sqlite3.connect(collection_path)
+            try:
+                for row_number, (fields, ) in enumerate(conn.execute("SELECT flds FROM notes ORDER BY id"), start=1):
+                    yield row_number, fields.split("\x1f")
+            finally:
+                conn.close()
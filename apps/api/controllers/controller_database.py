@@ -1,19 +1,991 @@
+import csv
 import datetime
-from typing import List, Dict
+import inspect
+import io
+import uuid
+from itertools import islice
+from os import environ
+from typing import List, Dict, Optional, Tuple, Iterable, Iterator
 
-from models.card import Card
-from models.deck import Deck
+from psycopg2.extras import execute_values
+
+from models.card import Card, CardRow
+from models.deck import Deck, DeckRow
 from models.friend_request import FriendRequest
 from models.label import Label
+from models.review_state import ReviewState
 from models.study_set import StudySet
 from models.token import Token
 from models.user import User
 from models.xp import Xp
 from utils.common_utils import CommonUtils
+from utils.identity_map import IdentityMap
+from utils.pagination import Pagination, MAX_PAGE_SIZE
+from utils.query_registry import QueryRegistry
+from utils.review_event_buffer import ReviewEventRow
+from utils.scheduler import Scheduler, DEFAULT_EASE_FACTOR
+from utils.tracer import Tracer
+from utils.ttl_cache import TtlCache
 from loguru import logger
 
+LEADER_BOARD_SIZE = 50
+
+USER_SELECT_STR = "SELECT " \
+                  "   user_id, " \
+                  "   user_uuid, " \
+                  "   user_name, " \
+                  "   user_email, " \
+                  "   hashed_password, " \
+                  "   password_salt, " \
+                  "   email_verified, " \
+                  "   random_id, " \
+                  "   modified, " \
+                  "   created, " \
+                  "   is_deleted " \
+                  "FROM users "
+
+DECK_SELECT_STR = "SELECT " \
+                  "   deck_id, " \
+                  "   deck_name, " \
+                  "   deck_uuid, " \
+                  "   created, " \
+                  "   modified, " \
+                  "   is_deleted, " \
+                  "   creator_user_id, " \
+                  "   is_in_set, " \
+                  "   is_public " \
+                  "FROM decks "
+
+CARD_SELECT_STR = "SELECT " \
+                  "   card_id, " \
+                  "   front_text, " \
+                  "   back_text, " \
+                  "   card_uuid, " \
+                  "   created, " \
+                  "   modified, " \
+                  "   is_deleted, " \
+                  "   deck_deck_id " \
+                  "FROM cards "
+
+STUDY_SET_SELECT_STR = "SELECT " \
+                       "   study_set_id, " \
+                       "   creator_user_id, " \
+                       "   created, " \
+                       "   modified, " \
+                       "   is_deleted, " \
+                       "   study_set_name, " \
+                       "   is_public," \
+                       "   study_set_uuid " \
+                       "FROM study_sets "
+
+TOKEN_SELECT_STR = "SELECT token_id, token_uuid, user_user_id, created, is_deleted " \
+                   "FROM tokens "
+
+FRIEND_REQUEST_SELECT_STR = "SELECT " \
+                            "   friend_request_id, " \
+                            "   sender_user_id, " \
+                            "   friend_request_uuid, " \
+                            "   receiver_user_id, " \
+                            "   is_accepted, " \
+                            "   modified, " \
+                            "   created, " \
+                            "   is_deleted " \
+                            "FROM friend_requests "
+
+LABEL_SELECT_STR = "SELECT " \
+                   "   label_id, " \
+                   "   label_name, " \
+                   "   modified, " \
+                   "   created, " \
+                   "   is_deleted " \
+                   "FROM labels "
+
+# The hottest lookups, prepared once per pooled connection
+QueryRegistry.register(
+    "user_by_id",
+    USER_SELECT_STR +
+    "WHERE user_id = %(user_id)s "
+    "AND is_deleted = false "
+)
+QueryRegistry.register(
+    "user_by_uuid",
+    USER_SELECT_STR +
+    "WHERE user_uuid = %(user_uuid)s "
+    "AND is_deleted = false "
+)
+QueryRegistry.register(
+    "user_by_email",
+    USER_SELECT_STR +
+    "WHERE user_email = %(email)s "
+    "AND is_deleted = false "
+)
+QueryRegistry.register(
+    "user_id_by_uuid",
+    "SELECT user_id "
+    "FROM users "
+    "WHERE user_uuid = %(user_uuid)s "
+    "AND is_deleted = false "
+)
+QueryRegistry.register(
+    "user_id_by_token_uuid",
+    "SELECT u.user_id "
+    "FROM users as u "
+    "INNER JOIN tokens as t "
+    "ON t.user_user_id = u.user_id "
+    "WHERE t.token_uuid = %(token_uuid)s "
+    "AND u.is_deleted = false "
+    "AND t.is_deleted = false "
+)
+QueryRegistry.register(
+    "deck_by_id",
+    DECK_SELECT_STR +
+    "WHERE deck_id = %(deck_id)s "
+    "AND is_deleted = false "
+)
+QueryRegistry.register(
+    "deck_by_uuid",
+    DECK_SELECT_STR +
+    "WHERE deck_uuid = %(deck_uuid)s "
+    "AND is_deleted = false "
+)
+QueryRegistry.register(
+    "card_by_id",
+    CARD_SELECT_STR +
+    "WHERE card_id = %(card_id)s "
+    "AND is_deleted = false "
+)
+QueryRegistry.register(
+    "card_by_uuid",
+    CARD_SELECT_STR +
+    "WHERE card_uuid = %(card_uuid)s "
+    "AND is_deleted = false "
+)
+QueryRegistry.register(
+    "study_set_by_id",
+    STUDY_SET_SELECT_STR +
+    "WHERE study_set_id = %(study_set_id)s "
+    "AND is_deleted = false "
+)
+QueryRegistry.register(
+    "study_set_by_uuid",
+    STUDY_SET_SELECT_STR +
+    "WHERE study_set_uuid = %(study_set_uuid)s "
+    "AND is_deleted = false "
+)
+
+# The other lookups by id, uuid or name
+QueryRegistry.register(
+    "token_by_id",
+    TOKEN_SELECT_STR +
+    "WHERE token_id = %(token_id)s "
+    "AND is_deleted = false "
+)
+QueryRegistry.register(
+    "token_by_uuid",
+    TOKEN_SELECT_STR +
+    "WHERE token_uuid = %(token_uuid)s "
+    "AND is_deleted = false "
+)
+QueryRegistry.register(
+    "friend_request_by_id",
+    FRIEND_REQUEST_SELECT_STR +
+    "WHERE friend_request_id = %(friend_request_id)s "
+    "AND is_deleted = false "
+)
+QueryRegistry.register(
+    "friend_request_by_uuid",
+    FRIEND_REQUEST_SELECT_STR +
+    "WHERE friend_request_uuid = %(friend_request_uuid)s "
+    "AND is_deleted = false "
+)
+QueryRegistry.register(
+    "friend_request_id_by_uuid",
+    "SELECT friend_request_id "
+    "FROM friend_requests "
+    "WHERE friend_request_uuid = %(friend_request_uuid)s "
+    "AND is_deleted = false "
+)
+QueryRegistry.register(
+    "label_by_id",
+    LABEL_SELECT_STR +
+    "WHERE label_id = %(label_id)s "
+    "AND is_deleted = false "
+)
+QueryRegistry.register(
+    "label_by_name",
+    LABEL_SELECT_STR +
+    "WHERE label_name = %(label_name)s "
+    "AND is_deleted = false "
+)
+
+
+def user_from_row(row: Tuple) -> User:
+    """
+    Used for making a User from a row of USER_SELECT_STR
+    :param row: the row
+    :return: a User model
+    """
+    (
+        user_id,
+        user_uuid,
+        user_name,
+        user_email,
+        hashed_password,
+        password_salt,
+        email_verified,
+        random_id,
+        modified,
+        created,
+        is_deleted
+    ) = row
+
+    return User(
+        user_id=user_id,
+        user_uuid=str(user_uuid),
+        user_name=user_name,
+        user_email=user_email,
+        hashed_password=hashed_password,
+        password_salt=password_salt,
+        email_verified=email_verified,
+        random_id=random_id,
+        modified=modified,
+        created=created,
+        is_deleted=is_deleted,
+    )
+
+
+def study_set_from_row(row: Tuple) -> StudySet:
+    """
+    Used for making a StudySet from a row of STUDY_SET_SELECT_STR
+    :param row: the row
+    :return: a StudySet model
+    """
+    (
+        study_set_id,
+        creator_user_id,
+        created,
+        modified,
+        is_deleted,
+        study_set_name,
+        is_public,
+        study_set_uuid,
+    ) = row
+
+    return StudySet(
+        study_set_id=study_set_id,
+        creator_user_id=creator_user_id,
+        created=created,
+        modified=modified,
+        is_deleted=is_deleted,
+        study_set_name=study_set_name,
+        is_public=is_public,
+        study_set_uuid=study_set_uuid,
+    )
+
+
+def cached_token_user_id(token_uuid: str) -> Tuple[str, Optional[int]]:
+    """
+    Used by both database layers before they look up the user of a token.
+    Tokens that are not uuids are cached as unknown without a query
+    :param token_uuid: the token, with or without the Bearer prefix
+    :return: tuple of the token_uuid and the cached id of its user, None if it has to be looked up
+    """
+    token_uuid = token_uuid.replace("Bearer ", "")
+
+    cached_user_id = ControllerDatabase.token_cache.get(token_uuid)
+    if cached_user_id is not None:
+        return token_uuid, cached_user_id
+
+    try:
+        uuid.UUID(token_uuid)
+    except ValueError:
+        cache_token_user_id(token_uuid, 0)
+        return token_uuid, 0
+
+    return token_uuid, None
+
+
+def cache_token_user_id(token_uuid: str, user_id: int) -> None:
+    """
+    Used by both database layers after they looked up the user of a token.
+    Unknown tokens are cached for token_cache_negative_ttl
+    :param token_uuid: the token
+    :param user_id: the id of the user, 0 if the token is not valid
+    """
+    if user_id:
+        ControllerDatabase.token_cache.set(token_uuid, user_id)
+    else:
+        ControllerDatabase.token_cache.set(token_uuid, user_id, ttl=ControllerDatabase.token_cache_negative_ttl)
+
+
+def searched_user_from_row(row: Tuple) -> User:
+    """
+    Used for making a User from a row of the user searches.
+    The rows have user_id, user_uuid, user_name, random_id and, except for the typeahead, created
+    :param row: the row
+    :return: a User model
+    """
+    return User(**dict(zip(("user_id", "user_uuid", "user_name", "random_id", "created"), row)))
+
+
+def friend_request_from_row(row: Tuple) -> FriendRequest:
+    """
+    Used for making a FriendRequest from a row of FRIEND_REQUEST_SELECT_STR
+    :param row: the row
+    :return: a FriendRequest model
+    """
+    (
+        friend_request_id,
+        sender_user_id,
+        friend_request_uuid,
+        receiver_user_id,
+        is_accepted,
+        modified,
+        created,
+        is_deleted,
+    ) = row
+
+    return FriendRequest(
+        friend_request_id=friend_request_id,
+        friend_request_uuid=friend_request_uuid,
+        sender_user_id=sender_user_id,
+        receiver_user_id=receiver_user_id,
+        is_accepted=is_accepted,
+        modified=modified,
+        created=created,
+        is_deleted=is_deleted,
+    )
+
+
+def labels_by_id_from_rows(rows: List[Tuple]) -> Dict[int, List[Label]]:
+    """
+    Used for grouping the rows of decks_labels_query or study_sets_labels_query
+    :param rows: the rows, the first column is the id of the deck or study_set
+    :return: A dictionary of deck or study_set ids and their labels
+    """
+    labels = {}
+
+    for owner_id, label_id, label_name, modified, created, is_deleted in rows:
+        new_label = Label(
+            label_id=label_id,
+            label_name=label_name,
+            modified=modified,
+            created=created,
+            is_deleted=is_deleted,
+        )
+        labels.setdefault(owner_id, []).append(new_label)
+
+    return labels
+
+
+# The queries of the methods that ControllerDatabase and AsyncControllerDatabase both implement.
+# Each returns the query and its parameters, so the two layers always run the same sql
+
+#  Queries for users table
+def searched_users_query(search_phrase: str, cursor: str = "", page_size: int = 10) -> Tuple[str, dict]:
+    parameters = Pagination.keyset_parameters(cursor, page_size)
+    parameters["search_phrase"] = search_phrase
+
+    return (
+        "SELECT user_id, user_uuid, user_name, random_id, created "
+        "FROM users "
+        "WHERE (user_name = %(search_phrase)s "
+        "OR user_email = %(search_phrase)s) "
+        "AND is_deleted = false "
+        f"{Pagination.keyset_query_str('created', 'user_id', cursor)}"
+        "ORDER BY created, user_id "
+        "LIMIT %(page_size)s ",
+        parameters
+    )
+
+
+def ranked_users_query(search_phrase: str, page_size: int = 10) -> Tuple[str, dict]:
+    return (
+        "SELECT user_id, user_uuid, user_name, random_id, created "
+        "FROM users "
+        "WHERE (lower(user_name) %% lower(%(search_phrase)s) "
+        "OR lower(user_name) COLLATE \"C\" LIKE %(name_prefix)s "
+        "OR user_email = %(search_phrase)s) "
+        "AND is_deleted = false "
+        "ORDER BY "
+        "   (user_email = %(search_phrase)s OR lower(user_name) = lower(%(search_phrase)s)) DESC, "
+        "   lower(user_name) COLLATE \"C\" LIKE %(name_prefix)s DESC, "
+        "   similarity(lower(user_name), lower(%(search_phrase)s)) DESC, "
+        "   user_id "
+        "LIMIT %(page_size)s ",
+        {
+            "search_phrase": search_phrase,
+            "name_prefix": CommonUtils.like_prefix(search_phrase.lower()),
+            "page_size": Pagination.page_size(page_size),
+        }
+    )
+
+
+def typeahead_users_query(name_prefix: str, limit: int = 8) -> Tuple[str, dict]:
+    return (
+        "SELECT user_id, user_uuid, user_name, random_id "
+        "FROM users "
+        "WHERE lower(user_name) COLLATE \"C\" LIKE %(name_prefix)s "
+        "AND is_deleted = false "
+        "ORDER BY lower(user_name) COLLATE \"C\", user_id "
+        "LIMIT %(limit)s ",
+        {
+            "name_prefix": CommonUtils.like_prefix(name_prefix.lower()),
+            "limit": min(limit, MAX_PAGE_SIZE),
+        }
+    )
+
+
+#  Queries for friend_requests table
+def insert_friend_request_query(friend_request: FriendRequest) -> Tuple[str, dict]:
+    return (
+        "INSERT INTO friend_requests "
+        "(sender_user_id, receiver_user_id) "
+        "values (%(sender_user_id)s, %(receiver_user_id)s) ",
+        friend_request.to_dict()
+    )
+
+
+def delete_friend_request_query(friend_request: FriendRequest) -> Tuple[str, dict]:
+    return (
+        "UPDATE friend_requests "
+        "SET is_deleted = true "
+        "WHERE (friend_request_id = %(friend_request_id)s "
+        "AND is_deleted = false) ",
+        friend_request.to_dict()
+    )
+
+
+def accept_friend_request_query(friend_request: FriendRequest) -> Tuple[str, dict]:
+    return (
+        "UPDATE friend_requests "
+        "SET is_accepted = true "
+        "WHERE (friend_request_id = %(friend_request_id)s "
+        "AND is_deleted = false) ",
+        friend_request.to_dict()
+    )
+
+
+def user_friend_requests_query(
+        user_id: int,
+        is_accepted: bool,
+        cursor: str = "",
+        page_size: int = None,
+) -> Tuple[str, dict]:
+    parameters = Pagination.keyset_parameters(cursor, page_size)
+    parameters.update({
+        "user_id": user_id,
+        "is_accepted": is_accepted,
+    })
+
+    return (
+        "SELECT "
+        "   f_r.friend_request_id, "
+        "   f_r.sender_user_id, "
+        "   f_r.receiver_user_id, "
+        "   f_r.is_accepted, "
+        "   f_r.modified, "
+        "   f_r.created, "
+        "   f_r.is_deleted, "
+        "   f_r.friend_request_uuid, "
+        "   sender.user_uuid, "
+        "   receiver.user_uuid "
+        "FROM friend_requests AS f_r "
+        "INNER JOIN users AS sender "
+        "ON sender.user_id = f_r.sender_user_id "
+        "AND sender.is_deleted = false "
+        "INNER JOIN users AS receiver "
+        "ON receiver.user_id = f_r.receiver_user_id "
+        "AND receiver.is_deleted = false "
+        "WHERE (f_r.sender_user_id = %(user_id)s "
+        "OR f_r.receiver_user_id = %(user_id)s) "
+        "AND f_r.is_deleted = false "
+        "AND f_r.is_accepted = %(is_accepted)s "
+        f"{Pagination.keyset_query_str('f_r.created', 'f_r.friend_request_id', cursor)}"
+        "ORDER BY f_r.created, f_r.friend_request_id "
+        "LIMIT %(page_size)s ",
+        parameters
+    )
+
+
+def user_friend_request_from_row(row: Tuple) -> FriendRequest:
+    """
+    Used for making a FriendRequest from a row of user_friend_requests_query
+    :param row: the row
+    :return: a FriendRequest model with the uuids of the sender and receiver
+    """
+    (
+        friend_request_id,
+        sender_user_id,
+        receiver_user_id,
+        is_accepted,
+        modified,
+        created,
+        is_deleted,
+        friend_request_uuid,
+        sender_user_uuid,
+        receiver_user_uuid,
+    ) = row
+
+    return FriendRequest(
+        friend_request_id=friend_request_id,
+        sender_user_id=sender_user_id,
+        receiver_user_id=receiver_user_id,
+        is_accepted=is_accepted,
+        modified=modified,
+        created=created,
+        is_deleted=is_deleted,
+        friend_request_uuid=friend_request_uuid,
+        sender_user_uuid=sender_user_uuid,
+        receiver_user_uuid=receiver_user_uuid,
+    )
+
+
+#  Queries for decks table
+def user_decks_query(
+        user_id: int,
+        is_owner: bool = False,
+        cursor: str = "",
+        page_size: int = None,
+) -> Tuple[str, dict]:
+    parameters = Pagination.keyset_parameters(cursor, page_size)
+    parameters["user_id"] = user_id
+    parameters["public_only"] = not is_owner
+
+    return (
+        "SELECT "
+        "   deck_id, "
+        "   deck_name, "
+        "   deck_uuid, "
+        "   d.created, "
+        "   d.modified, "
+        "   d.is_deleted, "
+        "   creator_user_id, "
+        "   is_in_set, "
+        "   is_public, "
+        "   study_set_study_set_id, "
+        "   ("
+        "       SELECT COUNT(*) "
+        "       FROM cards as c "
+        "       WHERE c.deck_deck_id = d.deck_id "
+        "       AND c.is_deleted = false"
+        "   ) as card_count "
+        "FROM decks as d "
+        "LEFT JOIN decks_in_users as d_in_u "
+        "ON d_in_u.deck_deck_id = d.deck_id "
+        "WHERE ((d_in_u.user_user_id = %(user_id)s "
+        "AND d_in_u.is_deleted = false)"
+        "OR (d.creator_user_id = %(user_id)s))"
+        "AND d.is_deleted = false "
+        "AND (d.is_public OR NOT %(public_only)s) "
+        f"{Pagination.keyset_query_str('d.created', 'd.deck_id', cursor)}"
+        "ORDER BY d.created, d.deck_id "
+        "LIMIT %(page_size)s ",
+        parameters
+    )
+
+
+#  Queries for cards table
+def insert_card_query(card: Card) -> Tuple[str, dict]:
+    return (
+        "INSERT INTO cards "
+        "(front_text, back_text, deck_deck_id) "
+        "values (%(front_text)s, %(back_text)s, %(deck_deck_id)s) "
+        "RETURNING card_id ",
+        {
+            "front_text": card.front_text,
+            "back_text": card.back_text,
+            "deck_deck_id": card.deck_deck_id,
+        }
+    )
+
+
+def deck_cards_query(deck_id: int, cursor: str = "", page_size: int = None) -> Tuple[str, dict]:
+    parameters = Pagination.keyset_parameters(cursor, page_size)
+    parameters["deck_deck_id"] = deck_id
+
+    return (
+        "SELECT "
+        "   card_id, "
+        "   front_text, "
+        "   back_text, "
+        "   card_uuid, "
+        "   created, "
+        "   modified, "
+        "   is_deleted, "
+        "   deck_deck_id "
+        "FROM cards "
+        "WHERE deck_deck_id = %(deck_deck_id)s "
+        "AND is_deleted = false "
+        f"{Pagination.keyset_query_str('created', 'card_id', cursor)}"
+        "ORDER BY created, card_id "
+        "LIMIT %(page_size)s ",
+        parameters
+    )
+
+
+def delete_card_query(card: Card) -> Tuple[str, dict]:
+    return (
+        "UPDATE cards "
+        "SET is_deleted = true "
+        "WHERE (card_id = %(card_id)s AND is_deleted = false) ",
+        {"card_id": card.card_id}
+    )
+
+
+def edit_card_query(card: Card) -> Tuple[str, dict]:
+    return (
+        "UPDATE cards "
+        "SET front_text = %(front_text)s, back_text = %(back_text)s "
+        "WHERE card_uuid = %(card_uuid)s "
+        "OR card_id = %(card_id)s "
+        "RETURNING card_id, front_text, back_text, card_uuid, created, modified, is_deleted, deck_deck_id ",
+        {
+            "front_text": card.front_text,
+            "back_text": card.back_text,
+            "card_uuid": card.card_uuid,
+            "card_id": card.card_id,
+        }
+    )
+
+
+def create_cards_query(deck_id: int, created_cards: List[Tuple[str, str]]) -> Tuple[str, dict]:
+    return (
+        "INSERT INTO cards "
+        "(front_text, back_text, deck_deck_id) "
+        "SELECT front_text, back_text, %(deck_id)s "
+        "FROM unnest(%(front_texts)s::text[], %(back_texts)s::text[]) "
+        "   WITH ORDINALITY AS new_cards(front_text, back_text, position) "
+        "ORDER BY position "
+        "RETURNING card_uuid ",
+        {
+            "deck_id": deck_id,
+            "front_texts": [front_text for front_text, _ in created_cards],
+            "back_texts": [back_text for _, back_text in created_cards],
+        }
+    )
+
+
+def edit_cards_query(deck_id: int, edited_cards: List[Tuple[str, str, str]]) -> Tuple[str, dict]:
+    return (
+        "UPDATE cards "
+        "SET front_text = edited_cards.front_text, back_text = edited_cards.back_text "
+        "FROM unnest(%(card_uuids)s::uuid[], %(front_texts)s::text[], %(back_texts)s::text[]) "
+        "   AS edited_cards(card_uuid, front_text, back_text) "
+        "WHERE cards.card_uuid = edited_cards.card_uuid "
+        "AND cards.deck_deck_id = %(deck_id)s "
+        "AND cards.is_deleted = false "
+        "RETURNING cards.card_id, cards.card_uuid ",
+        {
+            "deck_id": deck_id,
+            "card_uuids": [card_uuid for card_uuid, _, _ in edited_cards],
+            "front_texts": [front_text for _, front_text, _ in edited_cards],
+            "back_texts": [back_text for _, _, back_text in edited_cards],
+        }
+    )
+
+
+def delete_cards_query(deck_id: int, deleted_card_uuids: List[str]) -> Tuple[str, dict]:
+    return (
+        "UPDATE cards "
+        "SET is_deleted = true "
+        "WHERE card_uuid = ANY(%(card_uuids)s::uuid[]) "
+        "AND deck_deck_id = %(deck_id)s "
+        "AND is_deleted = false "
+        "RETURNING card_id, card_uuid ",
+        {
+            "deck_id": deck_id,
+            "card_uuids": list(deleted_card_uuids),
+        }
+    )
+
+
+#  Queries for card_review_states table
+def due_cards_query(user_id: int, deck_id: int, limit: int = 20, now: datetime.datetime = None) -> Tuple[str, dict]:
+    # The second part only runs when there are fewer due cards than the limit
+    return (
+        "(SELECT "
+        "   c.card_id, "
+        "   c.front_text, "
+        "   c.back_text, "
+        "   c.card_uuid, "
+        "   c.created, "
+        "   c.modified, "
+        "   c.is_deleted, "
+        "   c.deck_deck_id "
+        "FROM card_review_states r "
+        "JOIN cards c ON c.card_id = r.card_card_id AND c.is_deleted = false "
+        "WHERE r.user_user_id = %(user_id)s "
+        "AND r.deck_deck_id = %(deck_id)s "
+        "AND r.due <= %(now)s "
+        "ORDER BY r.due "
+        "LIMIT %(limit)s) "
+        "UNION ALL "
+        "(SELECT "
+        "   c.card_id, "
+        "   c.front_text, "
+        "   c.back_text, "
+        "   c.card_uuid, "
+        "   c.created, "
+        "   c.modified, "
+        "   c.is_deleted, "
+        "   c.deck_deck_id "
+        "FROM cards c "
+        "WHERE c.deck_deck_id = %(deck_id)s "
+        "AND c.is_deleted = false "
+        "AND NOT EXISTS ( "
+        "   SELECT 1 FROM card_review_states r "
+        "   WHERE r.user_user_id = %(user_id)s AND r.card_card_id = c.card_id "
+        ") "
+        "ORDER BY c.created, c.card_id "
+        "LIMIT %(limit)s) "
+        "LIMIT %(limit)s ",
+        {
+            "user_id": user_id,
+            "deck_id": deck_id,
+            "limit": min(max(limit, 1), MAX_PAGE_SIZE),
+            "now": now or datetime.datetime.utcnow(),
+        }
+    )
+
+
+#  Queries for study_sets table
+def user_study_sets_query(
+        user_id: int,
+        is_owner: bool = False,
+        cursor: str = "",
+        page_size: int = None,
+) -> Tuple[str, dict]:
+    parameters = Pagination.keyset_parameters(cursor, page_size)
+    parameters["user_id"] = user_id
+    parameters["public_only"] = not is_owner
+
+    return (
+        "SELECT "
+        "   s.study_set_id, "
+        "   s.creator_user_id, "
+        "   s.created, "
+        "   s.modified, "
+        "   s.is_deleted, "
+        "   s.study_set_name, "
+        "   s.is_public, "
+        "   s.study_set_uuid, "
+        "   ("
+        "       SELECT COUNT(*) "
+        "       FROM decks as d "
+        "       WHERE d.study_set_study_set_id = s.study_set_id "
+        "       AND d.is_deleted = false"
+        "   ) as deck_count "
+        "FROM study_sets as s "
+        "LEFT JOIN study_sets_in_users as s_in_u "
+        "ON s_in_u.study_set_study_set_id = s.study_set_id "
+        "WHERE ((s_in_u.user_user_id = %(user_id)s "
+        "AND s_in_u.is_deleted = false)"
+        "OR (s.creator_user_id = %(user_id)s))"
+        "AND s.is_deleted = false "
+        "AND (s.is_public OR NOT %(public_only)s) "
+        f"{Pagination.keyset_query_str('s.created', 's.study_set_id', cursor)}"
+        "ORDER BY s.created, s.study_set_id "
+        "LIMIT %(page_size)s ",
+        parameters
+    )
+
+
+def user_study_set_from_row(row: Tuple) -> StudySet:
+    """
+    Used for making a StudySet from a row of user_study_sets_query
+    :param row: the row, a row of STUDY_SET_SELECT_STR and the deck count
+    :return: a StudySet model with its deck_count
+    """
+    study_set = study_set_from_row(row[:-1])
+    study_set.deck_count = row[-1]
+
+    return study_set
+
+
+#  Queries for labels table
+def decks_labels_query(deck_ids: List[int]) -> Tuple[str, dict]:
+    return (
+        "SELECT DISTINCT deck_deck_id, label_id, label_name, l.modified, l.created, l.is_deleted "
+        "FROM labels AS l "
+        "INNER JOIN labels_in_decks AS l_in_d "
+        "ON l.label_id = l_in_d.label_label_id "
+        "WHERE deck_deck_id = ANY(%(deck_ids)s) "
+        "AND l_in_d.is_deleted = false ",
+        {"deck_ids": deck_ids}
+    )
+
+
+def study_sets_labels_query(study_set_ids: List[int]) -> Tuple[str, dict]:
+    return (
+        "SELECT DISTINCT study_set_study_set_id, label_id, label_name, l.modified, l.created, l.is_deleted "
+        "FROM labels AS l "
+        "INNER JOIN labels_in_study_sets AS l_in_s "
+        "ON l.label_id = l_in_s.label_label_id "
+        "WHERE study_set_study_set_id = ANY(%(study_set_ids)s) "
+        "AND l_in_s.is_deleted = false ",
+        {"study_set_ids": study_set_ids}
+    )
+
+
+#  Queries for xp table
+def add_users_xp_query(xp_counts: Dict[Tuple[int, datetime.date], int]) -> Tuple[str, dict]:
+    return (
+        "WITH new_xp (user_user_id, xp_date, xp_count) AS ("
+        "   SELECT * FROM unnest(%(user_ids)s::integer[], %(xp_dates)s::date[], %(xp_counts)s::integer[])"
+        "), "
+        "day_xp AS ("
+        "   INSERT INTO xp "
+        "   (user_user_id, xp_count, xp_date) "
+        "   SELECT user_user_id, xp_count, xp_date "
+        "   FROM new_xp "
+        "   ON CONFLICT (user_user_id, xp_date) WHERE is_deleted = false "
+        "   DO UPDATE SET xp_count = xp.xp_count + EXCLUDED.xp_count, modified = now() "
+        ") "
+        "INSERT INTO xp_rollups "
+        "(user_user_id, period, period_start, xp_count) "
+        "SELECT user_user_id, 'total', '-infinity'::DATE, SUM(xp_count) "
+        "FROM new_xp "
+        "GROUP BY user_user_id "
+        "UNION ALL "
+        "SELECT user_user_id, 'week', date_trunc('week', xp_date)::DATE, SUM(xp_count) "
+        "FROM new_xp "
+        "GROUP BY user_user_id, date_trunc('week', xp_date)::DATE "
+        "UNION ALL "
+        "SELECT user_user_id, 'day', xp_date, SUM(xp_count) "
+        "FROM new_xp "
+        "GROUP BY user_user_id, xp_date "
+        "ON CONFLICT (user_user_id, period, period_start) "
+        "DO UPDATE SET xp_count = xp_rollups.xp_count + EXCLUDED.xp_count, modified = now() ",
+        {
+            "user_ids": [user_id for user_id, _ in xp_counts],
+            "xp_dates": [day for _, day in xp_counts],
+            "xp_counts": list(xp_counts.values()),
+        }
+    )
+
+
+def user_total_xp_query(user_id: int) -> Tuple[str, dict]:
+    return (
+        "SELECT xp_count "
+        "FROM xp_rollups "
+        "WHERE user_user_id = %(user_id)s "
+        "AND period = 'total' ",
+        {"user_id": user_id}
+    )
+
+
+def user_xp_in_timeframe_query(
+        user_id: int,
+        start_date: datetime.date,
+        end_date: datetime.date,
+) -> Tuple[str, dict]:
+    return (
+        "SELECT xp_id, xp_date, created, xp_count "
+        "FROM xp "
+        "WHERE user_user_id = %(user_id)s "
+        "AND xp_date >= %(start_date)s "
+        "AND xp_date <= %(end_date)s "
+        "AND is_deleted = false ",
+        {
+            "user_id": user_id,
+            "start_date": start_date,
+            "end_date": end_date,
+        }
+    )
+
+
+def xp_from_row(row: Tuple) -> Xp:
+    """
+    Used for making an Xp from a row of user_xp_in_timeframe_query
+    :param row: the row
+    :return: an Xp model
+    """
+    xp_id, xp_date, created, xp_count = row
+
+    return Xp(
+        xp_id=xp_id,
+        xp_date=xp_date,
+        created=created,
+        xp_count=xp_count,
+    )
+
+
+def leader_board_query(
+        user: User,
+        limit: int = LEADER_BOARD_SIZE,
+        pending_user_ids: List[int] = None,
+) -> Tuple[str, dict]:
+    now = datetime.datetime.now()
+    week_start = now.date() - datetime.timedelta(days=now.weekday())
+
+    return (
+        "WITH leader_board_users AS ("
+        "   SELECT receiver_user_id AS user_id "
+        "   FROM friend_requests "
+        "   WHERE sender_user_id = %(user_id)s "
+        "   UNION "
+        "   SELECT sender_user_id AS user_id "
+        "   FROM friend_requests "
+        "   WHERE receiver_user_id = %(user_id)s "
+        "   UNION "
+        "   SELECT %(user_id)s AS user_id"
+        "), ranked_users AS ("
+        "   SELECT "
+        "       u.user_id, "
+        "       u.user_name, "
+        "       u.user_uuid, "
+        "       u.random_id, "
+        "       COALESCE(x_r.xp_count, 0) AS xp_count, "
+        "       ROW_NUMBER() OVER (ORDER BY COALESCE(x_r.xp_count, 0) DESC, u.user_id) AS position "
+        "   FROM leader_board_users AS l_b_u "
+        "   INNER JOIN users AS u "
+        "   ON u.user_id = l_b_u.user_id "
+        "   LEFT JOIN xp_rollups AS x_r "
+        "   ON x_r.user_user_id = u.user_id "
+        "   AND x_r.period = 'week' "
+        "   AND x_r.period_start = %(week_start)s "
+        ") "
+        "SELECT user_id, user_name, user_uuid, random_id, xp_count "
+        "FROM ranked_users "
+        "WHERE position <= %(limit)s "
+        "OR user_id = %(user_id)s "
+        "OR user_id = ANY(%(pending_user_ids)s::int[]) "
+        "ORDER BY position ",
+        {
+            "user_id": user.user_id,
+            "week_start": week_start,
+            "limit": limit,
+            "pending_user_ids": pending_user_ids or [],
+        }
+    )
+
+
+def leader_board_user_from_row(row: Tuple) -> User:
+    """
+    Used for making a User from a row of leader_board_query
+    :param row: the row
+    :return: a User model with the xp_count of this week
+    """
+    user_id, user_name, user_uuid, random_id, xp_count = row
+
+    return User(
+        user_id=user_id,
+        user_name=user_name,
+        user_uuid=user_uuid,
+        random_id=random_id,
+        xp_count=xp_count,
+    )
+
 
 class ControllerDatabase:
+    # token_uuid -> user_id. Unknown tokens are cached as 0 for a shorter time
+    token_cache = TtlCache(
+        max_size=int(environ.get("TOKEN_CACHE_SIZE", 10000)),
+        ttl=float(environ.get("TOKEN_CACHE_TTL", 60)),
+    )
+    token_cache_negative_ttl = float(environ.get("TOKEN_CACHE_NEGATIVE_TTL", 5))
+
     #  Functions for users table
     @staticmethod
     def insert_user(user: User) -> User:
@@ -77,11 +1049,11 @@ class ControllerDatabase:
         return result
 
     @staticmethod
-    def get_user_by_query(query_str: str, parameters: dict) -> User:
+    def get_user_by_query(query_name: str, parameters: dict) -> User:
         """
-        Used for getting a user with a query
+        Used for getting a user with a registered query
         :param parameters: A dictionary of values vor the query
-        :param query_str: The WHERE query
+        :param query_name: The name of the query in QueryRegistry, for example "user_by_id"
         :return: a User model
         """
         result = None
@@ -89,50 +1061,10 @@ class ControllerDatabase:
         try:
             with CommonUtils.connection() as conn:
                 with conn.cursor() as cur:
-                    cur.execute(
-                        "SELECT "
-                        "   user_id, "
-                        "   user_uuid, "
-                        "   user_name, "
-                        "   user_email, "
-                        "   hashed_password, "
-                        "   password_salt, "
-                        "   email_verified, "
-                        "   random_id, "
-                        "   modified, "
-                        "   created, "
-                        "   is_deleted "
-                        "FROM users "
-                        f"{query_str}",
-                        parameters
-                    )
-                    (
-                        user_id,
-                        user_uuid,
-                        user_name,
-                        user_email,
-                        hashed_password,
-                        password_salt,
-                        email_verified,
-                        random_id,
-                        modified,
-                        created,
-                        is_deleted
-                    ) = cur.fetchone()
-
-            result = User(
-                user_id=user_id,
-                user_uuid=str(user_uuid),
-                user_name=user_name,
-                user_email=user_email,
-                hashed_password=hashed_password,
-                password_salt=password_salt,
-                email_verified=email_verified,
-                random_id=random_id,
-                modified=modified,
-                created=created,
-                is_deleted=is_deleted,
-            )
+                    QueryRegistry.execute(cur, query_name, parameters)
+                    result = user_from_row(cur.fetchone())
+
+            IdentityMap.add(User, result.user_id, result, result.user_uuid)
         except Exception as e:
             logger.exception(e)
 
@@ -140,31 +1072,33 @@ class ControllerDatabase:
 
     @staticmethod
     def get_user_by_email(email: str) -> User:
-        query_str = "WHERE user_email = %(email)s " \
-                    "AND is_deleted = false "
         parameters = {"email": email}
 
-        user = ControllerDatabase.get_user_by_query(query_str, parameters)
+        user = ControllerDatabase.get_user_by_query("user_by_email", parameters)
 
         return user
 
     @staticmethod
     def get_user(user_id: int) -> User:
-        query_str = "WHERE user_id = %(user_id)s " \
-                    "AND is_deleted = false "
+        user = IdentityMap.get(User, user_id)
+        if user:
+            return user
+
         parameters = {"user_id": user_id}
 
-        user = ControllerDatabase.get_user_by_query(query_str, parameters)
+        user = ControllerDatabase.get_user_by_query("user_by_id", parameters)
 
         return user
 
     @staticmethod
     def get_user_by_uuid(user_uuid: str) -> User:
-        query_str = "WHERE user_uuid = %(user_uuid)s " \
-                    "AND is_deleted = false "
+        user = IdentityMap.get_by_uuid(User, user_uuid)
+        if user:
+            return user
+
         parameters = {"user_uuid": user_uuid}
 
-        user = ControllerDatabase.get_user_by_query(query_str, parameters)
+        user = ControllerDatabase.get_user_by_query("user_by_uuid", parameters)
 
         return user
 
@@ -177,16 +1111,14 @@ class ControllerDatabase:
         """
         result = 0
 
+        user = IdentityMap.get_by_uuid(User, user_uuid)
+        if user:
+            return user.user_id
+
         try:
             with CommonUtils.connection() as conn:
                 with conn.cursor() as cur:
-                    cur.execute(
-                        "SELECT user_id "
-                        "FROM users "
-                        "WHERE user_uuid = %(user_uuid)s "
-                        "AND is_deleted = false ",
-                        {"user_uuid": user_uuid}
-                    )
+                    QueryRegistry.execute(cur, "user_id_by_uuid", {"user_uuid": user_uuid})
 
                     if cur.rowcount:
                         (result, ) = cur.fetchone()
@@ -197,36 +1129,69 @@ class ControllerDatabase:
         return result
 
     @staticmethod
-    def load_searched_users(search_phrase: str, search_page: int = 1) -> List[Dict]:
-        page_size = 10
-        search_page -= 1
-        page_offset = page_size*search_page
+    def load_searched_users(search_phrase: str, cursor: str = "", page_size: int = 10) -> List[User]:
+        """
+        Used for searching users by name or email
+        :param search_phrase: the name or email
+        :param cursor: the cursor of the page, empty for the first page
+        :param page_size: the max amount of users
+        :return: a list of User models with user_id, user_uuid, user_name, random_id and created
+        """
         result = []
 
         try:
             with CommonUtils.connection() as conn:
                 with conn.cursor() as cur:
-                    cur.execute(
-                        "SELECT DISTINCT user_uuid, user_name, random_id "
-                        "FROM users "
-                        "WHERE (user_name = %(search_phrase)s "
-                        "OR user_email = %(search_phrase)s) "
-                        "AND is_deleted = false "
-                        "OFFSET %(page_offset)s "
-                        "LIMIT %(page_size)s ",
-                        {
-                            "search_phrase": search_phrase,
-                            "page_size": page_size,
-                            "page_offset": page_offset,
-                        }
-                    )
+                    cur.execute(*searched_users_query(search_phrase, cursor, page_size))
+                    result = [searched_user_from_row(row) for row in cur.fetchall()]
+
+        except Exception as e:
+            logger.exception(e)
+
+        return result
+
+    @staticmethod
+    def search_users_ranked(search_phrase: str, page_size: int = 10) -> List[User]:
+        """
+        Used for searching users by the start of their name or a similar name.
+        Exact name or email matches come first, then name prefix matches,
+        then the rest by trigram similarity
+        :param search_phrase: the name or email
+        :param page_size: the max amount of users
+        :return: a list of User models with user_id, user_uuid, user_name, random_id and created
+        """
+        result = []
 
-                    for user_uuid, user_name, random_id in cur.fetchall():
-                        result.append({
-                            "user_uuid": user_uuid,
-                            "user_name": user_name,
-                            "random_id": random_id,
-                        })
+        try:
+            with CommonUtils.connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(*ranked_users_query(search_phrase, page_size))
+                    result = [searched_user_from_row(row) for row in cur.fetchall()]
+
+        except Exception as e:
+            logger.exception(e)
+
+        return result
+
+    @staticmethod
+    def load_typeahead_users(name_prefix: str, limit: int = 8) -> List[User]:
+        """
+        Used for suggesting users while a name is typed.
+        Only matches the start of the name, so it is served from an index
+        :param name_prefix: the start of the name
+        :param limit: the max amount of users
+        :return: a list of User models with user_id, user_uuid, user_name and random_id
+        """
+        result = []
+
+        if not name_prefix:
+            return result
+
+        try:
+            with CommonUtils.connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(*typeahead_users_query(name_prefix, limit))
+                    result = [searched_user_from_row(row) for row in cur.fetchall()]
 
         except Exception as e:
             logger.exception(e)
@@ -252,6 +1217,7 @@ class ControllerDatabase:
                         user.to_dict()
                     )
                     result = True
+            IdentityMap.discard(User, user.user_id)
         except Exception as e:
             logger.exception(e)
 
@@ -259,11 +1225,11 @@ class ControllerDatabase:
 
     #  Functions for tokens table
     @staticmethod
-    def get_token_by_query(query_str: str, parameters: dict) -> Token:
+    def get_token_by_query(query_name: str, parameters: dict) -> Token:
         """
-        Used for getting a session token with a query
+        Used for getting a session token with a registered query
         :param parameters: A dictionary of values vor the query
-        :param query_str: The WHERE query
+        :param query_name: The name of the query in QueryRegistry, for example "token_by_id"
         :return: a Token model
         """
         result = Token()
@@ -271,12 +1237,7 @@ class ControllerDatabase:
         try:
             with CommonUtils.connection() as conn:
                 with conn.cursor() as cur:
-                    cur.execute(
-                        "SELECT token_id, token_uuid, user_user_id, created, is_deleted "
-                        "FROM tokens "
-                        f"{query_str}",
-                        parameters
-                    )
+                    QueryRegistry.execute(cur, query_name, parameters)
 
                     if cur.rowcount:
                         token_id, token_uuid, user_user_id, created, is_deleted = cur.fetchone()
@@ -295,11 +1256,9 @@ class ControllerDatabase:
 
     @staticmethod
     def get_token(token_id: int) -> Token:
-        query_str = "WHERE token_id = %(token_id)s " \
-                    "AND is_deleted = false "
         parameters = {"token_id": token_id}
 
-        token = ControllerDatabase.get_token_by_query(query_str, parameters)
+        token = ControllerDatabase.get_token_by_query("token_by_id", parameters)
 
         return token
 
@@ -307,11 +1266,9 @@ class ControllerDatabase:
     def get_token_by_uuid(token_uuid: str) -> Token:
         token_uuid = token_uuid.replace("Bearer ", "")
         
-        query_str = "WHERE token_uuid = %(token_uuid)s " \
-                    "AND is_deleted = false "
         parameters = {"token_uuid": token_uuid}
 
-        token = ControllerDatabase.get_token_by_query(query_str, parameters)
+        token = ControllerDatabase.get_token_by_query("token_by_uuid", parameters)
 
         return token
 
@@ -349,6 +1306,7 @@ class ControllerDatabase:
         :return: bool of weather or not the deletion was successful
         """
         result = False
+        deleted_token_uuids = []
 
         try:
             with CommonUtils.connection() as conn:
@@ -356,10 +1314,17 @@ class ControllerDatabase:
                     cur.execute(
                         "UPDATE tokens "
                         "SET is_deleted = true "
-                        "WHERE (token_id = %(token_id)s AND is_deleted = false) ",
+                        "WHERE (token_id = %(token_id)s AND is_deleted = false) "
+                        "RETURNING token_uuid ",
                         token.to_dict()
                     )
-                    result = True
+                    deleted_token_uuids = [str(token_uuid) for (token_uuid, ) in cur.fetchall()]
+
+            # Evicted after the commit, so a concurrent lookup can not cache the token again
+            for token_uuid in deleted_token_uuids:
+                ControllerDatabase.token_cache.delete(token_uuid)
+
+            result = True
         except Exception as e:
             logger.exception(e)
 
@@ -368,29 +1333,26 @@ class ControllerDatabase:
     @staticmethod
     def get_user_id_by_token_uuid(token_uuid: str) -> int:
         """
-        Used for deleting a playlist
+        Used for getting the id of the user a token belongs to.
+        Results are cached in token_cache
         :param token_uuid: the uuid of the token
-        :return: bool of weather or not the deletion was successful
+        :return: the id of the user, 0 if the token is not valid
         """
         result = 0
-        token_uuid = token_uuid.replace("Bearer ", "")
+
+        token_uuid, cached_user_id = cached_token_user_id(token_uuid)
+        if cached_user_id is not None:
+            return cached_user_id
 
         try:
             with CommonUtils.connection() as conn:
                 with conn.cursor() as cur:
-                    cur.execute(
-                        "SELECT u.user_id "
-                        "FROM users as u "
-                        "INNER JOIN tokens as t "
-                        "ON t.user_user_id = u.user_id "
-                        "WHERE t.token_uuid = %(token_uuid)s "
-                        "AND u.is_deleted = false "
-                        "AND t.is_deleted = false ",
-                        {"token_uuid": token_uuid}
-                    )
+                    QueryRegistry.execute(cur, "user_id_by_token_uuid", {"token_uuid": token_uuid})
 
                     if cur.rowcount:
                         (result, ) = cur.fetchone()
+
+            cache_token_user_id(token_uuid, result)
         except Exception as e:
             logger.exception(e)
 
@@ -398,11 +1360,11 @@ class ControllerDatabase:
 
     #  Functions for friend_requests table
     @staticmethod
-    def get_friend_request_by_query(query_str: str, parameters: dict) -> FriendRequest:
+    def get_friend_request_by_query(query_name: str, parameters: dict) -> FriendRequest:
         """
-        Used for getting a friend request with a query
+        Used for getting a friend request with a registered query
         :param parameters: A dictionary of values vor the query
-        :param query_str: The WHERE query
+        :param query_name: The name of the query in QueryRegistry, for example "friend_request_by_id"
         :return: a User model
         """
         result = None
@@ -410,41 +1372,9 @@ class ControllerDatabase:
         try:
             with CommonUtils.connection() as conn:
                 with conn.cursor() as cur:
-                    cur.execute(
-                        "SELECT "
-                        "   friend_request_id, "
-                        "   sender_user_id, "
-                        "   friend_request_uuid, "
-                        "   receiver_user_id, "
-                        "   is_accepted, "
-                        "   modified, "
-                        "   created, "
-                        "   is_deleted "
-                        "FROM friend_requests "
-                        f"{query_str}",
-                        parameters
-                    )
-                    (
-                        friend_request_id,
-                        sender_user_id,
-                        friend_request_uuid,
-                        receiver_user_id,
-                        is_accepted,
-                        modified,
-                        created,
-                        is_deleted,
-                    ) = cur.fetchone()
-
-            result = FriendRequest(
-                friend_request_id=friend_request_id,
-                friend_request_uuid=friend_request_uuid,
-                sender_user_id=sender_user_id,
-                receiver_user_id=receiver_user_id,
-                is_accepted=is_accepted,
-                modified=modified,
-                created=created,
-                is_deleted=is_deleted,
-            )
+                    QueryRegistry.execute(cur, query_name, parameters)
+                    result = friend_request_from_row(cur.fetchone())
+
         except Exception as e:
             logger.exception(e)
 
@@ -452,21 +1382,17 @@ class ControllerDatabase:
 
     @staticmethod
     def get_friend_request(friend_request_id: int) -> FriendRequest:
-        query_str = "WHERE friend_request_id = %(friend_request_id)s " \
-                    "AND is_deleted = false "
         parameters = {"friend_request_id": friend_request_id}
 
-        user = ControllerDatabase.get_friend_request_by_query(query_str, parameters)
+        user = ControllerDatabase.get_friend_request_by_query("friend_request_by_id", parameters)
 
         return user
 
     @staticmethod
     def get_friend_request_by_uuid(friend_request_uuid: str) -> FriendRequest:
-        query_str = "WHERE friend_request_uuid = %(friend_request_uuid)s " \
-                    "AND is_deleted = false "
         parameters = {"friend_request_uuid": friend_request_uuid}
 
-        user = ControllerDatabase.get_friend_request_by_query(query_str, parameters)
+        user = ControllerDatabase.get_friend_request_by_query("friend_request_by_uuid", parameters)
 
         return user
 
@@ -482,12 +1408,7 @@ class ControllerDatabase:
         try:
             with CommonUtils.connection() as conn:
                 with conn.cursor() as cur:
-                    cur.execute(
-                        "INSERT INTO friend_requests "
-                        "(sender_user_id, receiver_user_id) "
-                        "values (%(sender_user_id)s, %(receiver_user_id)s) ",
-                        friend_request.to_dict()
-                    )
+                    cur.execute(*insert_friend_request_query(friend_request))
                     result = True
         except Exception as e:
             logger.exception(e)
@@ -506,13 +1427,7 @@ class ControllerDatabase:
         try:
             with CommonUtils.connection() as conn:
                 with conn.cursor() as cur:
-                    cur.execute(
-                        "UPDATE friend_requests "
-                        "SET is_deleted = true "
-                        "WHERE (friend_request_id = %(friend_request_id)s "
-                        "AND is_deleted = false) ",
-                        friend_request.to_dict()
-                    )
+                    cur.execute(*delete_friend_request_query(friend_request))
                     result = True
         except Exception as e:
             logger.exception(e)
@@ -531,13 +1446,7 @@ class ControllerDatabase:
         try:
             with CommonUtils.connection() as conn:
                 with conn.cursor() as cur:
-                    cur.execute(
-                        "UPDATE friend_requests "
-                        "SET is_accepted = true "
-                        "WHERE (friend_request_id = %(friend_request_id)s "
-                        "AND is_deleted = false) ",
-                        friend_request.to_dict()
-                    )
+                    cur.execute(*accept_friend_request_query(friend_request))
                     result = True
         except Exception as e:
             logger.exception(e)
@@ -545,11 +1454,19 @@ class ControllerDatabase:
         return result
 
     @staticmethod
-    def get_user_friend_requests(user_id, is_accepted: bool) -> List[FriendRequest]:
+    def get_user_friend_requests(
+            user_id,
+            is_accepted: bool,
+            cursor: str = "",
+            page_size: int = None,
+    ) -> List[FriendRequest]:
         """
         Used for getting friend_requests of a user.
+        The uuids of the sender and receiver are joined in the same query
         :param user_id: The id of the user
         :param is_accepted: If true, it gets the users friends
+        :param cursor: the cursor of the page, empty for the first page
+        :param page_size: the max amount of friend requests
         :return: A list of FriendRequest objects
         """
         friend_requests = []
@@ -557,46 +1474,8 @@ class ControllerDatabase:
         try:
             with CommonUtils.connection() as conn:
                 with conn.cursor() as cur:
-                    cur.execute(
-                        "SELECT "
-                        "   friend_request_id, "
-                        "   sender_user_id, "
-                        "   receiver_user_id, "
-                        "   is_accepted, "
-                        "   modified, "
-                        "   created, "
-                        "   is_deleted, "
-                        "   friend_request_uuid "
-                        "FROM friend_requests "
-                        "WHERE (sender_user_id = %(user_id)s "
-                        "OR receiver_user_id = %(user_id)s) "
-                        "AND is_deleted = false "
-                        "AND is_accepted = %(is_accepted)s ",
-                        {
-                            "user_id": user_id,
-                            "is_accepted": is_accepted,
-                        }
-                    )
-                    for (
-                        friend_request_id,
-                        sender_user_id,
-                        receiver_user_id,
-                        is_accepted,
-                        modified,
-                        created,
-                        is_deleted,
-                        friend_request_uuid,
-                    ) in cur.fetchall():
-                        friend_requests.append(FriendRequest(
-                            friend_request_id,
-                            sender_user_id=sender_user_id,
-                            receiver_user_id=receiver_user_id,
-                            is_accepted=is_accepted,
-                            modified=modified,
-                            created=created,
-                            is_deleted=is_deleted,
-                            friend_request_uuid=friend_request_uuid,
-                        ))
+                    cur.execute(*user_friend_requests_query(user_id, is_accepted, cursor, page_size))
+                    friend_requests = [user_friend_request_from_row(row) for row in cur.fetchall()]
         except Exception as e:
             logger.exception(e)
 
@@ -614,12 +1493,8 @@ class ControllerDatabase:
         try:
             with CommonUtils.connection() as conn:
                 with conn.cursor() as cur:
-                    cur.execute(
-                        "SELECT friend_request_id "
-                        "FROM friend_requests "
-                        "WHERE friend_request_uuid = %(friend_request_uuid)s "
-                        "AND is_deleted = false ",
-                        {"friend_request_uuid": friend_request_uuid}
+                    QueryRegistry.execute(
+                        cur, "friend_request_id_by_uuid", {"friend_request_uuid": friend_request_uuid}
                     )
 
                     if cur.rowcount:
@@ -632,7 +1507,7 @@ class ControllerDatabase:
 
     #  Functions for decks table
     @staticmethod
-    def insert_deck(deck: Deck) -> Deck:
+    def insert_deck(deck: Deck) -> DeckRow:
         """
         Used for creating a new deck
         :param deck: the deck to insert
@@ -648,7 +1523,12 @@ class ControllerDatabase:
                         "(deck_name, creator_user_id, is_in_set, is_public) "
                         "values (%(deck_name)s, %(creator_user_id)s, %(is_in_set)s, %(is_public)s) "
                         "RETURNING deck_id ",
-                        deck.to_dict()
+                        {
+                            "deck_name": deck.deck_name,
+                            "creator_user_id": deck.creator_user_id,
+                            "is_in_set": deck.is_in_set,
+                            "is_public": deck.is_public,
+                        }
                     )
 
                     if cur.rowcount:
@@ -663,56 +1543,22 @@ class ControllerDatabase:
         return result
 
     @staticmethod
-    def get_deck_by_query(query_str: str, parameters: dict) -> Deck:
+    def get_deck_by_query(query_name: str, parameters: dict) -> DeckRow:
         """
-        Used for getting a deck with a query
+        Used for getting a deck with a registered query
         :param parameters: A dictionary of values vor the query
-        :param query_str: The WHERE query
-        :return: a Deck model
+        :param query_name: The name of the query in QueryRegistry, for example "deck_by_id"
+        :return: a DeckRow
         """
         result = None
 
         try:
             with CommonUtils.connection() as conn:
                 with conn.cursor() as cur:
-                    cur.execute(
-                        "SELECT "
-                        "   deck_id, "
-                        "   deck_name, "
-                        "   deck_uuid, "
-                        "   created, "
-                        "   modified, "
-                        "   is_deleted, "
-                        "   creator_user_id, "
-                        "   is_in_set, "
-                        "   is_public "
-                        "FROM decks "
-                        f"{query_str}",
-                        parameters
-                    )
-                    (
-                        deck_id,
-                        deck_name,
-                        deck_uuid,
-                        created,
-                        modified,
-                        is_deleted,
-                        creator_user_id,
-                        is_in_set,
-                        is_public,
-                    ) = cur.fetchone()
-
-            result = Deck(
-                deck_id=deck_id,
-                deck_name=deck_name,
-                deck_uuid=deck_uuid,
-                created=created,
-                modified=modified,
-                is_deleted=is_deleted,
-                creator_user_id=creator_user_id,
-                is_in_set=is_in_set,
-                is_public=is_public,
-            )
+                    QueryRegistry.execute(cur, query_name, parameters)
+                    result = DeckRow(*cur.fetchone())
+
+            IdentityMap.add(Deck, result.deck_id, result, result.deck_uuid)
 
         except Exception as e:
             logger.exception(e)
@@ -720,121 +1566,63 @@ class ControllerDatabase:
         return result
 
     @staticmethod
-    def get_deck(deck_id: int) -> Deck:
-        query_str = "WHERE deck_id = %(deck_id)s " \
-                    "AND is_deleted = false "
+    def get_deck(deck_id: int) -> DeckRow:
+        deck = IdentityMap.get(Deck, deck_id)
+        if deck:
+            return deck
+
         parameters = {"deck_id": deck_id}
 
-        deck = ControllerDatabase.get_deck_by_query(query_str, parameters)
+        deck = ControllerDatabase.get_deck_by_query("deck_by_id", parameters)
 
         return deck
 
     @staticmethod
-    def get_deck_by_uuid(deck_uuid: str) -> Deck:
-        query_str = "WHERE deck_uuid = %(deck_uuid)s " \
-                    "AND is_deleted = false "
+    def get_deck_by_uuid(deck_uuid: str) -> DeckRow:
+        deck = IdentityMap.get_by_uuid(Deck, deck_uuid)
+        if deck:
+            return deck
+
         parameters = {"deck_uuid": deck_uuid}
 
-        deck = ControllerDatabase.get_deck_by_query(query_str, parameters)
+        deck = ControllerDatabase.get_deck_by_query("deck_by_uuid", parameters)
 
         return deck
 
     @staticmethod
-    def get_user_decks(user_id: int, is_owner: bool = False) -> List[Deck]:
+    def get_user_decks(
+            user_id: int,
+            is_owner: bool = False,
+            cursor: str = "",
+            page_size: int = None,
+    ) -> List[DeckRow]:
         """
         Used for getting a users decks
         :param user_id: The id of the deck
         :param is_owner: Boolean of weather or not to show non-public cards
+        :param cursor: the cursor of the page, empty for the first page
+        :param page_size: the max amount of decks
         :return: a lists of Deck models
         """
         decks = []
-        show_public_str = "AND is_public = true "
-        if is_owner:
-            show_public_str = ""
 
         try:
             with CommonUtils.connection() as conn:
                 with conn.cursor() as cur:
-                    cur.execute(
-                        "SELECT "
-                        "   deck_id, "
-                        "   deck_name, "
-                        "   deck_uuid, "
-                        "   d.created, "
-                        "   d.modified, "
-                        "   d.is_deleted, "
-                        "   creator_user_id, "
-                        "   is_in_set, "
-                        "   is_public, "
-                        "   study_set_study_set_id "
-                        "FROM decks as d "
-                        "LEFT JOIN decks_in_users as d_in_u "
-                        "ON d_in_u.deck_deck_id = d.deck_id "
-                        "WHERE ((d_in_u.user_user_id = %(user_id)s "
-                        "AND d_in_u.is_deleted = false)"
-                        "OR (d.creator_user_id = %(user_id)s))"
-                        "AND d.is_deleted = false "
-                        f"{ show_public_str }",
-                        {"user_id": user_id}
-                    )
-                    for (
-                        deck_id,
-                        deck_name,
-                        deck_uuid,
-                        created,
-                        modified,
-                        is_deleted,
-                        creator_user_id,
-                        is_in_set,
-                        is_public,
-                        study_set_study_set_id
-                    ) in cur.fetchall():
-                        new_deck = Deck(
-                            deck_id=deck_id,
-                            deck_name=deck_name,
-                            deck_uuid=deck_uuid,
-                            created=created,
-                            modified=modified,
-                            is_deleted=is_deleted,
-                            creator_user_id=creator_user_id,
-                            is_in_set=is_in_set,
-                            is_public=is_public,
-                        )
-                        new_deck.card_count = ControllerDatabase.get_deck_card_count_w_cur(
-                            cur, deck_id
-                        )
-                        new_deck.labels = ControllerDatabase.get_deck_labels_w_cur(
-                            cur, deck_id
-                        )
-                        decks.append(new_deck)
+                    cur.execute(*user_decks_query(user_id, is_owner, cursor, page_size))
+                    decks = [DeckRow(*row) for row in cur.fetchall()]
+
+                    deck_ids = list({deck.deck_id for deck in decks})
+                    labels_by_deck = ControllerDatabase.get_decks_labels_w_cur(cur, deck_ids)
+
+                    for deck in decks:
+                        deck.labels = list(labels_by_deck.get(deck.deck_id, []))
 
         except Exception as e:
             logger.exception(e)
 
         return decks
 
-    @staticmethod
-    def get_deck_card_count_w_cur(cur, deck_id: int) -> int:
-        """
-        Used for counting cards in a deck
-        :param cur: psycopg2 cursor
-        :param deck_id: id of the deck
-        :return: count of non deleted cards in the deck
-        """
-        count = 0
-        cur.execute(
-            "SELECT COUNT(*) "
-            "FROM cards "
-            "WHERE deck_deck_id = %(deck_id)s "
-            "AND is_deleted = false ",
-            {"deck_id": deck_id}
-        )
-
-        if cur.rowcount:
-            (count, ) = cur.fetchone()
-
-        return count
-
     @staticmethod
     def delete_deck(deck: Deck) -> bool:
         """
@@ -851,9 +1639,10 @@ class ControllerDatabase:
                         "UPDATE decks "
                         "SET is_deleted = true "
                         "WHERE (deck_id = %(deck_id)s AND is_deleted = false) ",
-                        deck.to_dict()
+                        {"deck_id": deck.deck_id}
                     )
                     result = True
+            IdentityMap.discard(Deck, deck.deck_id)
         except Exception as e:
             logger.exception(e)
 
@@ -861,7 +1650,7 @@ class ControllerDatabase:
 
     #  Functions for cards table
     @staticmethod
-    def insert_card(card: Card) -> Card:
+    def insert_card(card: Card) -> CardRow:
         """
         Used for creating a new card
         :param card: the card to insert
@@ -872,13 +1661,7 @@ class ControllerDatabase:
         try:
             with CommonUtils.connection() as conn:
                 with conn.cursor() as cur:
-                    cur.execute(
-                        "INSERT INTO cards "
-                        "(front_text, back_text, deck_deck_id) "
-                        "values (%(front_text)s, %(back_text)s, %(deck_deck_id)s) "
-                        "RETURNING card_id ",
-                        card.to_dict()
-                    )
+                    cur.execute(*insert_card_query(card))
 
                     if cur.rowcount:
                         result_card_id = cur.fetchone()[0]
@@ -892,125 +1675,158 @@ class ControllerDatabase:
         return result
 
     @staticmethod
-    def get_card_by_query(query_str: str, parameters: dict) -> Card:
+    def copy_cards(deck_id: int, cards: Iterable[Tuple[str, str]], chunk_size: int = 1000) -> bool:
         """
-        Used for getting a card with a query
-        :param parameters: A dictionary of values vor the query
-        :param query_str: The WHERE query
-        :return: a Card model
+        Used for inserting many cards into a deck with COPY.
+        The cards are copied in chunks, all in one transaction,
+        so either every card is inserted or none
+        :param deck_id: the id of the deck
+        :param cards: an iterable of front_text and back_text, it is read one chunk at a time
+        :param chunk_size: the amount of cards sent per COPY
+        :return: bool of weather or not the insert was successful
         """
-        result = None
+        result = False
+        cards = iter(cards)
 
         try:
+            with CommonUtils.connection() as conn:
+                with conn.cursor() as cur:
+                    while True:
+                        chunk = list(islice(cards, chunk_size))
+                        if not chunk:
+                            break
+
+                        # Quoting every value keeps empty texts from becoming NULL
+                        buffer = io.StringIO()
+                        writer = csv.writer(buffer, quoting=csv.QUOTE_ALL)
+                        for front_text, back_text in chunk:
+                            writer.writerow((front_text, back_text, deck_id))
+                        buffer.seek(0)
+
+                        cur.copy_expert(
+                            "COPY cards (front_text, back_text, deck_deck_id) "
+                            "FROM STDIN WITH (FORMAT csv) ",
+                            buffer
+                        )
+
+                    result = True
+        except Exception as e:
+            logger.exception(e)
+
+        return result
+
+    @staticmethod
+    def stream_deck_cards(deck_id: int, batch_size: int = 1000) -> Iterator[List[Tuple[str, str, str]]]:
+        """
+        Used for reading all cards of a deck without loading them all at once.
+        Every batch is read on its own connection with keyset pagination on (created, card_id),
+        so no connection is held while the caller writes a batch to a slow client.
+        A named server side cursor would read one snapshot, but would hold a connection and
+        a transaction open for as long as the client reads. Here every batch has its own snapshot,
+        so cards added, edited or deleted during an export may or may not be in it.
+        Errors are raised, so a streamed response is aborted instead of ending early
+        :param deck_id: the id of the deck
+        :param batch_size: the amount of cards fetched from the database at a time
+        :return: an iterator of batches of card_uuid, front_text and back_text
+        """
+        cursor = ""
+
+        while True:
+            parameters = Pagination.keyset_parameters(cursor, batch_size)
+            parameters["deck_deck_id"] = deck_id
+            parameters["batch_size"] = batch_size
+
             with CommonUtils.connection() as conn:
                 with conn.cursor() as cur:
                     cur.execute(
                         "SELECT "
-                        "   card_id, "
+                        "   card_uuid, "
                         "   front_text, "
                         "   back_text, "
-                        "   card_uuid, "
                         "   created, "
-                        "   modified, "
-                        "   is_deleted, "
-                        "   deck_deck_id "
+                        "   card_id "
                         "FROM cards "
-                        f"{query_str}",
+                        "WHERE deck_deck_id = %(deck_deck_id)s "
+                        "AND is_deleted = false "
+                        f"{Pagination.keyset_query_str('created', 'card_id', cursor)}"
+                        "ORDER BY created, card_id "
+                        "LIMIT %(batch_size)s ",
                         parameters
                     )
-                    (
-                        card_id,
-                        front_text,
-                        back_text,
-                        card_uuid,
-                        created,
-                        modified,
-                        is_deleted,
-                        deck_deck_id,
-                    ) = cur.fetchone()
-
-            result = Card(
-                card_id=card_id,
-                front_text=front_text,
-                back_text=back_text,
-                card_uuid=card_uuid,
-                created=created,
-                modified=modified,
-                is_deleted=is_deleted,
-                deck_deck_id=deck_deck_id,
-            )
+                    rows = cur.fetchall()
+
+            if not rows:
+                break
+
+            yield [(str(card_uuid), front_text, back_text) for card_uuid, front_text, back_text, _, _ in rows]
+
+            if len(rows) < batch_size:
+                break
+
+            cursor = Pagination.encode_cursor(*rows[-1][3:])
+
+    @staticmethod
+    def get_card_by_query(query_name: str, parameters: dict) -> CardRow:
+        """
+        Used for getting a card with a registered query
+        :param parameters: A dictionary of values vor the query
+        :param query_name: The name of the query in QueryRegistry, for example "card_by_id"
+        :return: a CardRow
+        """
+        result = None
+
+        try:
+            with CommonUtils.connection() as conn:
+                with conn.cursor() as cur:
+                    QueryRegistry.execute(cur, query_name, parameters)
+                    result = CardRow(*cur.fetchone())
+
+            IdentityMap.add(Card, result.card_id, result, result.card_uuid)
         except Exception as e:
             logger.exception(e)
 
         return result
 
     @staticmethod
-    def get_card(card_id: int) -> Card:
-        query_str = "WHERE card_id = %(card_id)s " \
-                    "AND is_deleted = false "
+    def get_card(card_id: int) -> CardRow:
+        card = IdentityMap.get(Card, card_id)
+        if card:
+            return card
+
         parameters = {"card_id": card_id}
 
-        card = ControllerDatabase.get_card_by_query(query_str, parameters)
+        card = ControllerDatabase.get_card_by_query("card_by_id", parameters)
 
         return card
 
     @staticmethod
-    def get_card_by_uuid(card_uuid: str) -> Card:
-        query_str = "WHERE card_uuid = %(card_uuid)s " \
-                    "AND is_deleted = false "
+    def get_card_by_uuid(card_uuid: str) -> CardRow:
+        card = IdentityMap.get_by_uuid(Card, card_uuid)
+        if card:
+            return card
+
         parameters = {"card_uuid": card_uuid}
 
-        card = ControllerDatabase.get_card_by_query(query_str, parameters)
+        card = ControllerDatabase.get_card_by_query("card_by_uuid", parameters)
 
         return card
 
     @staticmethod
-    def get_deck_cards(deck_id: int) -> List[Card]:
+    def get_deck_cards(deck_id: int, cursor: str = "", page_size: int = None) -> List[CardRow]:
         """
         Used for getting a cards from a certain deck
         :param deck_id: The id of the deck
+        :param cursor: the cursor of the page, empty for the first page
+        :param page_size: the max amount of cards
         :return: a lists of Card models
         """
         cards = []
+
         try:
             with CommonUtils.connection() as conn:
                 with conn.cursor() as cur:
-                    cur.execute(
-                        "SELECT "
-                        "   card_id, "
-                        "   front_text, "
-                        "   back_text, "
-                        "   card_uuid, "
-                        "   created, "
-                        "   modified, "
-                        "   is_deleted, "
-                        "   deck_deck_id "
-                        "FROM cards "
-                        "WHERE deck_deck_id = %(deck_deck_id)s "
-                        "AND is_deleted = false ",
-                        {"deck_deck_id": deck_id}
-                    )
-                    for (
-                        card_id,
-                        front_text,
-                        back_text,
-                        card_uuid,
-                        created,
-                        modified,
-                        is_deleted,
-                        deck_deck_id,
-                    ) in cur.fetchall():
-                        new_card = Card(
-                            card_id=card_id,
-                            front_text=front_text,
-                            back_text=back_text,
-                            card_uuid=card_uuid,
-                            created=created,
-                            modified=modified,
-                            is_deleted=is_deleted,
-                            deck_deck_id=deck_deck_id,
-                        )
-                        cards.append(new_card)
+                    cur.execute(*deck_cards_query(deck_id, cursor, page_size))
+                    cards = [CardRow(*row) for row in cur.fetchall()]
 
         except Exception as e:
             logger.exception(e)
@@ -1029,44 +1845,313 @@ class ControllerDatabase:
         try:
             with CommonUtils.connection() as conn:
                 with conn.cursor() as cur:
-                    cur.execute(
-                        "UPDATE cards "
-                        "SET is_deleted = true "
-                        "WHERE (card_id = %(card_id)s AND is_deleted = false) ",
-                        card.to_dict()
-                    )
+                    cur.execute(*delete_card_query(card))
                     result = True
+            IdentityMap.discard(Card, card.card_id)
         except Exception as e:
             logger.exception(e)
 
         return result
 
     @staticmethod
-    def edit_card(card: Card) -> Card:
+    def edit_card(card: Card) -> CardRow:
         """
-        Used for getting a card with a query
+        Used for editing the text of a card.
+        The edited card is returned by the update and replaces the card in the identity map
         :param card: Card model. Used for getting the card_uuid, front_text, back_text
         :return: a Card model
         """
         result = Card()
-        card_id = 0
+
+        try:
+            with CommonUtils.connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(*edit_card_query(card))
+                    result = CardRow(*cur.fetchone())
+
+            IdentityMap.add(Card, result.card_id, result, result.card_uuid)
+        except Exception as e:
+            logger.exception(e)
+
+        return result
+
+    @staticmethod
+    def apply_card_operations(
+            deck_id: int,
+            created_cards: List[Tuple[str, str]],
+            edited_cards: List[Tuple[str, str, str]],
+            deleted_card_uuids: List[str],
+    ) -> Dict:
+        """
+        Used for creating, editing and deleting many cards of one deck in one transaction.
+        Every kind of operation is one statement. Edits and deletes only match
+        cards that are in the deck and not deleted
+        :param deck_id: the id of the deck
+        :param created_cards: list of front_text and back_text of the new cards
+        :param edited_cards: list of card_uuid, front_text and back_text of the edited cards
+        :param deleted_card_uuids: list of the card_uuids of the deleted cards
+        :return: {
+            "created_card_uuids": in the order of created_cards,
+            "edited_card_uuids": the edited cards that were found,
+            "deleted_card_uuids": the deleted cards that were found,
+        }, or None if nothing was changed because of an error
+        """
+        result = None
+        changed_card_ids = []
+
+        try:
+            with CommonUtils.connection() as conn:
+                with conn.cursor() as cur:
+                    created_card_uuids = []
+                    if created_cards:
+                        cur.execute(*create_cards_query(deck_id, created_cards))
+                        created_card_uuids = [str(card_uuid) for (card_uuid, ) in cur.fetchall()]
+
+                    edited_card_uuids = []
+                    if edited_cards:
+                        cur.execute(*edit_cards_query(deck_id, edited_cards))
+                        for card_id, card_uuid in cur.fetchall():
+                            changed_card_ids.append(card_id)
+                            edited_card_uuids.append(str(card_uuid))
+
+                    deleted_uuids = []
+                    if deleted_card_uuids:
+                        cur.execute(*delete_cards_query(deck_id, deleted_card_uuids))
+                        for card_id, card_uuid in cur.fetchall():
+                            changed_card_ids.append(card_id)
+                            deleted_uuids.append(str(card_uuid))
+
+                    result = {
+                        "created_card_uuids": created_card_uuids,
+                        "edited_card_uuids": edited_card_uuids,
+                        "deleted_card_uuids": deleted_uuids,
+                    }
+
+            for card_id in changed_card_ids:
+                IdentityMap.discard(Card, card_id)
+        except Exception as e:
+            logger.exception(e)
+            result = None
+
+        return result
+
+    #  Functions for card_review_states table
+    @staticmethod
+    def get_due_cards(user_id: int, deck_id: int, limit: int = 20, now: datetime.datetime = None) -> List[CardRow]:
+        """
+        Used for getting the next cards a user should study in a deck.
+        Due cards come first, the ones due the longest first,
+        then cards the user has never reviewed, in the order they were created
+        :param user_id: the id of the user
+        :param deck_id: the id of the deck
+        :param limit: the max amount of cards
+        :param now: the time cards are due by, utc now by default
+        :return: a list of Card models
+        """
+        cards = []
+
+        try:
+            with CommonUtils.connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(*due_cards_query(user_id, deck_id, limit, now))
+                    cards = [CardRow(*row) for row in cur.fetchall()]
+
+        except Exception as e:
+            logger.exception(e)
+
+        return cards
+
+    @staticmethod
+    def review_cards(
+            user_id: int,
+            deck_id: int,
+            grades: Dict[str, int],
+            now: datetime.datetime = None,
+    ) -> Dict[str, ReviewState]:
+        """
+        Used for saving the reviews of cards and scheduling them again.
+        The new states of all cards are computed at once with Scheduler
+        and saved with one upsert, in one transaction
+        :param user_id: the id of the user who reviewed the cards
+        :param deck_id: the id of the deck, cards of other decks are ignored
+        :param grades: the grade from 0 to 5 of every card, by card_uuid
+        :param now: the time of the reviews, utc now by default
+        :return: the new ReviewState of every reviewed card, by card_uuid, or None if there was an error
+        """
+        result = None
+        now = now or datetime.datetime.utcnow()
 
         try:
             with CommonUtils.connection() as conn:
                 with conn.cursor() as cur:
                     cur.execute(
-                        "UPDATE cards "
-                        "SET front_text = %(front_text)s, back_text = %(back_text)s "
-                        "WHERE card_uuid = %(card_uuid)s "
-                        "OR card_id = %(card_id)s "
-                        "RETURNING card_id ",
-                        card.to_dict()
+                        "SELECT "
+                        "   c.card_id, "
+                        "   c.card_uuid, "
+                        "   COALESCE(r.repetitions, 0), "
+                        "   COALESCE(r.interval_days, 0), "
+                        "   COALESCE(r.ease_factor, %(default_ease_factor)s) "
+                        "FROM cards c "
+                        "LEFT JOIN card_review_states r "
+                        "   ON r.card_card_id = c.card_id AND r.user_user_id = %(user_id)s "
+                        "WHERE c.card_uuid = ANY(%(card_uuids)s::uuid[]) "
+                        "AND c.deck_deck_id = %(deck_id)s "
+                        "AND c.is_deleted = false "
+                        "ORDER BY c.card_id "
+                        "FOR UPDATE OF c ",
+                        {
+                            "user_id": user_id,
+                            "deck_id": deck_id,
+                            "card_uuids": list(grades),
+                            "default_ease_factor": DEFAULT_EASE_FACTOR,
+                        }
                     )
+                    rows = cur.fetchall()
+                    result = {}
+
+                    if rows:
+                        card_ids, card_uuids, repetitions, interval_days, ease_factors = zip(*rows)
+                        card_uuids = [str(card_uuid) for card_uuid in card_uuids]
+
+                        repetitions, interval_days, ease_factors = Scheduler.schedule(
+                            repetitions,
+                            interval_days,
+                            ease_factors,
+                            [grades[card_uuid] for card_uuid in card_uuids],
+                        )
+                        due_times = Scheduler.due_times(now, interval_days)
+
+                        for index, card_uuid in enumerate(card_uuids):
+                            result[card_uuid] = ReviewState(
+                                user_user_id=user_id,
+                                card_card_id=card_ids[index],
+                                deck_deck_id=deck_id,
+                                repetitions=int(repetitions[index]),
+                                interval_days=float(interval_days[index]),
+                                ease_factor=float(ease_factors[index]),
+                                due=due_times[index],
+                                last_reviewed=now,
+                            )
+
+                        execute_values(
+                            cur,
+                            "INSERT INTO card_review_states "
+                            "(user_user_id, card_card_id, deck_deck_id, repetitions, "
+                            "interval_days, ease_factor, due, last_reviewed) "
+                            "VALUES %s "
+                            "ON CONFLICT (user_user_id, card_card_id) DO UPDATE "
+                            "SET repetitions = excluded.repetitions, "
+                            "interval_days = excluded.interval_days, "
+                            "ease_factor = excluded.ease_factor, "
+                            "due = excluded.due, "
+                            "last_reviewed = excluded.last_reviewed, "
+                            "modified = now() ",
+                            [
+                                (
+                                    state.user_user_id,
+                                    state.card_card_id,
+                                    state.deck_deck_id,
+                                    state.repetitions,
+                                    state.interval_days,
+                                    state.ease_factor,
+                                    state.due,
+                                    state.last_reviewed,
+                                )
+                                for state in result.values()
+                            ],
+                            page_size=len(result),
+                        )
 
-                    (card_id, ) = cur.fetchone()
-            result = ControllerDatabase.get_card(card_id)
         except Exception as e:
             logger.exception(e)
+            result = None
+
+        return result
+
+    #  Functions for review_events table
+    @staticmethod
+    def copy_review_events(events: List[ReviewEventRow]) -> bool:
+        """
+        Used for appending review events to the event log with COPY
+        :param events: list of user_id, card_uuid, grade, latency_ms and reviewed_at
+        :return: bool of weather or not the insert was successful
+        """
+        result = False
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for user_id, card_uuid, grade, latency_ms, reviewed_at in events:
+            writer.writerow((user_id, card_uuid, grade, latency_ms, reviewed_at.isoformat()))
+        buffer.seek(0)
+
+        try:
+            with CommonUtils.connection() as conn:
+                with conn.cursor() as cur:
+                    cur.copy_expert(
+                        "COPY review_events (user_user_id, card_uuid, grade, latency_ms, reviewed_at) "
+                        "FROM STDIN WITH (FORMAT csv) ",
+                        buffer
+                    )
+                    result = True
+        except Exception as e:
+            logger.exception(e)
+
+        return result
+
+    @staticmethod
+    def create_review_event_partitions(months_ahead: int = 3) -> bool:
+        """
+        Used for creating the monthly partitions of review_events,
+        from the current month up to months_ahead months from now.
+        Every month is created in its own transaction. Events of the month that are
+        in the default partition are moved into the new partition before it is attached
+        :param months_ahead: the amount of future months
+        :return: bool of weather or not all the partitions exist
+        """
+        result = True
+        month_start = datetime.date.today().replace(day=1)
+
+        for _ in range(months_ahead + 1):
+            next_month_start = (month_start + datetime.timedelta(days=32)).replace(day=1)
+            partition_name = f"review_events_{month_start:%Y_%m}"
+            parameters = {
+                "partition_name": partition_name,
+                "month_start": month_start,
+                "next_month_start": next_month_start,
+            }
+
+            try:
+                with CommonUtils.connection() as conn:
+                    with conn.cursor() as cur:
+                        cur.execute("SELECT to_regclass(%(partition_name)s) ", parameters)
+                        (existing_partition, ) = cur.fetchone()
+
+                        if existing_partition is None:
+                            cur.execute("LOCK TABLE review_events_default IN EXCLUSIVE MODE")
+                            cur.execute(f"CREATE TABLE {partition_name} (LIKE review_events INCLUDING DEFAULTS)")
+                            cur.execute(
+                                "WITH moved_events AS ("
+                                "   DELETE FROM review_events_default "
+                                "   WHERE reviewed_at >= %(month_start)s "
+                                "   AND reviewed_at < %(next_month_start)s "
+                                "   RETURNING * "
+                                ") "
+                                f"INSERT INTO {partition_name} "
+                                "SELECT * FROM moved_events ",
+                                parameters
+                            )
+                            moved_event_count = cur.rowcount
+                            cur.execute(
+                                f"ALTER TABLE review_events ATTACH PARTITION {partition_name} "
+                                "FOR VALUES FROM (%(month_start)s) TO (%(next_month_start)s) ",
+                                parameters
+                            )
+                            logger.info(f"Created {partition_name}, moved {moved_event_count} events into it")
+            except Exception as e:
+                logger.exception(e)
+                result = False
+
+            month_start = next_month_start
 
         return result
 
@@ -1103,11 +2188,11 @@ class ControllerDatabase:
         return result
 
     @staticmethod
-    def get_study_set_by_query(query_str: str, parameters: dict) -> StudySet:
+    def get_study_set_by_query(query_name: str, parameters: dict) -> StudySet:
         """
-        Used for getting a study_set with a query
+        Used for getting a study_set with a registered query
         :param parameters: A dictionary of values vor the query
-        :param query_str: The WHERE query
+        :param query_name: The name of the query in QueryRegistry, for example "study_set_by_id"
         :return: a StudySet model
         """
         result = None
@@ -1115,41 +2200,10 @@ class ControllerDatabase:
         try:
             with CommonUtils.connection() as conn:
                 with conn.cursor() as cur:
-                    cur.execute(
-                        "SELECT "
-                        "   study_set_id, "
-                        "   creator_user_id, "
-                        "   created, "
-                        "   modified, "
-                        "   is_deleted, "
-                        "   study_set_name, "
-                        "   is_public,"
-                        "   study_set_uuid "
-                        "FROM study_sets "
-                        f"{query_str}",
-                        parameters
-                    )
-                    (
-                        study_set_id,
-                        creator_user_id,
-                        created,
-                        modified,
-                        is_deleted,
-                        study_set_name,
-                        is_public,
-                        study_set_uuid,
-                    ) = cur.fetchone()
-
-            result = StudySet(
-                study_set_id=study_set_id,
-                creator_user_id=creator_user_id,
-                created=created,
-                modified=modified,
-                is_deleted=is_deleted,
-                study_set_name=study_set_name,
-                is_public=is_public,
-                study_set_uuid=study_set_uuid,
-            )
+                    QueryRegistry.execute(cur, query_name, parameters)
+                    result = study_set_from_row(cur.fetchone())
+
+            IdentityMap.add(StudySet, result.study_set_id, result, result.study_set_uuid)
         except Exception as e:
             logger.exception(e)
 
@@ -1157,21 +2211,25 @@ class ControllerDatabase:
 
     @staticmethod
     def get_study_set(study_set_id: int) -> StudySet:
-        query_str = "WHERE study_set_id = %(study_set_id)s " \
-                    "AND is_deleted = false "
+        study_set = IdentityMap.get(StudySet, study_set_id)
+        if study_set:
+            return study_set
+
         parameters = {"study_set_id": study_set_id}
 
-        study_set = ControllerDatabase.get_study_set_by_query(query_str, parameters)
+        study_set = ControllerDatabase.get_study_set_by_query("study_set_by_id", parameters)
 
         return study_set
 
     @staticmethod
     def get_study_set_by_uuid(study_set_uuid: str) -> StudySet:
-        query_str = "WHERE study_set_uuid = %(study_set_uuid)s " \
-                    "AND is_deleted = false "
+        study_set = IdentityMap.get_by_uuid(StudySet, study_set_uuid)
+        if study_set:
+            return study_set
+
         parameters = {"study_set_uuid": study_set_uuid}
 
-        study_set = ControllerDatabase.get_study_set_by_query(query_str, parameters)
+        study_set = ControllerDatabase.get_study_set_by_query("study_set_by_uuid", parameters)
 
         return study_set
     
@@ -1242,96 +2300,38 @@ class ControllerDatabase:
         return result
 
     @staticmethod
-    def get_user_study_sets(user_id: int, is_owner: bool = False) -> List[StudySet]:
+    def get_user_study_sets(
+            user_id: int,
+            is_owner: bool = False,
+            cursor: str = "",
+            page_size: int = None,
+    ) -> List[StudySet]:
         """
         Used for getting a users study_sets
         :param user_id: The id of the user
         :param is_owner: Boolean of weather or not to show non-public cards
+        :param cursor: the cursor of the page, empty for the first page
+        :param page_size: the max amount of study_sets
         :return: a lists of StudySet models
         """
         study_sets = []
-        show_public_str = "AND is_public = true "
-        if is_owner:
-            show_public_str = ""
 
         try:
             with CommonUtils.connection() as conn:
                 with conn.cursor() as cur:
-                    cur.execute(
-                        "SELECT "
-                        "   s.study_set_id, "
-                        "   s.creator_user_id, "
-                        "   s.created, "
-                        "   s.modified, "
-                        "   s.is_deleted, "
-                        "   s.study_set_name, "
-                        "   s.is_public, "
-                        "   s.study_set_uuid "
-                        "FROM study_sets as s "
-                        "LEFT JOIN study_sets_in_users as s_in_u "
-                        "ON s_in_u.study_set_study_set_id = s.study_set_id "
-                        "WHERE ((s_in_u.user_user_id = %(user_id)s "
-                        "AND s_in_u.is_deleted = false)"
-                        "OR (s.creator_user_id = %(user_id)s))"
-                        "AND s.is_deleted = false "
-                        f"{ show_public_str }",
-                        {"user_id": user_id}
-                    )
-                    for (
-                        study_set_id,
-                        creator_user_id,
-                        created,
-                        modified,
-                        is_deleted,
-                        study_set_name,
-                        is_public,
-                        study_set_uuid,
-                    ) in cur.fetchall():
-                        new_study_sets = StudySet(
-                            study_set_id=study_set_id,
-                            creator_user_id=creator_user_id,
-                            created=created,
-                            modified=modified,
-                            is_deleted=is_deleted,
-                            study_set_name=study_set_name,
-                            is_public=is_public,
-                            study_set_uuid=study_set_uuid,
-                        )
-                        new_study_sets.labels = ControllerDatabase.get_study_set_labels_w_cur(
-                            cur, study_set_id
-                        )
-                        new_study_sets.deck_count = ControllerDatabase.get_study_set_deck_count(
-                            cur, study_set_id
-                        )
-                        study_sets.append(new_study_sets)
+                    cur.execute(*user_study_sets_query(user_id, is_owner, cursor, page_size))
+                    study_sets = [user_study_set_from_row(row) for row in cur.fetchall()]
+
+                    study_set_ids = list({study_set.study_set_id for study_set in study_sets})
+                    labels_by_study_set = ControllerDatabase.get_study_sets_labels_w_cur(cur, study_set_ids)
+
+                    for study_set in study_sets:
+                        study_set.labels = list(labels_by_study_set.get(study_set.study_set_id, []))
         except Exception as e:
             logger.exception(e)
 
         return study_sets
 
-    @staticmethod
-    def get_study_set_deck_count(cur, study_set_id: int) -> int:
-        """
-        Used for counting deck in a study set
-        :param cur: psycopg2 cursor
-        :param study_set_id: id of the study_set
-        :return: count of non deleted decks in the study set
-        """
-        count = 0
-
-        cur.execute(
-            "SELECT COUNT(*) "
-            "FROM decks "
-            "WHERE study_set_study_set_id = %(study_set_id)s "
-            "AND is_deleted = false ",
-            {"study_set_id": study_set_id}
-        )
-
-        if cur.rowcount:
-            (count, ) = cur.fetchone()
-
-        return count
-
     @staticmethod
     def delete_study_set(study_set: StudySet) -> bool:
         """
@@ -1351,6 +2351,7 @@ class ControllerDatabase:
                         study_set.to_dict()
                     )
                     result = True
+            IdentityMap.discard(StudySet, study_set.study_set_id)
         except Exception as e:
             logger.exception(e)
 
@@ -1390,11 +2391,11 @@ class ControllerDatabase:
         return result
 
     @staticmethod
-    def get_label_by_query(query_str: str, parameters: dict) -> Label:
+    def get_label_by_query(query_name: str, parameters: dict) -> Label:
         """
-        Used for getting a label with a query
+        Used for getting a label with a registered query
         :param parameters: A dictionary of values vor the query
-        :param query_str: The WHERE query
+        :param query_name: The name of the query in QueryRegistry, for example "label_by_id"
         :return: a Label model
         """
         result = None
@@ -1402,17 +2403,7 @@ class ControllerDatabase:
         try:
             with CommonUtils.connection() as conn:
                 with conn.cursor() as cur:
-                    cur.execute(
-                        "SELECT "
-                        "   label_id, "
-                        "   label_name, "
-                        "   modified, "
-                        "   created, "
-                        "   is_deleted "
-                        "FROM labels "
-                        f"{query_str}",
-                        parameters
-                    )
+                    QueryRegistry.execute(cur, query_name, parameters)
 
                     if cur.rowcount:
                         (
@@ -1437,21 +2428,17 @@ class ControllerDatabase:
 
     @staticmethod
     def get_label(label_id: int) -> Label:
-        query_str = "WHERE label_id = %(label_id)s " \
-                    "AND is_deleted = false "
         parameters = {"label_id": label_id}
 
-        user = ControllerDatabase.get_label_by_query(query_str, parameters)
+        user = ControllerDatabase.get_label_by_query("label_by_id", parameters)
 
         return user
 
     @staticmethod
     def get_label_by_name(label_name: str) -> Label:
-        query_str = "WHERE label_name = %(label_name)s " \
-                    "AND is_deleted = false "
         parameters = {"label_name": label_name}
 
-        user = ControllerDatabase.get_label_by_query(query_str, parameters)
+        user = ControllerDatabase.get_label_by_query("label_by_name", parameters)
 
         return user
 
@@ -1480,68 +2467,34 @@ class ControllerDatabase:
         return result
 
     @staticmethod
-    def get_deck_labels_w_cur(cur, deck_id: int) -> List[Label]:
+    def get_decks_labels_w_cur(cur, deck_ids: List[int]) -> Dict[int, List[Label]]:
         """
-        Used for getting the labels in a deck
+        Used for getting the labels of many decks with one query
         :param cur: psycopg2 cursor
-        :param deck_id: the id of the deck
-        :return: A list of label objects belonging to the deck
-        """
-        labels = []
-
-        cur.execute(
-            "SELECT DISTINCT label_id, label_name, l.modified, l.created, l.is_deleted "
-            "FROM labels AS l "
-            "INNER JOIN labels_in_decks AS l_in_d "
-            "ON l.label_id = l_in_d.label_label_id "
-            "WHERE deck_deck_id = %(deck_id)s "
-            "AND l_in_d.is_deleted = false ",
-            {"deck_id": deck_id}
-        )
+        :param deck_ids: the ids of the decks
+        :return: A dictionary of deck ids and the label objects belonging to the deck
+        """
+        if not deck_ids:
+            return {}
 
-        for label_id, label_name, modified, created, is_deleted in cur.fetchall():
-            new_label = Label(
-                label_id=label_id,
-                label_name=label_name,
-                modified=modified,
-                created=created,
-                is_deleted=is_deleted,
-            )
-            labels.append(new_label)
+        cur.execute(*decks_labels_query(deck_ids))
 
-        return labels
+        return labels_by_id_from_rows(cur.fetchall())
 
     @staticmethod
-    def get_study_set_labels_w_cur(cur, study_set_id: int) -> List[Label]:
+    def get_study_sets_labels_w_cur(cur, study_set_ids: List[int]) -> Dict[int, List[Label]]:
         """
-        Used for getting the labels in a study_set
+        Used for getting the labels of many study_sets with one query
         :param cur: psycopg2 cursor
-        :param study_set_id: the id of the study_set
-        :return: A list of label objects belonging to the study_set
-        """
-        labels = []
-
-        cur.execute(
-            "SELECT DISTINCT label_id, label_name, l.modified, l.created, l.is_deleted "
-            "FROM labels AS l "
-            "INNER JOIN labels_in_study_sets AS l_in_s "
-            "ON l.label_id = l_in_s.label_label_id "
-            "WHERE study_set_study_set_id = %(study_set_id)s "
-            "AND l_in_s.is_deleted = false ",
-            {"study_set_id": study_set_id}
-        )
+        :param study_set_ids: the ids of the study_sets
+        :return: A dictionary of study_set ids and the label objects belonging to the study_set
+        """
+        if not study_set_ids:
+            return {}
 
-        for label_id, label_name, modified, created, is_deleted in cur.fetchall():
-            new_label = Label(
-                label_id=label_id,
-                label_name=label_name,
-                modified=modified,
-                created=created,
-                is_deleted=is_deleted,
-            )
-            labels.append(new_label)
+        cur.execute(*study_sets_labels_query(study_set_ids))
 
-        return labels
+        return labels_by_id_from_rows(cur.fetchall())
 
     @staticmethod
     def add_label_to_deck(deck_id: int, label_name: str) -> bool:
@@ -1623,142 +2576,127 @@ class ControllerDatabase:
     
     # Functions for the xp table
     @staticmethod
-    def update_user_xp(user_id: int, xp_count: int) -> bool:
+    def update_user_xp(user_id: int, xp_count: int, day: datetime.date = None) -> bool:
         """
         Used for updating a users xp.
-        If no xp earned today it creates a new xp row
-        If already exists, it simply updates today's row
+        If no xp earned that day it creates a new xp row
+        If already exists, it simply adds to that day's row
         :param user_id: the id of the user
         :param xp_count: the amount of xp earned
+        :param day: the day the xp was earned on, today if not given
+        :return: bool of weather or not everything was successful
+        """
+        if not day:
+            day = datetime.datetime.now().date()
+
+        return ControllerDatabase.update_users_xp({(user_id, day): xp_count})
+
+    @staticmethod
+    def update_users_xp(xp_counts: Dict[Tuple[int, datetime.date], int]) -> bool:
+        """
+        Used for adding xp to many users and days in one statement.
+        The xp rows are upserted and the xp rollups are updated in the same statement
+        :param xp_counts: a dictionary of (user_id, day) and the amount of xp earned
         :return: bool of weather or not everything was successful
         """
         result = False
 
-        start_date = datetime.datetime.now().date()
-        start_date = datetime.datetime.combine(start_date, datetime.time())
-        
-        todays_xp = ControllerDatabase.get_user_xp_in_timeframe(
-            user_id, start_date, datetime.datetime.now()
-        )
-        
+        if not xp_counts:
+            return True
+
         try:
             with CommonUtils.connection() as conn:
                 with conn.cursor() as cur:
-                    if todays_xp and len(todays_xp):
-                        xp_id = todays_xp[0].xp_id
-                        
-                        cur.execute(
-                            "UPDATE xp "
-                            "SET xp_count = xp_count + %(xp_count)s "
-                            "WHERE xp_id = %(xp_id)s ",
-                            {
-                                "xp_count": xp_count,
-                                "xp_id": xp_id,
-                            }
-                        )
-                    else:
-                        cur.execute(
-                            "INSERT INTO xp "
-                            "(user_user_id, xp_count) "
-                            "VALUES (%(user_id)s, %(xp_count)s) ",
-                            {
-                                "xp_count": xp_count,
-                                "user_id": user_id,
-                            }
-                        )
-                        
+                    cur.execute(*add_users_xp_query(xp_counts))
+
                     result = True
         except Exception as e:
             logger.exception(e)
-            
+
         return result
 
     @staticmethod
-    def get_user_xp_in_timeframe(
-            user_id: int,
-            start_date: datetime.datetime,
-            end_date: datetime.datetime
-    ) -> List[Xp]:
+    def get_user_total_xp(user_id: int) -> int:
         """
-        Used for updating a users xp.
-        If no xp earned today it creates a new xp row
-        If already exists, it simply updates today's row
+        Used for getting the amount of xp a user has ever earned
         :param user_id: the id of the user
-        :param start_date: the earliest date that can be fetched
-        :param end_date: the latest date that can be fetched
         :return: the amount of xp earned
         """
-        result = []
-        
+        result = 0
+
         try:
             with CommonUtils.connection() as conn:
                 with conn.cursor() as cur:
+                    cur.execute(*user_total_xp_query(user_id))
+
+                    if cur.rowcount:
+                        (result, ) = cur.fetchone()
+
+        except Exception as e:
+            logger.exception(e)
+
+        return result
+
+    @staticmethod
+    def rebuild_xp_rollups() -> bool:
+        """
+        Used for recomputing every xp rollup from the xp table.
+        The rollups are locked while rebuilding, so concurrent xp updates wait
+        :return: bool of weather or not the rebuild was successful
+        """
+        result = False
+
+        try:
+            with CommonUtils.connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute("LOCK TABLE xp_rollups IN EXCLUSIVE MODE")
+                    cur.execute("DELETE FROM xp_rollups")
                     cur.execute(
-                        "SELECT xp_id, created, xp_count "
+                        "INSERT INTO xp_rollups "
+                        "(user_user_id, period, period_start, xp_count) "
+                        "SELECT user_user_id, 'total', '-infinity'::DATE, SUM(xp_count) "
                         "FROM xp "
-                        "WHERE user_user_id = %(user_id)s "
-                        "AND created > %(start_date)s "
-                        "AND created < %(end_date)s "
-                        "AND is_deleted = false ",
-                        {
-                            "user_id": user_id,
-                            "start_date": start_date,
-                            "end_date": end_date,
-                        }
+                        "WHERE is_deleted = false "
+                        "GROUP BY user_user_id "
+                        "UNION ALL "
+                        "SELECT user_user_id, 'week', date_trunc('week', xp_date)::DATE, SUM(xp_count) "
+                        "FROM xp "
+                        "WHERE is_deleted = false "
+                        "GROUP BY user_user_id, date_trunc('week', xp_date)::DATE "
+                        "UNION ALL "
+                        "SELECT user_user_id, 'day', xp_date, SUM(xp_count) "
+                        "FROM xp "
+                        "WHERE is_deleted = false "
+                        "GROUP BY user_user_id, xp_date "
                     )
-                    
-                    for xp_id, created, xp_count in cur.fetchall():
-                        result.append(Xp(
-                            xp_id=xp_id,
-                            created=created,
-                            xp_count=xp_count,
-                        ))
+                    logger.info(f"Rebuilt {cur.rowcount} xp rollups")
+
+                    result = True
         except Exception as e:
             logger.exception(e)
-    
+
         return result
 
     @staticmethod
-    def get_user_xp_sum_in_timeframe(
+    def get_user_xp_in_timeframe(
             user_id: int,
-            start_date: datetime.datetime = None,
-            end_date: datetime.datetime = None
-    ) -> int:
+            start_date: datetime.date,
+            end_date: datetime.date
+    ) -> List[Xp]:
         """
-        Used for getting the amount of xp a user has earned
+        Used for getting the xp a user earned on each day of a timeframe
         :param user_id: the id of the user
-        :param start_date: the earliest date that can be fetched
-        :param end_date: the latest date that can be fetched
-        :return: the amount of xp earned
+        :param start_date: the first day that is fetched
+        :param end_date: the last day that is fetched
+        :return: a list of Xp models, one per day with xp
         """
-        result = 0
+        result = []
         
-        start_date_str = "AND created > %(start_date)s " if start_date else ""
-        end_date_str = "AND created < %(end_date)s " if end_date else ""
-    
         try:
             with CommonUtils.connection() as conn:
                 with conn.cursor() as cur:
-                    cur.execute(
-                        "SELECT SUM(xp_count) as xp_count "
-                        "FROM xp "
-                        "WHERE user_user_id = %(user_id)s "
-                        f"{ start_date_str } "
-                        f"{ end_date_str } "
-                        "AND is_deleted = false ",
-                        {
-                            "user_id": user_id,
-                            "start_date": start_date,
-                            "end_date": end_date,
-                        }
-                    )
-                    
-                    if cur.rowcount:
-                        (result, ) = cur.fetchone()
-                        
-                    if not result:
-                        result = 0
-            
+                    cur.execute(*user_xp_in_timeframe_query(user_id, start_date, end_date))
+                    result = [xp_from_row(row) for row in cur.fetchall()]
         except Exception as e:
             logger.exception(e)
     
@@ -1767,59 +2705,37 @@ class ControllerDatabase:
     @staticmethod
     def get_user_leader_board(
             user: User,
+            limit: int = LEADER_BOARD_SIZE,
+            pending_user_ids: List[int] = None,
     ) -> List[User]:
         """
-        Used for getting leaderboard data for a user
+        Used for getting leaderboard data for a user.
+        Gets the user and their friends with the xp they earned this week.
+        The user and the friends in pending_user_ids are returned even if they are not in the top limit,
+        so xp that is not yet in the database can still move them up
         :param user: the user
-        :return: the amount of xp earned
+        :param limit: the amount of the highest ranked users to get
+        :param pending_user_ids: the ids of users with xp that is not yet in the database
+        :return: a list of User models ordered by xp_count
         """
-        result = [user]
-    
+        result = []
+
         try:
             with CommonUtils.connection() as conn:
                 with conn.cursor() as cur:
-                    cur.execute(
-                        "SELECT DISTINCT "
-                        "   users.user_id,"
-                        "   users.user_name,"
-                        "   users.user_uuid, "
-                        "   users.random_id "
-                        "FROM users "
-                        "FULL JOIN friend_requests sender_fr on users.user_id = sender_fr.sender_user_id "
-                        "FULL JOIN friend_requests receiver_fr on users.user_id = receiver_fr.receiver_user_id "
-                        "WHERE sender_fr.receiver_user_id = %(user_id)s "
-                        "OR receiver_fr.sender_user_id = %(user_id)s ",
-                        {
-                            "user_id": user.user_id,
-                        }
-                    )
-
-                    now = datetime.datetime.now()
-                    week_start = now.date() - datetime.timedelta(days=now.weekday())
-                    week_end = week_start + datetime.timedelta(days=6)
-                    
-                    result[0].xp_count = ControllerDatabase.get_user_xp_sum_in_timeframe(
-                        user_id=result[0].user_id,
-                        start_date=datetime.datetime.combine(week_start, datetime.time()),
-                        end_date=datetime.datetime.combine(week_end, datetime.time()),
-                    )
-                    
-                    for (user_id, user_name, user_uuid, random_id) in cur.fetchall():
-                        xp_count = ControllerDatabase.get_user_xp_sum_in_timeframe(
-                            user_id=user_id,
-                            start_date=datetime.datetime.combine(week_start, datetime.time()),
-                            end_date=datetime.datetime.combine(week_end, datetime.time()),
-                        )
+                    cur.execute(*leader_board_query(user, limit, pending_user_ids))
+                    result = [leader_board_user_from_row(row) for row in cur.fetchall()]
 
-                        result.append(User(
-                            user_id=user_id,
-                            user_name=user_name,
-                            user_uuid=user_uuid,
-                            random_id=random_id,
-                            xp_count=xp_count,
-                        ))
-                        
         except Exception as e:
             logger.exception(e)
-    
+
         return result
+
+
+# Every call is a span of the traced request. Generators are left as they are,
+# because their queries run while they are read, after the call returned
+for _name, _attribute in vars(ControllerDatabase).copy().items():
+    if isinstance(_attribute, staticmethod) and not inspect.isgeneratorfunction(_attribute.__func__):
+        setattr(ControllerDatabase, _name, staticmethod(Tracer.traced(_attribute.__func__)))
+
+del _name, _attribute
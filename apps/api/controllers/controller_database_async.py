@@ -0,0 +1,828 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import datetime
+import functools
+import inspect
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from os import environ
+from typing import Any, Callable, Dict, List, Tuple
+
+from loguru import logger
+
+from controllers.controller_database import (
+    accept_friend_request_query,
+    add_users_xp_query,
+    cache_token_user_id,
+    cached_token_user_id,
+    ControllerDatabase,
+    create_cards_query,
+    deck_cards_query,
+    decks_labels_query,
+    delete_card_query,
+    delete_cards_query,
+    delete_friend_request_query,
+    due_cards_query,
+    edit_card_query,
+    edit_cards_query,
+    friend_request_from_row,
+    insert_card_query,
+    insert_friend_request_query,
+    labels_by_id_from_rows,
+    LEADER_BOARD_SIZE,
+    leader_board_query,
+    leader_board_user_from_row,
+    ranked_users_query,
+    searched_user_from_row,
+    searched_users_query,
+    study_set_from_row,
+    study_sets_labels_query,
+    typeahead_users_query,
+    user_decks_query,
+    user_friend_request_from_row,
+    user_friend_requests_query,
+    user_from_row,
+    user_study_set_from_row,
+    user_study_sets_query,
+    user_total_xp_query,
+    user_xp_in_timeframe_query,
+    xp_from_row,
+)
+from models.card import Card, CardRow
+from models.deck import Deck, DeckRow
+from models.friend_request import FriendRequest
+from models.label import Label
+from models.study_set import StudySet
+from models.user import User
+from models.xp import Xp
+from utils.common_utils import CommonUtils
+from utils.identity_map import IdentityMap
+from utils.query_registry import QueryRegistry
+from utils.request_profiler import RequestProfiler
+from utils.tracer import Tracer
+
+
+class AsyncControllerDatabase:
+    """
+    Coroutine version of ControllerDatabase.
+    Every ControllerDatabase static method is available here with the same
+    name and arguments, but has to be awaited.
+    The methods that routes call on every request run on asynchronous connections,
+    so they never leave the event loop. These are the lookups by id and uuid,
+    the listings, the xp and leaderboard, friend requests and card changes.
+    They run the same queries as ControllerDatabase, from the *_query functions next to it.
+    The other methods, like the inserts and deletes of users, tokens, decks,
+    study_sets and labels, review_cards and the bulk copies, run the blocking psycopg2 calls
+    on a dedicated executor with DB_EXECUTOR_MAX_WORKERS workers.
+    """
+    _executor: ThreadPoolExecutor = None
+    _executor_lock = threading.Lock()
+
+    @staticmethod
+    def executor() -> ThreadPoolExecutor:
+        """
+        Used for getting the executor that blocking database calls run on
+        :return: a ThreadPoolExecutor
+        """
+        if AsyncControllerDatabase._executor is None:
+            with AsyncControllerDatabase._executor_lock:
+                if AsyncControllerDatabase._executor is None:
+                    AsyncControllerDatabase._executor = ThreadPoolExecutor(
+                        max_workers=int(environ.get("DB_EXECUTOR_MAX_WORKERS", 40)),
+                        thread_name_prefix="database",
+                    )
+
+        return AsyncControllerDatabase._executor
+
+    @staticmethod
+    def shutdown() -> None:
+        """
+        Used for stopping the executor on shutdown
+        """
+        with AsyncControllerDatabase._executor_lock:
+            if AsyncControllerDatabase._executor is not None:
+                AsyncControllerDatabase._executor.shutdown(wait=True)
+                AsyncControllerDatabase._executor = None
+
+    @staticmethod
+    async def run(func: Callable, *args, **kwargs) -> Any:
+        """
+        Used for awaiting any function that uses the database,
+        for example the ControllerUser methods.
+        The function runs in a copy of the current context
+        :param func: the blocking function
+        :return: the return value of the function
+        """
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+
+        if RequestProfiler.is_active():
+            func = functools.partial(RequestProfiler.call, func)
+        call = functools.partial(context.run, func, *args, **kwargs)
+
+        return await loop.run_in_executor(AsyncControllerDatabase.executor(), call)
+
+    @staticmethod
+    async def _execute(query: Tuple[str, dict]) -> bool:
+        """
+        Used for running one statement whose result is not needed
+        :param query: the query and its parameters
+        :return: bool of weather or not the statement was successful
+        """
+        result = False
+
+        try:
+            async with CommonUtils.async_connection() as conn:
+                with conn.cursor() as cur:
+                    await cur.execute(*query)
+                    result = True
+        except Exception as e:
+            logger.exception(e)
+
+        return result
+
+    #  Functions for users table
+    @staticmethod
+    async def get_user_by_query(query_name: str, parameters: dict) -> User:
+        """
+        Used for getting a user with a registered query
+        :param parameters: A dictionary of values vor the query
+        :param query_name: The name of the query in QueryRegistry, for example "user_by_id"
+        :return: a User model
+        """
+        result = None
+
+        try:
+            async with CommonUtils.async_connection() as conn:
+                with conn.cursor() as cur:
+                    await QueryRegistry.execute_async(cur, query_name, parameters)
+                    result = user_from_row(cur.fetchone())
+
+            IdentityMap.add(User, result.user_id, result, result.user_uuid)
+        except Exception as e:
+            logger.exception(e)
+
+        return result
+
+    @staticmethod
+    async def get_user_by_email(email: str) -> User:
+        parameters = {"email": email}
+
+        user = await AsyncControllerDatabase.get_user_by_query("user_by_email", parameters)
+
+        return user
+
+    @staticmethod
+    async def get_user(user_id: int) -> User:
+        user = IdentityMap.get(User, user_id)
+        if user:
+            return user
+
+        parameters = {"user_id": user_id}
+
+        user = await AsyncControllerDatabase.get_user_by_query("user_by_id", parameters)
+
+        return user
+
+    @staticmethod
+    async def get_user_by_uuid(user_uuid: str) -> User:
+        user = IdentityMap.get_by_uuid(User, user_uuid)
+        if user:
+            return user
+
+        parameters = {"user_uuid": user_uuid}
+
+        user = await AsyncControllerDatabase.get_user_by_query("user_by_uuid", parameters)
+
+        return user
+
+    @staticmethod
+    async def get_user_id_by_uuid(user_uuid: str) -> int:
+        """
+        Used for getting the id of a user
+        :param user_uuid: the uuid of the user
+        :return: the id of the user
+        """
+        result = 0
+
+        user = IdentityMap.get_by_uuid(User, user_uuid)
+        if user:
+            return user.user_id
+
+        try:
+            async with CommonUtils.async_connection() as conn:
+                with conn.cursor() as cur:
+                    await QueryRegistry.execute_async(cur, "user_id_by_uuid", {"user_uuid": user_uuid})
+
+                    if cur.rowcount:
+                        (result, ) = cur.fetchone()
+
+        except Exception as e:
+            logger.exception(e)
+
+        return result
+
+    @staticmethod
+    async def get_user_id_by_token_uuid(token_uuid: str) -> int:
+        """
+        Used for getting the id of the user a token belongs to.
+        Results are cached in the token_cache of ControllerDatabase
+        :param token_uuid: the uuid of the token
+        :return: the id of the user, 0 if the token is not valid
+        """
+        result = 0
+
+        token_uuid, cached_user_id = cached_token_user_id(token_uuid)
+        if cached_user_id is not None:
+            return cached_user_id
+
+        try:
+            async with CommonUtils.async_connection() as conn:
+                with conn.cursor() as cur:
+                    await QueryRegistry.execute_async(cur, "user_id_by_token_uuid", {"token_uuid": token_uuid})
+
+                    if cur.rowcount:
+                        (result, ) = cur.fetchone()
+
+            cache_token_user_id(token_uuid, result)
+        except Exception as e:
+            logger.exception(e)
+
+        return result
+
+    @staticmethod
+    async def load_searched_users(search_phrase: str, cursor: str = "", page_size: int = 10) -> List[User]:
+        result = []
+
+        try:
+            async with CommonUtils.async_connection() as conn:
+                with conn.cursor() as cur:
+                    await cur.execute(*searched_users_query(search_phrase, cursor, page_size))
+                    result = [searched_user_from_row(row) for row in cur.fetchall()]
+
+        except Exception as e:
+            logger.exception(e)
+
+        return result
+
+    @staticmethod
+    async def search_users_ranked(search_phrase: str, page_size: int = 10) -> List[User]:
+        result = []
+
+        try:
+            async with CommonUtils.async_connection() as conn:
+                with conn.cursor() as cur:
+                    await cur.execute(*ranked_users_query(search_phrase, page_size))
+                    result = [searched_user_from_row(row) for row in cur.fetchall()]
+
+        except Exception as e:
+            logger.exception(e)
+
+        return result
+
+    @staticmethod
+    async def load_typeahead_users(name_prefix: str, limit: int = 8) -> List[User]:
+        result = []
+
+        if not name_prefix:
+            return result
+
+        try:
+            async with CommonUtils.async_connection() as conn:
+                with conn.cursor() as cur:
+                    await cur.execute(*typeahead_users_query(name_prefix, limit))
+                    result = [searched_user_from_row(row) for row in cur.fetchall()]
+
+        except Exception as e:
+            logger.exception(e)
+
+        return result
+
+    #  Functions for friend_requests table
+    @staticmethod
+    async def get_friend_request_by_query(query_name: str, parameters: dict) -> FriendRequest:
+        """
+        Used for getting a friend request with a registered query
+        :param parameters: A dictionary of values vor the query
+        :param query_name: The name of the query in QueryRegistry, for example "friend_request_by_id"
+        :return: a FriendRequest model
+        """
+        result = None
+
+        try:
+            async with CommonUtils.async_connection() as conn:
+                with conn.cursor() as cur:
+                    await QueryRegistry.execute_async(cur, query_name, parameters)
+                    result = friend_request_from_row(cur.fetchone())
+
+        except Exception as e:
+            logger.exception(e)
+
+        return result
+
+    @staticmethod
+    async def get_friend_request(friend_request_id: int) -> FriendRequest:
+        parameters = {"friend_request_id": friend_request_id}
+
+        friend_request = await AsyncControllerDatabase.get_friend_request_by_query("friend_request_by_id", parameters)
+
+        return friend_request
+
+    @staticmethod
+    async def get_friend_request_by_uuid(friend_request_uuid: str) -> FriendRequest:
+        parameters = {"friend_request_uuid": friend_request_uuid}
+
+        friend_request = await AsyncControllerDatabase.get_friend_request_by_query(
+            "friend_request_by_uuid", parameters
+        )
+
+        return friend_request
+
+    @staticmethod
+    async def get_friend_request_id_by_uuid(friend_request_uuid: str) -> int:
+        result = 0
+
+        try:
+            async with CommonUtils.async_connection() as conn:
+                with conn.cursor() as cur:
+                    await QueryRegistry.execute_async(
+                        cur, "friend_request_id_by_uuid", {"friend_request_uuid": friend_request_uuid}
+                    )
+
+                    if cur.rowcount:
+                        (result, ) = cur.fetchone()
+
+        except Exception as e:
+            logger.exception(e)
+
+        return result
+
+    @staticmethod
+    async def insert_friend_request(friend_request: FriendRequest) -> bool:
+        return await AsyncControllerDatabase._execute(insert_friend_request_query(friend_request))
+
+    @staticmethod
+    async def delete_friend_request(friend_request: FriendRequest) -> bool:
+        return await AsyncControllerDatabase._execute(delete_friend_request_query(friend_request))
+
+    @staticmethod
+    async def accept_friend_request(friend_request: FriendRequest) -> bool:
+        return await AsyncControllerDatabase._execute(accept_friend_request_query(friend_request))
+
+    @staticmethod
+    async def get_user_friend_requests(
+            user_id,
+            is_accepted: bool,
+            cursor: str = "",
+            page_size: int = None,
+    ) -> List[FriendRequest]:
+        friend_requests = []
+
+        try:
+            async with CommonUtils.async_connection() as conn:
+                with conn.cursor() as cur:
+                    await cur.execute(*user_friend_requests_query(user_id, is_accepted, cursor, page_size))
+                    friend_requests = [user_friend_request_from_row(row) for row in cur.fetchall()]
+
+        except Exception as e:
+            logger.exception(e)
+
+        return friend_requests
+
+    #  Functions for decks table
+    @staticmethod
+    async def get_deck_by_query(query_name: str, parameters: dict) -> DeckRow:
+        """
+        Used for getting a deck with a registered query
+        :param parameters: A dictionary of values vor the query
+        :param query_name: The name of the query in QueryRegistry, for example "deck_by_id"
+        :return: a DeckRow
+        """
+        result = None
+
+        try:
+            async with CommonUtils.async_connection() as conn:
+                with conn.cursor() as cur:
+                    await QueryRegistry.execute_async(cur, query_name, parameters)
+                    result = DeckRow(*cur.fetchone())
+
+            IdentityMap.add(Deck, result.deck_id, result, result.deck_uuid)
+        except Exception as e:
+            logger.exception(e)
+
+        return result
+
+    @staticmethod
+    async def get_deck(deck_id: int) -> DeckRow:
+        deck = IdentityMap.get(Deck, deck_id)
+        if deck:
+            return deck
+
+        parameters = {"deck_id": deck_id}
+
+        deck = await AsyncControllerDatabase.get_deck_by_query("deck_by_id", parameters)
+
+        return deck
+
+    @staticmethod
+    async def get_deck_by_uuid(deck_uuid: str) -> DeckRow:
+        deck = IdentityMap.get_by_uuid(Deck, deck_uuid)
+        if deck:
+            return deck
+
+        parameters = {"deck_uuid": deck_uuid}
+
+        deck = await AsyncControllerDatabase.get_deck_by_query("deck_by_uuid", parameters)
+
+        return deck
+
+    @staticmethod
+    async def get_user_decks(
+            user_id: int,
+            is_owner: bool = False,
+            cursor: str = "",
+            page_size: int = None,
+    ) -> List[DeckRow]:
+        decks = []
+
+        try:
+            async with CommonUtils.async_connection() as conn:
+                with conn.cursor() as cur:
+                    await cur.execute(*user_decks_query(user_id, is_owner, cursor, page_size))
+                    decks = [DeckRow(*row) for row in cur.fetchall()]
+
+                    deck_ids = list({deck.deck_id for deck in decks})
+                    labels_by_deck = await AsyncControllerDatabase.get_decks_labels_w_cur(cur, deck_ids)
+
+                    for deck in decks:
+                        deck.labels = list(labels_by_deck.get(deck.deck_id, []))
+
+        except Exception as e:
+            logger.exception(e)
+
+        return decks
+
+    #  Functions for cards table
+    @staticmethod
+    async def get_card_by_query(query_name: str, parameters: dict) -> CardRow:
+        """
+        Used for getting a card with a registered query
+        :param parameters: A dictionary of values vor the query
+        :param query_name: The name of the query in QueryRegistry, for example "card_by_id"
+        :return: a CardRow
+        """
+        result = None
+
+        try:
+            async with CommonUtils.async_connection() as conn:
+                with conn.cursor() as cur:
+                    await QueryRegistry.execute_async(cur, query_name, parameters)
+                    result = CardRow(*cur.fetchone())
+
+            IdentityMap.add(Card, result.card_id, result, result.card_uuid)
+        except Exception as e:
+            logger.exception(e)
+
+        return result
+
+    @staticmethod
+    async def get_card(card_id: int) -> CardRow:
+        card = IdentityMap.get(Card, card_id)
+        if card:
+            return card
+
+        parameters = {"card_id": card_id}
+
+        card = await AsyncControllerDatabase.get_card_by_query("card_by_id", parameters)
+
+        return card
+
+    @staticmethod
+    async def get_card_by_uuid(card_uuid: str) -> CardRow:
+        card = IdentityMap.get_by_uuid(Card, card_uuid)
+        if card:
+            return card
+
+        parameters = {"card_uuid": card_uuid}
+
+        card = await AsyncControllerDatabase.get_card_by_query("card_by_uuid", parameters)
+
+        return card
+
+    @staticmethod
+    async def insert_card(card: Card) -> CardRow:
+        result = None
+        result_card_id = 0
+
+        try:
+            async with CommonUtils.async_connection() as conn:
+                with conn.cursor() as cur:
+                    await cur.execute(*insert_card_query(card))
+
+                    if cur.rowcount:
+                        result_card_id = cur.fetchone()[0]
+
+        except Exception as e:
+            logger.exception(e)
+
+        if result_card_id:
+            result = await AsyncControllerDatabase.get_card(result_card_id)
+
+        return result
+
+    @staticmethod
+    async def get_deck_cards(deck_id: int, cursor: str = "", page_size: int = None) -> List[CardRow]:
+        cards = []
+
+        try:
+            async with CommonUtils.async_connection() as conn:
+                with conn.cursor() as cur:
+                    await cur.execute(*deck_cards_query(deck_id, cursor, page_size))
+                    cards = [CardRow(*row) for row in cur.fetchall()]
+
+        except Exception as e:
+            logger.exception(e)
+
+        return cards
+
+    @staticmethod
+    async def delete_card(card: Card) -> bool:
+        result = await AsyncControllerDatabase._execute(delete_card_query(card))
+
+        if result:
+            IdentityMap.discard(Card, card.card_id)
+
+        return result
+
+    @staticmethod
+    async def edit_card(card: Card) -> CardRow:
+        result = Card()
+
+        try:
+            async with CommonUtils.async_connection() as conn:
+                with conn.cursor() as cur:
+                    await cur.execute(*edit_card_query(card))
+                    result = CardRow(*cur.fetchone())
+
+            IdentityMap.add(Card, result.card_id, result, result.card_uuid)
+        except Exception as e:
+            logger.exception(e)
+
+        return result
+
+    @staticmethod
+    async def apply_card_operations(
+            deck_id: int,
+            created_cards: List[Tuple[str, str]],
+            edited_cards: List[Tuple[str, str, str]],
+            deleted_card_uuids: List[str],
+    ) -> Dict:
+        result = None
+        changed_card_ids = []
+
+        try:
+            async with CommonUtils.async_transaction() as conn:
+                with conn.cursor() as cur:
+                    created_card_uuids = []
+                    if created_cards:
+                        await cur.execute(*create_cards_query(deck_id, created_cards))
+                        created_card_uuids = [str(card_uuid) for (card_uuid, ) in cur.fetchall()]
+
+                    edited_card_uuids = []
+                    if edited_cards:
+                        await cur.execute(*edit_cards_query(deck_id, edited_cards))
+                        for card_id, card_uuid in cur.fetchall():
+                            changed_card_ids.append(card_id)
+                            edited_card_uuids.append(str(card_uuid))
+
+                    deleted_uuids = []
+                    if deleted_card_uuids:
+                        await cur.execute(*delete_cards_query(deck_id, deleted_card_uuids))
+                        for card_id, card_uuid in cur.fetchall():
+                            changed_card_ids.append(card_id)
+                            deleted_uuids.append(str(card_uuid))
+
+                    result = {
+                        "created_card_uuids": created_card_uuids,
+                        "edited_card_uuids": edited_card_uuids,
+                        "deleted_card_uuids": deleted_uuids,
+                    }
+
+            for card_id in changed_card_ids:
+                IdentityMap.discard(Card, card_id)
+        except Exception as e:
+            logger.exception(e)
+            result = None
+
+        return result
+
+    #  Functions for card_review_states table
+    @staticmethod
+    async def get_due_cards(
+            user_id: int,
+            deck_id: int,
+            limit: int = 20,
+            now: datetime.datetime = None,
+    ) -> List[CardRow]:
+        cards = []
+
+        try:
+            async with CommonUtils.async_connection() as conn:
+                with conn.cursor() as cur:
+                    await cur.execute(*due_cards_query(user_id, deck_id, limit, now))
+                    cards = [CardRow(*row) for row in cur.fetchall()]
+
+        except Exception as e:
+            logger.exception(e)
+
+        return cards
+
+    #  Functions for study_sets table
+    @staticmethod
+    async def get_study_set_by_query(query_name: str, parameters: dict) -> StudySet:
+        """
+        Used for getting a study_set with a registered query
+        :param parameters: A dictionary of values vor the query
+        :param query_name: The name of the query in QueryRegistry, for example "study_set_by_id"
+        :return: a StudySet model
+        """
+        result = None
+
+        try:
+            async with CommonUtils.async_connection() as conn:
+                with conn.cursor() as cur:
+                    await QueryRegistry.execute_async(cur, query_name, parameters)
+                    result = study_set_from_row(cur.fetchone())
+
+            IdentityMap.add(StudySet, result.study_set_id, result, result.study_set_uuid)
+        except Exception as e:
+            logger.exception(e)
+
+        return result
+
+    @staticmethod
+    async def get_study_set(study_set_id: int) -> StudySet:
+        study_set = IdentityMap.get(StudySet, study_set_id)
+        if study_set:
+            return study_set
+
+        parameters = {"study_set_id": study_set_id}
+
+        study_set = await AsyncControllerDatabase.get_study_set_by_query("study_set_by_id", parameters)
+
+        return study_set
+
+    @staticmethod
+    async def get_study_set_by_uuid(study_set_uuid: str) -> StudySet:
+        study_set = IdentityMap.get_by_uuid(StudySet, study_set_uuid)
+        if study_set:
+            return study_set
+
+        parameters = {"study_set_uuid": study_set_uuid}
+
+        study_set = await AsyncControllerDatabase.get_study_set_by_query("study_set_by_uuid", parameters)
+
+        return study_set
+
+    @staticmethod
+    async def get_user_study_sets(
+            user_id: int,
+            is_owner: bool = False,
+            cursor: str = "",
+            page_size: int = None,
+    ) -> List[StudySet]:
+        study_sets = []
+
+        try:
+            async with CommonUtils.async_connection() as conn:
+                with conn.cursor() as cur:
+                    await cur.execute(*user_study_sets_query(user_id, is_owner, cursor, page_size))
+                    study_sets = [user_study_set_from_row(row) for row in cur.fetchall()]
+
+                    study_set_ids = list({study_set.study_set_id for study_set in study_sets})
+                    labels_by_study_set = await AsyncControllerDatabase.get_study_sets_labels_w_cur(cur, study_set_ids)
+
+                    for study_set in study_sets:
+                        study_set.labels = list(labels_by_study_set.get(study_set.study_set_id, []))
+
+        except Exception as e:
+            logger.exception(e)
+
+        return study_sets
+
+    #  Functions for labels table
+    @staticmethod
+    async def get_decks_labels_w_cur(cur, deck_ids: List[int]) -> Dict[int, List[Label]]:
+        if not deck_ids:
+            return {}
+
+        await cur.execute(*decks_labels_query(deck_ids))
+
+        return labels_by_id_from_rows(cur.fetchall())
+
+    @staticmethod
+    async def get_study_sets_labels_w_cur(cur, study_set_ids: List[int]) -> Dict[int, List[Label]]:
+        if not study_set_ids:
+            return {}
+
+        await cur.execute(*study_sets_labels_query(study_set_ids))
+
+        return labels_by_id_from_rows(cur.fetchall())
+
+    # Functions for the xp table
+    @staticmethod
+    async def update_user_xp(user_id: int, xp_count: int, day: datetime.date = None) -> bool:
+        if not day:
+            day = datetime.datetime.now().date()
+
+        return await AsyncControllerDatabase.update_users_xp({(user_id, day): xp_count})
+
+    @staticmethod
+    async def update_users_xp(xp_counts: Dict[Tuple[int, datetime.date], int]) -> bool:
+        if not xp_counts:
+            return True
+
+        return await AsyncControllerDatabase._execute(add_users_xp_query(xp_counts))
+
+    @staticmethod
+    async def get_user_total_xp(user_id: int) -> int:
+        result = 0
+
+        try:
+            async with CommonUtils.async_connection() as conn:
+                with conn.cursor() as cur:
+                    await cur.execute(*user_total_xp_query(user_id))
+
+                    if cur.rowcount:
+                        (result, ) = cur.fetchone()
+
+        except Exception as e:
+            logger.exception(e)
+
+        return result
+
+    @staticmethod
+    async def get_user_xp_in_timeframe(
+            user_id: int,
+            start_date: datetime.date,
+            end_date: datetime.date,
+    ) -> List[Xp]:
+        result = []
+
+        try:
+            async with CommonUtils.async_connection() as conn:
+                with conn.cursor() as cur:
+                    await cur.execute(*user_xp_in_timeframe_query(user_id, start_date, end_date))
+                    result = [xp_from_row(row) for row in cur.fetchall()]
+
+        except Exception as e:
+            logger.exception(e)
+
+        return result
+
+    @staticmethod
+    async def get_user_leader_board(
+            user: User,
+            limit: int = LEADER_BOARD_SIZE,
+            pending_user_ids: List[int] = None,
+    ) -> List[User]:
+        result = []
+
+        try:
+            async with CommonUtils.async_connection() as conn:
+                with conn.cursor() as cur:
+                    await cur.execute(*leader_board_query(user, limit, pending_user_ids))
+                    result = [leader_board_user_from_row(row) for row in cur.fetchall()]
+
+        except Exception as e:
+            logger.exception(e)
+
+        return result
+
+
+def _mirror(func: Callable) -> Callable:
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await AsyncControllerDatabase.run(func, *args, **kwargs)
+
+    return staticmethod(wrapper)
+
+
+# Every call of the native coroutines is a span of the traced request,
+# the mirrored methods are traced by ControllerDatabase itself
+for _name, _attribute in vars(AsyncControllerDatabase).copy().items():
+    if isinstance(_attribute, staticmethod) and inspect.iscoroutinefunction(_attribute.__func__) \
+            and _name != "run" and not _name.startswith("_"):
+        setattr(AsyncControllerDatabase, _name, staticmethod(Tracer.traced(_attribute.__func__)))
+
+# Methods that take an open cursor are only helpers for other methods,
+# and generators are read by the caller one item at a time, so they are not mirrored
+for _name, _attribute in vars(ControllerDatabase).items():
+    if isinstance(_attribute, staticmethod) and not hasattr(AsyncControllerDatabase, _name):
+        if "cur" not in inspect.signature(_attribute.__func__).parameters \
+                and not inspect.isgeneratorfunction(_attribute.__func__):
+            setattr(AsyncControllerDatabase, _name, _mirror(_attribute.__func__))
+
+del _name, _attribute
@@ -1,9 +1,10 @@
 import datetime
+import time
 
 import uvicorn
-from fastapi import FastAPI, Form, status, Response, Request, Header
+from fastapi import FastAPI, Form, status, Response, Request, Header, File, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import RedirectResponse
+from fastapi.responses import RedirectResponse, StreamingResponse, PlainTextResponse
 from fastapi_mail import ConnectionConfig, FastMail, MessageSchema, MessageType
 
 from jinja2 import Environment, PackageLoader, select_autoescape
@@ -11,7 +12,11 @@ from jinja2 import Environment, PackageLoader, select_autoescape
 from loguru import logger
 
 from controllers.constants import ADMIN_EMAIL, ADMIN_EMAIL_PASSWORD, SERVER_NAME, ADMIN_EMAIL_USERNAME
-from controllers.controller_database import ControllerDatabase
+from controllers.constants import XP_FLUSH_INTERVAL, XP_FLUSH_SIZE, XP_BUFFER_MAX_SIZE
+from controllers.constants import REVIEW_FLUSH_INTERVAL, REVIEW_FLUSH_SIZE, REVIEW_BUFFER_MAX_SIZE
+from controllers.controller_database import ControllerDatabase, LEADER_BOARD_SIZE
+from controllers.controller_database_async import AsyncControllerDatabase
+from controllers.controller_cards import ControllerCards, IMPORT_FORMATS, EXPORT_MEDIA_TYPES
 from controllers.controller_labels import ControllerLabels
 from controllers.controller_user import ControllerUser
 from models.token import Token
@@ -20,6 +25,16 @@ from models.deck import Deck
 from models.friend_request import FriendRequest
 from models.study_set import StudySet
 from models.user import User
+from utils.common_utils import CommonUtils
+from utils.identity_map import IdentityMap
+from utils.metrics import Metrics
+from utils.pagination import Pagination, DEFAULT_PAGE_SIZE
+from utils.query_registry import QueryRegistry
+from utils.request_profiler import RequestProfiler
+from utils.slow_query_log import SlowQueryLog
+from utils.review_event_buffer import ReviewEventBuffer
+from utils.tracer import Tracer
+from utils.xp_buffer import XpBuffer
 from web.register_page import validate_form
 
 app = FastAPI()
@@ -51,6 +66,218 @@ jinja_env = Environment(
 )
 
 
+@app.middleware("http")
+async def identity_map_scope(request: Request, call_next):
+    """
+    Models loaded from the database are shared within one request
+    """
+    with IdentityMap.scope():
+        return await call_next(request)
+
+
+@app.middleware("http")
+async def record_metrics(request: Request, call_next):
+    """
+    Records the latency and database use of every request, per route
+    """
+    start_time = time.perf_counter()
+
+    with Metrics.request() as request_metrics:
+        response = await call_next(request)
+
+    Metrics.record_request(
+        Metrics.route_path(request.scope),
+        request.method,
+        time.perf_counter() - start_time,
+        request_metrics,
+    )
+
+    return response
+
+
+@app.middleware("http")
+async def profile_request(request: Request, call_next):
+    """
+    Requests with the profile header and the admin token run under cProfile.
+    The summary is stored and its id is sent back in the profile-id header
+    """
+    if not request.headers.get("profile") or not CommonUtils.is_admin_token(request.headers.get("admin-token", "")):
+        return await call_next(request)
+
+    with RequestProfiler.request() as request_profile:
+        response = await call_next(request)
+
+    response.headers["profile-id"] = RequestProfiler.store(request.method, request.url.path, request_profile)
+
+    return response
+
+
+@app.middleware("http")
+async def trace_request(request: Request, call_next):
+    """
+    A sample of requests is traced, with a root span per request.
+    Requests with the trace header and the admin token are always traced
+    """
+    is_forced = bool(request.headers.get("trace")) and CommonUtils.is_admin_token(request.headers.get("admin-token", ""))
+
+    with Tracer.request(f"{request.method} {request.url.path}", is_forced) as root_span:
+        response = await call_next(request)
+
+        if root_span is not None:
+            root_span.name = f"{request.method} {Metrics.route_path(request.scope)}"
+            response.headers["trace-id"] = root_span.trace.trace_id
+
+    return response
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """
+    Prometheus endpoint with the latency, database queries, database time
+    and connections opened of every route
+    :return: the metrics in the Prometheus text format
+    """
+    return PlainTextResponse(Metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+xp_buffer = XpBuffer(
+    flush=ControllerDatabase.update_users_xp,
+    flush_interval=XP_FLUSH_INTERVAL,
+    flush_size=XP_FLUSH_SIZE,
+    max_size=XP_BUFFER_MAX_SIZE,
+)
+
+review_event_buffer = ReviewEventBuffer(
+    flush=ControllerDatabase.copy_review_events,
+    flush_interval=REVIEW_FLUSH_INTERVAL,
+    flush_size=REVIEW_FLUSH_SIZE,
+    max_size=REVIEW_BUFFER_MAX_SIZE,
+)
+
+
+@app.on_event("startup")
+async def start_xp_buffer():
+    xp_buffer.start()
+    review_event_buffer.start()
+
+
+@app.on_event("shutdown")
+async def close_database_pool():
+    await AsyncControllerDatabase.run(xp_buffer.stop)
+    await AsyncControllerDatabase.run(review_event_buffer.stop)
+    AsyncControllerDatabase.shutdown()
+    CommonUtils.close_pool()
+    await CommonUtils.close_async_pool()
+    QueryRegistry.log_stats()
+
+
+@app.get("/get_slow_queries", status_code=status.HTTP_200_OK)
+async def get_slow_queries(
+        response: Response,
+        admin_token: str = Header("", alias="admin-token"),
+):
+    """
+    Admin endpoint for getting the slowest database queries since the server started
+    :param response: the fastapi response
+    :param admin_token: the ADMIN_TOKEN of the server
+    :return: {
+        "slow_queries": [
+            {
+                "method": the ControllerDatabase method that ran it,
+                "query": str,
+                "parameters": the redacted parameters,
+                "duration_ms": float,
+                "time": str,
+                "plan": the EXPLAIN (ANALYZE, BUFFERS) output or None if it was not sampled,
+            }
+        ]
+    }
+    """
+    if not CommonUtils.is_admin_token(admin_token):
+        response.status_code = status.HTTP_403_FORBIDDEN
+        return
+
+    return {"slow_queries": SlowQueryLog.slowest()}
+
+
+@app.get("/get_traces", status_code=status.HTTP_200_OK)
+async def get_traces(
+        response: Response,
+        trace_id: str = "",
+        admin_token: str = Header("", alias="admin-token"),
+):
+    """
+    Admin endpoint for getting the latest traced requests
+    :param response: the fastapi response
+    :param trace_id: the trace-id header of a traced response, all latest traces are returned if it is empty
+    :param admin_token: the ADMIN_TOKEN of the server
+    :return: {
+        "traces": [
+            {
+                "trace_id": str,
+                "time": the unix time the request started,
+                "spans": [
+                    {
+                        "span_id": str,
+                        "parent_id": the span_id of the parent span or None for the request span,
+                        "name": str,
+                        "start_ms": float, since the request started,
+                        "duration_ms": float,
+                        "row_count": int,
+                        "query_count": int,
+                    }
+                ]
+            }
+        ]
+    }
+    """
+    if not CommonUtils.is_admin_token(admin_token):
+        response.status_code = status.HTTP_403_FORBIDDEN
+        return
+
+    traces = Tracer.traces()
+
+    if trace_id:
+        traces = [trace for trace in traces if trace["trace_id"] == trace_id]
+
+    return {"traces": traces}
+
+
+@app.get("/get_request_profile", status_code=status.HTTP_200_OK)
+async def get_request_profile(
+        response: Response,
+        profile_id: str,
+        admin_token: str = Header("", alias="admin-token"),
+):
+    """
+    Admin endpoint for getting the profile of a request that was sent with the profile header
+    :param response: the fastapi response
+    :param profile_id: the profile-id header of the profiled response
+    :param admin_token: the ADMIN_TOKEN of the server
+    :return: {
+        "profile_id": str,
+        "method": str,
+        "path": str,
+        "time": str,
+        "total_time": float,
+        "categories": seconds spent in psycopg2, dataclasses_json serialization,
+            model construction, form parsing, event loop waiting and other code,
+        "call_tree": the functions with the highest cumulative time, as text,
+    }
+    """
+    if not CommonUtils.is_admin_token(admin_token):
+        response.status_code = status.HTTP_403_FORBIDDEN
+        return
+
+    profile = RequestProfiler.get(profile_id)
+
+    if not profile:
+        response.status_code = status.HTTP_404_NOT_FOUND
+        return
+
+    return profile
+
+
 @app.get("/verify_email/{user_uuid}", response_class=RedirectResponse, status_code=302)
 async def verify_email(response: Response, user_uuid: str):
     """
@@ -61,8 +288,8 @@ async def verify_email(response: Response, user_uuid: str):
     :param user_uuid: the uuid of the user
     :return: Sends the user to the login view
     """
-    user = ControllerDatabase.get_user_by_uuid(user_uuid)
-    is_successful = ControllerDatabase.set_user_email_verified(user)
+    user = await AsyncControllerDatabase.get_user_by_uuid(user_uuid)
+    is_successful = await AsyncControllerDatabase.set_user_email_verified(user)
     
     if is_successful:
         response.headers["token"] = user.token.token_uuid
@@ -72,45 +299,113 @@ async def verify_email(response: Response, user_uuid: str):
 
 # These post methods act as get methods, but they have forms
 @app.post("/get_searched_users", status_code=status.HTTP_200_OK)
-def get_searched_users(
+async def get_searched_users(
         search_phrase: str = Form(...),
-        search_page: int = Form(...),
+        cursor: str = Form(""),
+        page_size: int = Form(10),
+        is_ranked: bool = Form(False),
 ):
     """
     Ajax endpoint for getting searched users
-    :return: A list of dictionaries {
-        "user_uuid": Str of the users uuid,
-        "user_name": Str of the users name,
-        "random_id": Int of the 4 random numbers "username #1234",
+    :param search_phrase: the name or email to search for
+    :param cursor: next_cursor of the previous page, empty for the first page
+    :param page_size: the max amount of users
+    :param is_ranked: if true, also matches name prefixes and similar names,
+    best matches first. Ranked searches only have one page
+    :return: {
+        "users": A list of dictionaries {
+            "user_uuid": Str of the users uuid,
+            "user_name": Str of the users name,
+            "random_id": Int of the 4 random numbers "username #1234",
+        },
+        "next_cursor": Str, empty if there are no more pages
     }
     """
+    if is_ranked:
+        users = await AsyncControllerDatabase.search_users_ranked(
+            search_phrase=search_phrase,
+            page_size=page_size,
+        )
+    else:
+        users = await AsyncControllerDatabase.load_searched_users(
+            search_phrase=search_phrase,
+            cursor=cursor,
+            page_size=page_size,
+        )
+
+    result = []
+    for user in users:
+        result.append({
+            "user_uuid": user.user_uuid,
+            "user_name": user.user_name,
+            "random_id": user.random_id,
+        })
 
-    result = ControllerDatabase.load_searched_users(
-        search_phrase=search_phrase,
-        search_page=search_page
-    )
+    next_cursor = ""
+    if not is_ranked:
+        next_cursor = Pagination.next_cursor(users, page_size, "user_id")
 
-    return result
+    return {
+        "users": result,
+        "next_cursor": next_cursor,
+    }
+
+
+@app.post("/get_typeahead_users", status_code=status.HTTP_200_OK)
+async def get_typeahead_users(
+        name_prefix: str = Form(...),
+        limit: int = Form(8),
+):
+    """
+    Ajax endpoint for suggesting users while their name is typed
+    :param name_prefix: the start of the users name
+    :param limit: the max amount of users
+    :return: {
+        "users": A list of dictionaries {
+            "user_uuid": Str of the users uuid,
+            "user_name": Str of the users name,
+            "random_id": Int of the 4 random numbers "username #1234",
+        }
+    }
+    """
+    result = []
+
+    for user in await AsyncControllerDatabase.load_typeahead_users(name_prefix=name_prefix, limit=limit):
+        result.append({
+            "user_uuid": user.user_uuid,
+            "user_name": user.user_name,
+            "random_id": user.random_id,
+        })
+
+    return {"users": result}
 
 
 @app.post("/get_user_study_sets", status_code=status.HTTP_200_OK)
-def get_user_study_sets(
+async def get_user_study_sets(
         request: Request,
         user_uuid: str = Form(...),
+        cursor: str = Form(""),
+        page_size: int = Form(DEFAULT_PAGE_SIZE),
 ):
     """
     Ajax endpoint for getting a users study sets
     :param user_uuid: the uuid of the user whose sets to get
     :param token_uuid: the token_uuid of the user who requested it
-    :return: A list of dictionaries. Check below
+    :param cursor: next_cursor of the previous page, empty for the first page
+    :param page_size: the max amount of study sets
+    :return: A list of dictionaries and the next_cursor. Check below
     """
     token_uuid = request.headers.get("Authorization", default="").replace("Bearer ", "")
     study_sets = []
-    user_id = ControllerDatabase.get_user_id_by_uuid(user_uuid)
-    requester_user_id = ControllerDatabase.get_user_id_by_token_uuid(token_uuid)
+    user_id = await AsyncControllerDatabase.get_user_id_by_uuid(user_uuid)
+    requester_user_id = await AsyncControllerDatabase.get_user_id_by_token_uuid(token_uuid)
     is_owner = requester_user_id == user_id and user_id
 
-    for study_set in ControllerDatabase.get_user_study_sets(user_id, is_owner=is_owner):
+    user_study_sets = await AsyncControllerDatabase.get_user_study_sets(
+        user_id, is_owner=is_owner, cursor=cursor, page_size=page_size
+    )
+
+    for study_set in user_study_sets:
         study_sets.append({
             "study_set_name": study_set.study_set_name,
             "study_set_uuid": study_set.study_set_uuid,
@@ -119,26 +414,37 @@ def get_user_study_sets(
             "labels": ControllerLabels.labels_to_dict(labels=study_set.labels),
         })
 
-    return {"study_sets": study_sets}
+    return {
+        "study_sets": study_sets,
+        "next_cursor": Pagination.next_cursor(user_study_sets, page_size, "study_set_id"),
+    }
 
 
 @app.post("/get_user_decks", status_code=status.HTTP_200_OK)
-def get_user_decks(
+async def get_user_decks(
         user_uuid: str = Form(...),
         token_uuid: str = Header(alias="token"),
+        cursor: str = Form(""),
+        page_size: int = Form(DEFAULT_PAGE_SIZE),
 ):
     """
     Ajax endpoint for getting a users decks
     :param user_uuid: the uuid of the user whose sets to get
     :param token_uuid: the token_uuid of the user who requested it
-    :return: A list of dictionaries. Check below
+    :param cursor: next_cursor of the previous page, empty for the first page
+    :param page_size: the max amount of decks
+    :return: A list of dictionaries and the next_cursor. Check below
     """
     decks = []
-    user_id = ControllerDatabase.get_user_id_by_uuid(user_uuid)
-    requester_user_id = ControllerDatabase.get_user_id_by_token_uuid(token_uuid)
+    user_id = await AsyncControllerDatabase.get_user_id_by_uuid(user_uuid)
+    requester_user_id = await AsyncControllerDatabase.get_user_id_by_token_uuid(token_uuid)
     is_owner = requester_user_id == user_id and user_id
 
-    for deck in ControllerDatabase.get_user_decks(user_id, is_owner=is_owner):
+    user_decks = await AsyncControllerDatabase.get_user_decks(
+        user_id, is_owner=is_owner, cursor=cursor, page_size=page_size
+    )
+
+    for deck in user_decks:
         decks.append({
             "deck_name": deck.deck_name,
             "deck_uuid": deck.deck_uuid,
@@ -147,28 +453,35 @@ def get_user_decks(
             "labels": ControllerLabels.labels_to_dict(labels=deck.labels),
         })
 
-    return {"decks": decks}
+    return {
+        "decks": decks,
+        "next_cursor": Pagination.next_cursor(user_decks, page_size, "deck_id"),
+    }
 
 
 @app.post("/get_deck_details", status_code=status.HTTP_200_OK)
-def get_deck_details(
+async def get_deck_details(
         response: Response,
         deck_uuid: str = Form(...),
         token_uuid: str = Header(alias="token"),
+        cursor: str = Form(""),
+        page_size: int = Form(DEFAULT_PAGE_SIZE),
 ):
     """
     Ajax endpoint for getting the details of a deck
     :param response: The fastapi response
     :param deck_uuid: uuid of the deck
     :param token_uuid: the token_uuid of the user who requested it
+    :param cursor: next_cursor of the previous page of cards, empty for the first page
+    :param page_size: the max amount of cards
     :return: A dictionary. Check below
     
     }
     """
     deck_dict = {}
 
-    deck = ControllerDatabase.get_deck_by_uuid(deck_uuid)
-    requester_user_id = ControllerDatabase.get_user_id_by_token_uuid(token_uuid)
+    deck = await AsyncControllerDatabase.get_deck_by_uuid(deck_uuid)
+    requester_user_id = await AsyncControllerDatabase.get_user_id_by_token_uuid(token_uuid)
     
     # Check if user has permission
     if requester_user_id != deck.creator_user_id:
@@ -176,7 +489,9 @@ def get_deck_details(
         return
 
     cards = []
-    for card in ControllerDatabase.get_deck_cards(deck.deck_id):
+    deck_cards = await AsyncControllerDatabase.get_deck_cards(deck.deck_id, cursor=cursor, page_size=page_size)
+
+    for card in deck_cards:
         cards.append({
             "card_uuid": card.card_uuid,
             "front_text": card.front_text,
@@ -192,13 +507,53 @@ def get_deck_details(
         "cards": cards,
     }
 
-    return {"deck": deck_dict}
+    return {
+        "deck": deck_dict,
+        "next_cursor": Pagination.next_cursor(deck_cards, page_size, "card_id"),
+    }
+
+
+@app.post("/export_deck", status_code=status.HTTP_200_OK)
+async def export_deck(
+        response: Response,
+        deck_uuid: str = Form(...),
+        file_format: str = Form("jsonl"),
+        token_uuid: str = Header(alias="token"),
+):
+    """
+    Ajax endpoint for downloading all cards of a deck.
+    The file is streamed while the cards are read from the database
+    :param response: The fastapi response
+    :param deck_uuid: uuid of the deck
+    :param file_format: jsonl (one card object per line) or csv
+    :param token_uuid: the token_uuid of the user who requested it
+    :return: the file, every card has card_uuid, front_text and back_text
+    """
+    deck = await AsyncControllerDatabase.get_deck_by_uuid(deck_uuid)
+    requester_user_id = await AsyncControllerDatabase.get_user_id_by_token_uuid(token_uuid)
+
+    # Check if user has permission
+    if requester_user_id != deck.creator_user_id:
+        response.status_code = status.HTTP_403_FORBIDDEN
+        return
+
+    if file_format not in EXPORT_MEDIA_TYPES:
+        response.status_code = status.HTTP_400_BAD_REQUEST
+        return
+
+    return StreamingResponse(
+        ControllerCards.export_cards(deck.deck_id, file_format),
+        media_type=EXPORT_MEDIA_TYPES[file_format],
+        headers={"Content-Disposition": f'attachment; filename="{deck.deck_uuid}.{file_format}"'},
+    )
 
 
 @app.post("/get_user_friend_requests", status_code=status.HTTP_200_OK)
-def get_user_friend_requests(
+async def get_user_friend_requests(
         is_accepted: bool = Form(...),
         token_uuid: str = Header(alias="token"),
+        cursor: str = Form(""),
+        page_size: int = Form(DEFAULT_PAGE_SIZE),
 ):
     """
     Ajax endpoint for getting a users friend_requests.
@@ -207,26 +562,32 @@ def get_user_friend_requests(
     :param response: The fastapi response
     :param is_accepted: Are the friend requests accepted
     :param token_uuid: the token_uuid of the user who requested it
-    :return: A list of dictionaries. Check below
+    :param cursor: next_cursor of the previous page, empty for the first page
+    :param page_size: the max amount of friend requests
+    :return: A list of dictionaries and the next_cursor. Check below
     """
     friend_requests = []
-    user_id = ControllerDatabase.get_user_id_by_token_uuid(token_uuid)
+    user_id = await AsyncControllerDatabase.get_user_id_by_token_uuid(token_uuid)
 
-    for friend_request in ControllerDatabase.get_user_friend_requests(user_id=user_id, is_accepted=is_accepted):
-        sender_user = ControllerDatabase.get_user(friend_request.sender_user_id)
-        receiver_user = ControllerDatabase.get_user(friend_request.receiver_user_id)
+    user_friend_requests = await AsyncControllerDatabase.get_user_friend_requests(
+        user_id=user_id, is_accepted=is_accepted, cursor=cursor, page_size=page_size
+    )
 
+    for friend_request in user_friend_requests:
         friend_requests.append({
             "friend_request_uuid": friend_request.friend_request_uuid,
-            "sender_user_uuid": sender_user.user_uuid,
-            "receiver_user_uuid": receiver_user.user_uuid,
+            "sender_user_uuid": friend_request.sender_user_uuid,
+            "receiver_user_uuid": friend_request.receiver_user_uuid,
         })
 
-    return {"friend_requests": friend_requests}
+    return {
+        "friend_requests": friend_requests,
+        "next_cursor": Pagination.next_cursor(user_friend_requests, page_size, "friend_request_id"),
+    }
 
 
 @app.post("/get_user_info", status_code=status.HTTP_200_OK)
-def get_user_friend_requests(
+async def get_user_friend_requests(
         user_uuid: str = Form(...),
         token_uuid: str = Header(alias="token"),
 ):
@@ -237,8 +598,8 @@ def get_user_friend_requests(
     :param token_uuid: The uuid of the users token
     :return: A dictionary
     """
-    user = ControllerDatabase.get_user_by_uuid(user_uuid)
-    token_user_id = ControllerDatabase.get_user_id_by_token_uuid(token_uuid=token_uuid)
+    user = await AsyncControllerDatabase.get_user_by_uuid(user_uuid)
+    token_user_id = await AsyncControllerDatabase.get_user_id_by_token_uuid(token_uuid=token_uuid)
     
     email_str = ""
     if token_user_id == user.user_id:
@@ -250,14 +611,15 @@ def get_user_friend_requests(
         "user_email": email_str,
         "random_id": user.random_id,
         "created": user.created.strftime("%Y/%m/%m"),
-        "total_xp": ControllerDatabase.get_user_xp_sum_in_timeframe(user_id=user.user_id),
+        "total_xp": await AsyncControllerDatabase.get_user_total_xp(user_id=user.user_id),
     }
+    user_dict["total_xp"] += sum(xp_buffer.pending(user.user_id).values())
 
     return {"user": user_dict}
 
 
 @app.post("/get_user_xp", status_code=status.HTTP_200_OK)
-def get_user_xp(
+async def get_user_xp(
         user_uuid: str = Form(...),
         only_sum: bool = Form(...),
 ):
@@ -267,35 +629,37 @@ def get_user_xp(
     :param only_sum: bool weather to send an integer or a list of integers
     :return: {"xp_count": int}
     """
-    user_id = ControllerDatabase.get_user_id_by_uuid(user_uuid)
+    user_id = await AsyncControllerDatabase.get_user_id_by_uuid(user_uuid)
     xp_count = 0
     days = []
     
-    start_date = datetime.datetime.now().date() - datetime.timedelta(days=6)
-    start_date = datetime.datetime.combine(start_date, datetime.time())
+    end_date = datetime.datetime.now().date()
+    start_date = end_date - datetime.timedelta(days=6)
     
-    user_xp = ControllerDatabase.get_user_xp_in_timeframe(
+    user_xp = await AsyncControllerDatabase.get_user_xp_in_timeframe(
         user_id=user_id,
         start_date=start_date,
-        end_date=datetime.datetime.now(),
+        end_date=end_date,
     )
     
-    xp_int_list = list(map(lambda xp: xp.xp_count, user_xp))
-    xp_count = sum(xp_int_list)
+    # Xp per day, including xp that is still in the buffer
+    day_xp_counts = {
+        day: day_xp_count
+        for day, day_xp_count in xp_buffer.pending(user_id).items()
+        if start_date <= day <= end_date
+    }
+    for xp in user_xp:
+        day_xp_counts[xp.xp_date] = day_xp_counts.get(xp.xp_date, 0) + xp.xp_count
+
+    xp_count = sum(day_xp_counts.values())
     
     if not only_sum:
-        date_delta = datetime.datetime.now() - start_date
-        for i in range(date_delta.days + 1):
-            day_date = (start_date + datetime.timedelta(days=i)).date()
-            day_xp = [xp.xp_count for xp in user_xp if xp.created.date() == day_date]
-            
-            day_xp_count = 0
-            if len(day_xp):
-                day_xp_count = day_xp[0]
+        for i in range((end_date - start_date).days + 1):
+            day_date = start_date + datetime.timedelta(days=i)
             
             days.append({
                 "date": day_date.strftime("%Y/%m/%d"),
-                "xp_count": day_xp_count,
+                "xp_count": day_xp_counts.get(day_date, 0),
             })
     
     return {
@@ -305,13 +669,13 @@ def get_user_xp(
 
 
 @app.post("/get_user_leaderboard", status_code=status.HTTP_200_OK)
-def get_user_leaderboard(
+async def get_user_leaderboard(
         response: Response,
         user_uuid: str = Form(...),
         token_uuid: str = Header(alias="token"),
 ):
     """
-    Used for getting a users xp in the last 7 days
+    Used for getting the weekly xp leaderboard of a user and their friends
     :param response: the fastapi response
     :param user_uuid: the user_uuid of the user
     :param token_uuid: the uuid of the users token
@@ -327,17 +691,36 @@ def get_user_leaderboard(
     }
     """
     leader_board = []
-    user = ControllerDatabase.get_user_by_uuid(user_uuid)
-    requester_user_id = ControllerDatabase.get_user_id_by_token_uuid(token_uuid)
+    user = await AsyncControllerDatabase.get_user_by_uuid(user_uuid)
+    requester_user_id = await AsyncControllerDatabase.get_user_id_by_token_uuid(token_uuid)
 
     # Check if user has permission
     if requester_user_id != user.user_id:
         response.status_code = status.HTTP_403_FORBIDDEN
         return
     
-    user_friends = ControllerDatabase.get_user_leader_board(user)
-    user_friends.append(user)
-    
+    week_start = datetime.datetime.now().date()
+    week_start -= datetime.timedelta(days=week_start.weekday())
+    user_friends = await AsyncControllerDatabase.get_user_leader_board(
+        user,
+        LEADER_BOARD_SIZE,
+        xp_buffer.pending_user_ids(week_start),
+    )
+
+    # Add xp that is still in the buffer, then keep the top users and the user
+    for user_friend in user_friends:
+        user_friend.xp_count += sum(
+            day_xp_count
+            for day, day_xp_count in xp_buffer.pending(user_friend.user_id).items()
+            if day >= week_start
+        )
+    user_friends.sort(key=lambda user_friend: user_friend.xp_count, reverse=True)
+    user_friends = [
+        user_friend
+        for position, user_friend in enumerate(user_friends)
+        if position < LEADER_BOARD_SIZE or user_friend.user_id == user.user_id
+    ]
+
     for user_friend in user_friends:
         leader_board.append({
             "user_name": user_friend.user_name,
@@ -382,7 +765,9 @@ async def register_user(
 
     if form_is_valid:
         try:
-            new_user = ControllerUser.create_user(email=email, name=name, password=password1, email_verified=True)
+            new_user = await AsyncControllerDatabase.run(
+                ControllerUser.create_user, email=email, name=name, password=password1, email_verified=True
+            )
 
             #  Currently removed
             # template = jinja_env.get_template("confirm_email_email.html")
@@ -397,7 +782,7 @@ async def register_user(
             # fm = FastMail(email_conf)
             # await fm.send_message(message)
 
-            new_token = ControllerDatabase.insert_token(Token(user_user_id=new_user.user_id))
+            new_token = await AsyncControllerDatabase.insert_token(Token(user_user_id=new_user.user_id))
             
         except Exception as e:
             response.status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -411,7 +796,7 @@ async def register_user(
 
 
 @app.post("/login", status_code=status.HTTP_401_UNAUTHORIZED)
-def login(
+async def login(
         response: Response,
         email: str = Form(...),
         password: str = Form(...),
@@ -424,7 +809,7 @@ def login(
     :return: dict of user_uuid and token_uuid. Token_uuid is "" if remember_me = false
     """
     result = {}
-    user = ControllerUser.log_user_in(email, password)
+    user = await AsyncControllerDatabase.run(ControllerUser.log_user_in, email, password)
 
     if user and user.email_verified:
         result = {
@@ -438,7 +823,7 @@ def login(
 
 
 @app.post("/send_friend_request", status_code=status.HTTP_200_OK)
-def send_friend_request(
+async def send_friend_request(
         response: Response,
         user_uuid: str = Form(...),
         receiver_user_uuid: str = Form(...),
@@ -452,9 +837,9 @@ def send_friend_request(
     :param token_uuid: the token_uuid of the user who requested it
     :return: Sends the user to the login view
     """
-    sender_user_id = ControllerDatabase.get_user_id_by_uuid(user_uuid)
-    receiver_user_id = ControllerDatabase.get_user_id_by_uuid(receiver_user_uuid)
-    requester_user_id = ControllerDatabase.get_user_id_by_token_uuid(token_uuid)
+    sender_user_id = await AsyncControllerDatabase.get_user_id_by_uuid(user_uuid)
+    receiver_user_id = await AsyncControllerDatabase.get_user_id_by_uuid(receiver_user_uuid)
+    requester_user_id = await AsyncControllerDatabase.get_user_id_by_token_uuid(token_uuid)
 
     # Check if user has permission
     if requester_user_id != sender_user_id:
@@ -466,13 +851,13 @@ def send_friend_request(
         receiver_user_id=receiver_user_id,
     )
 
-    is_successful = ControllerDatabase.insert_friend_request(friend_request)
+    is_successful = await AsyncControllerDatabase.insert_friend_request(friend_request)
 
     return {"is_successful": is_successful}
 
 
 @app.post("/accept_friend_request", status_code=status.HTTP_200_OK)
-def accept_friend_request(
+async def accept_friend_request(
         response: Response,
         friend_request_uuid: str = Form(...),
         token_uuid: str = Header(alias="token"),
@@ -484,17 +869,17 @@ def accept_friend_request(
     :param token_uuid: the token_uuid of the user who requested it
     :return: "", http.HTTPStatus.NO_CONTENT
     """
-    friend_request_id = ControllerDatabase.get_friend_request_id_by_uuid(friend_request_uuid)
-    requester_user_id = ControllerDatabase.get_user_id_by_token_uuid(token_uuid)
+    friend_request_id = await AsyncControllerDatabase.get_friend_request_id_by_uuid(friend_request_uuid)
+    requester_user_id = await AsyncControllerDatabase.get_user_id_by_token_uuid(token_uuid)
     
-    friend_request = ControllerDatabase.get_friend_request(friend_request_id)
+    friend_request = await AsyncControllerDatabase.get_friend_request(friend_request_id)
 
     # Check if user has permission
     if requester_user_id != friend_request.receiver_user_id:
         response.status_code = status.HTTP_403_FORBIDDEN
         return
 
-    is_successful = ControllerDatabase.accept_friend_request(
+    is_successful = await AsyncControllerDatabase.accept_friend_request(
         friend_request
     )
 
@@ -502,7 +887,7 @@ def accept_friend_request(
 
 
 @app.post("/create_study_set", status_code=status.HTTP_200_OK)
-def create_study_set(
+async def create_study_set(
         response: Response,
         study_set_name: str = Form(...),
         is_public: bool = Form(...),
@@ -516,7 +901,7 @@ def create_study_set(
     :param token_uuid: the token_uuid of the user who requested it
     :return: HTTP_200_OK ot HTTP_500
     """
-    user_id = ControllerDatabase.get_user_id_by_token_uuid(token_uuid)
+    user_id = await AsyncControllerDatabase.get_user_id_by_token_uuid(token_uuid)
 
     study_set = StudySet(
         creator_user_id=user_id,
@@ -524,7 +909,7 @@ def create_study_set(
         study_set_name=study_set_name,
     )
 
-    study_set = ControllerDatabase.insert_study_set(study_set)
+    study_set = await AsyncControllerDatabase.insert_study_set(study_set)
 
     if not study_set:
         response.status_code = status.HTTP_500
@@ -533,7 +918,7 @@ def create_study_set(
 
 
 @app.post("/create_deck", status_code=status.HTTP_200_OK)
-def create_deck(
+async def create_deck(
         response: Response,
         deck_name: str = Form(...),
         is_public: bool = Form(...),
@@ -547,7 +932,7 @@ def create_deck(
     :param token_uuid: the token_uuid of the user who requested it
     :return: HTTP_200_OK or HTTP_500
     """
-    user_id = ControllerDatabase.get_user_id_by_token_uuid(token_uuid)
+    user_id = await AsyncControllerDatabase.get_user_id_by_token_uuid(token_uuid)
 
     deck = Deck(
         creator_user_id=user_id,
@@ -555,7 +940,7 @@ def create_deck(
         deck_name=deck_name,
     )
 
-    deck = ControllerDatabase.insert_deck(deck)
+    deck = await AsyncControllerDatabase.insert_deck(deck)
 
     if not deck:
         response.status_code = status.HTTP_500
@@ -564,7 +949,7 @@ def create_deck(
 
 
 @app.post("/create_card", status_code=status.HTTP_200_OK)
-def create_card(
+async def create_card(
         response: Response,
         front_text: str = Form(...),
         back_text: str = Form(...),
@@ -580,8 +965,8 @@ def create_card(
     :param token_uuid: the token_uuid of the user who requested it
     :return: HTTP_200_OK or HTTP_500
     """
-    deck = ControllerDatabase.get_deck_by_uuid(deck_uuid)
-    requester_user_id = ControllerDatabase.get_user_id_by_token_uuid(token_uuid)
+    deck = await AsyncControllerDatabase.get_deck_by_uuid(deck_uuid)
+    requester_user_id = await AsyncControllerDatabase.get_user_id_by_token_uuid(token_uuid)
 
     # Check if user has permission
     if requester_user_id != deck.creator_user_id:
@@ -594,7 +979,7 @@ def create_card(
         deck_deck_id=deck.deck_id,
     )
 
-    card = ControllerDatabase.insert_card(card)
+    card = await AsyncControllerDatabase.insert_card(card)
 
     if not card:
         response.status_code = status.HTTP_500
@@ -602,8 +987,225 @@ def create_card(
     return {"card_uuid": card.card_uuid}
 
 
+@app.post("/update_deck_cards", status_code=status.HTTP_200_OK)
+async def update_deck_cards(
+        response: Response,
+        deck_uuid: str = Form(...),
+        operations: str = Form(...),
+        token_uuid: str = Header(alias="token"),
+):
+    """
+    Ajax endpoint for creating, editing and removing many cards of a deck at once.
+    Either every operation is applied or none
+    :param response: a fastapi response
+    :param deck_uuid: the uuid of the deck
+    :param operations: a JSON list of operations, for example
+        [
+            {"action": "create", "front_text": str, "back_text": str},
+            {"action": "edit", "card_uuid": str, "front_text": str, "back_text": str},
+            {"action": "delete", "card_uuid": str},
+        ]
+    :param token_uuid: the token_uuid of the user who requested it
+    :return: {
+        "created_card_uuids": [str] in the order of the create operations,
+        "edited_card_uuids": [str],
+        "deleted_card_uuids": [str],
+    }
+    Cards that are not in the deck are left out of edited_card_uuids and deleted_card_uuids
+    """
+    deck = await AsyncControllerDatabase.get_deck_by_uuid(deck_uuid)
+    requester_user_id = await AsyncControllerDatabase.get_user_id_by_token_uuid(token_uuid)
+
+    # Check if user has permission
+    if requester_user_id != deck.creator_user_id:
+        response.status_code = status.HTTP_403_FORBIDDEN
+        return
+
+    card_operations = ControllerCards.parse_card_operations(operations)
+
+    if card_operations is None:
+        response.status_code = status.HTTP_400_BAD_REQUEST
+        return
+
+    result = await AsyncControllerDatabase.apply_card_operations(deck.deck_id, *card_operations)
+
+    if result is None:
+        response.status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
+
+    return result
+
+
+@app.post("/get_due_cards", status_code=status.HTTP_200_OK)
+async def get_due_cards(
+        response: Response,
+        deck_uuid: str = Form(...),
+        limit: int = Form(20),
+        token_uuid: str = Header(alias="token"),
+):
+    """
+    Ajax endpoint for getting the next cards to study in a deck.
+    Cards that are due come first, then cards that were never reviewed
+    :param response: a fastapi response
+    :param deck_uuid: the uuid of the deck
+    :param limit: the max amount of cards
+    :param token_uuid: the token_uuid of the user who requested it
+    :return: {"cards": [{"card_uuid": str, "front_text": str, "back_text": str}]}
+    """
+    deck = await AsyncControllerDatabase.get_deck_by_uuid(deck_uuid)
+    requester_user_id = await AsyncControllerDatabase.get_user_id_by_token_uuid(token_uuid)
+
+    # Check if user has permission
+    if requester_user_id != deck.creator_user_id:
+        response.status_code = status.HTTP_403_FORBIDDEN
+        return
+
+    cards = []
+    due_cards = await AsyncControllerDatabase.get_due_cards(requester_user_id, deck.deck_id, limit)
+
+    for card in due_cards:
+        cards.append({
+            "card_uuid": card.card_uuid,
+            "front_text": card.front_text,
+            "back_text": card.back_text,
+        })
+
+    return {"cards": cards}
+
+
+@app.post("/review_cards", status_code=status.HTTP_200_OK)
+async def review_cards(
+        response: Response,
+        deck_uuid: str = Form(...),
+        reviews: str = Form(...),
+        token_uuid: str = Header(alias="token"),
+):
+    """
+    Ajax endpoint for saving the reviews of a study session and scheduling the cards again
+    :param response: a fastapi response
+    :param deck_uuid: the uuid of the deck
+    :param reviews: a JSON list of reviews, for example [{"card_uuid": str, "grade": int from 0 to 5}]
+    :param token_uuid: the token_uuid of the user who requested it
+    :return: {"cards": [{"card_uuid": str, "due": datetime}]}
+    """
+    deck = await AsyncControllerDatabase.get_deck_by_uuid(deck_uuid)
+    requester_user_id = await AsyncControllerDatabase.get_user_id_by_token_uuid(token_uuid)
+
+    # Check if user has permission
+    if requester_user_id != deck.creator_user_id:
+        response.status_code = status.HTTP_403_FORBIDDEN
+        return
+
+    grades = ControllerCards.parse_card_grades(reviews)
+
+    if grades is None:
+        response.status_code = status.HTTP_400_BAD_REQUEST
+        return
+
+    review_states = await AsyncControllerDatabase.review_cards(requester_user_id, deck.deck_id, grades)
+
+    if review_states is None:
+        response.status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
+        return
+
+    cards = []
+    for card_uuid, review_state in review_states.items():
+        cards.append({
+            "card_uuid": card_uuid,
+            "due": review_state.due,
+        })
+
+    return {"cards": cards}
+
+
+@app.post("/log_reviews", status_code=status.HTTP_200_OK)
+async def log_reviews(
+        response: Response,
+        events: str = Form(...),
+        token_uuid: str = Header(alias="token"),
+):
+    """
+    Ajax endpoint for recording a batch of card reviews in the review event log.
+    The events are buffered and written in bulk, so they are not readable right away.
+    When the buffer is full, nothing is recorded and the client should send the batch again later
+    :param response: a fastapi response
+    :param events: a JSON list of events, for example
+        [{"card_uuid": str, "grade": int from 0 to 5, "latency_ms": int, "reviewed_at": ISO 8601 utc time}],
+        reviewed_at must be within the last 30 days and at most an hour ahead
+    :param token_uuid: the token_uuid of the user who requested it
+    :return: {"is_successful": bool}, HTTP_400 if an event is invalid,
+        HTTP_503 with a Retry-After header when the buffer is full
+    """
+    requester_user_id = await AsyncControllerDatabase.get_user_id_by_token_uuid(token_uuid)
+
+    if not requester_user_id:
+        response.status_code = status.HTTP_403_FORBIDDEN
+        return
+
+    review_events = ControllerCards.parse_review_events(requester_user_id, events)
+
+    if review_events is None:
+        response.status_code = status.HTTP_400_BAD_REQUEST
+        return
+
+    is_successful = review_event_buffer.add(review_events)
+
+    if not is_successful:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+        response.headers["Retry-After"] = str(max(int(REVIEW_FLUSH_INTERVAL), 1))
+
+    return {"is_successful": is_successful}
+
+
+@app.post("/import_cards", status_code=status.HTTP_200_OK)
+async def import_cards(
+        response: Response,
+        deck_uuid: str = Form(...),
+        file_format: str = Form("csv"),
+        has_header: bool = Form(False),
+        file: UploadFile = File(...),
+        token_uuid: str = Header(alias="token"),
+):
+    """
+    Ajax endpoint for importing cards into a deck from a file.
+    Every row is a card with the front text in the first column and the back text in the second.
+    Either every valid row is imported or none
+    :param response: a fastapi response
+    :param deck_uuid: the uuid of the deck where the cards will be in
+    :param file_format: csv, tsv or apkg (an Anki export)
+    :param has_header: if true, the first row of a csv or tsv file is skipped
+    :param file: the uploaded file
+    :param token_uuid: the token_uuid of the user who requested it
+    :return: {
+        "is_successful": bool,
+        "imported_count": int,
+        "error_count": int,
+        "errors": [{"row": int, "error": str}],
+    }
+    """
+    deck = await AsyncControllerDatabase.get_deck_by_uuid(deck_uuid)
+    requester_user_id = await AsyncControllerDatabase.get_user_id_by_token_uuid(token_uuid)
+
+    # Check if user has permission
+    if requester_user_id != deck.creator_user_id:
+        response.status_code = status.HTTP_403_FORBIDDEN
+        return
+
+    if file_format not in IMPORT_FORMATS:
+        response.status_code = status.HTTP_400_BAD_REQUEST
+        return
+
+    result = await AsyncControllerDatabase.run(
+        ControllerCards.import_cards, deck.deck_id, file.file, file_format, has_header
+    )
+
+    if not result["is_successful"]:
+        response.status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    return result
+
+
 @app.post("/add_label_to_deck", status_code=status.HTTP_200_OK)
-def add_label_to_deck(
+async def add_label_to_deck(
         response: Response,
         deck_uuid: str = Form(...),
         label_name: str = Form(...),
@@ -618,20 +1220,20 @@ def add_label_to_deck(
     :param token_uuid: the token_uuid of the user who requested it
     :return: HTTP_200_OK or HTTP_500
     """
-    deck = ControllerDatabase.get_deck_by_uuid(deck_uuid)
-    requester_user_id = ControllerDatabase.get_user_id_by_token_uuid(token_uuid)
+    deck = await AsyncControllerDatabase.get_deck_by_uuid(deck_uuid)
+    requester_user_id = await AsyncControllerDatabase.get_user_id_by_token_uuid(token_uuid)
 
     # Check if user has permission
     if requester_user_id != deck.creator_user_id:
         response.status_code = status.HTTP_403_FORBIDDEN
         return
 
-    is_successful = ControllerDatabase.add_label_to_deck(deck.deck_id, label_name)
+    is_successful = await AsyncControllerDatabase.add_label_to_deck(deck.deck_id, label_name)
     return {"is_successful": is_successful}
 
 
 @app.post("/add_label_to_study_set", status_code=status.HTTP_200_OK)
-def add_label_to_study_set(
+async def add_label_to_study_set(
         response: Response,
         study_set_uuid: str = Form(...),
         label_name: str = Form(...),
@@ -645,20 +1247,20 @@ def add_label_to_study_set(
     :param token_uuid: the token_uuid of the user who requested it
     :return: HTTP_200_OK or HTTP_500
     """
-    study_set = ControllerDatabase.get_study_set_by_uuid(study_set_uuid)
-    requester_user_id = ControllerDatabase.get_user_id_by_token_uuid(token_uuid)
+    study_set = await AsyncControllerDatabase.get_study_set_by_uuid(study_set_uuid)
+    requester_user_id = await AsyncControllerDatabase.get_user_id_by_token_uuid(token_uuid)
 
     # Check if user has permission
     if requester_user_id != study_set.creator_user_id:
         response.status_code = status.HTTP_403_FORBIDDEN
         return
 
-    is_successful = ControllerDatabase.add_label_to_study_set(study_set.study_set_id, label_name)
+    is_successful = await AsyncControllerDatabase.add_label_to_study_set(study_set.study_set_id, label_name)
     return {"is_successful": is_successful}
 
 
 @app.post("/edit_card", status_code=status.HTTP_200_OK)
-def edit_card(
+async def edit_card(
         response: Response,
         front_text: str = Form(...),
         back_text: str = Form(...),
@@ -674,9 +1276,9 @@ def edit_card(
     :param token_uuid: the token_uuid of the user who requested it
     :return: HTTP_200_OK or HTTP_500
     """
-    card = ControllerDatabase.get_card_by_uuid(card_uuid)
-    card_parent_deck = ControllerDatabase.get_deck(card.deck_deck_id)
-    requester_user_id = ControllerDatabase.get_user_id_by_token_uuid(token_uuid)
+    card = await AsyncControllerDatabase.get_card_by_uuid(card_uuid)
+    card_parent_deck = await AsyncControllerDatabase.get_deck(card.deck_deck_id)
+    requester_user_id = await AsyncControllerDatabase.get_user_id_by_token_uuid(token_uuid)
 
     # Check if user has permission
     if requester_user_id != card_parent_deck.creator_user_id:
@@ -686,13 +1288,13 @@ def edit_card(
     card.front_text = front_text
     card.back_text = back_text
 
-    card = ControllerDatabase.edit_card(card)
+    card = await AsyncControllerDatabase.edit_card(card)
 
     return {"card_uuid": card.card_uuid}
 
 
 @app.post("/invite_user_to_study_set", status_code=status.HTTP_200_OK)
-def invite_user_to_study_set(
+async def invite_user_to_study_set(
         response: Response,
         study_set_uuid: str = Form(...),
         user_uuid: str = Form(...),
@@ -708,14 +1310,14 @@ def invite_user_to_study_set(
     :param can_edit: bool of can the user edit the study set
     :return: HTTP_200_OK or HTTP_500
     """
-    study_set = ControllerDatabase.get_study_set_by_uuid(study_set_uuid)
-    requester_user_id = ControllerDatabase.get_user_id_by_token_uuid(token_uuid)
-    user_id = ControllerDatabase.get_user_id_by_uuid(user_uuid)
+    study_set = await AsyncControllerDatabase.get_study_set_by_uuid(study_set_uuid)
+    requester_user_id = await AsyncControllerDatabase.get_user_id_by_token_uuid(token_uuid)
+    user_id = await AsyncControllerDatabase.get_user_id_by_uuid(user_uuid)
     
     if requester_user_id != study_set.creator_user_id:
         response.status_code = status.HTTP_403_FORBIDDEN
 
-    is_successful = ControllerDatabase.invite_user_to_study_set(
+    is_successful = await AsyncControllerDatabase.invite_user_to_study_set(
         study_set.study_set_id, user_id, can_edit
     )
 
@@ -723,28 +1325,35 @@ def invite_user_to_study_set(
 
 
 @app.post("/update_user_xp", status_code=status.HTTP_200_OK)
-def update_user_xp(
+async def update_user_xp(
         response: Response,
         token_uuid: str = Header(alias="token"),
         xp_count: int = Form(...),
 ):
     """
-    Ajax endpoint for adding a label to a study set
+    Ajax endpoint for adding xp to a user.
+    The xp is buffered and written to the database in bulk
     :param response: a fastapi response
     :param token_uuid: the token_uuid of the user who requested it
     :param xp_count: the amount of xp uploaded
     :return: HTTP_200_OK or HTTP_500
     """
-    user_id = ControllerDatabase.get_user_id_by_token_uuid(token_uuid)
-    
-    is_successful = ControllerDatabase.update_user_xp(user_id, xp_count)
+    user_id = await AsyncControllerDatabase.get_user_id_by_token_uuid(token_uuid)
+    is_successful = False
+
+    if user_id:
+        is_successful = xp_buffer.add(user_id, xp_count)
+
+        # The buffer is full, write it directly
+        if not is_successful:
+            is_successful = await AsyncControllerDatabase.update_user_xp(user_id, xp_count)
     
     return {"is_successful": is_successful}
    
 
 # Methods used for deleting something
 @app.delete("/remove_friend_request", status_code=status.HTTP_200_OK)
-def remove_friend_request(
+async def remove_friend_request(
         response: Response,
         friend_request_uuid: str = Form(...),
         token_uuid: str = Header(alias="token"),
@@ -756,15 +1365,15 @@ def remove_friend_request(
     :param token_uuid: the token_uuid of the user who requested it
     :return: HTTP_200_OK or HTTP_500
     """
-    friend_request = ControllerDatabase.get_friend_request_by_uuid(friend_request_uuid)
-    requester_user_id = ControllerDatabase.get_user_id_by_token_uuid(token_uuid)
+    friend_request = await AsyncControllerDatabase.get_friend_request_by_uuid(friend_request_uuid)
+    requester_user_id = await AsyncControllerDatabase.get_user_id_by_token_uuid(token_uuid)
 
     # Check if user has permission
     if requester_user_id not in (friend_request.receiver_user_id, friend_request.sender_user_id):
         response.status_code = status.HTTP_403_FORBIDDEN
         return
 
-    is_successful = ControllerDatabase.delete_friend_request(
+    is_successful = await AsyncControllerDatabase.delete_friend_request(
         FriendRequest(friend_request_id=friend_request.friend_request_id)
     )
 
@@ -772,7 +1381,7 @@ def remove_friend_request(
 
 
 @app.delete("/remove_card", status_code=status.HTTP_200_OK)
-def remove_card(
+async def remove_card(
         response: Response,
         card_uuid: str = Form(...),
         token_uuid: str = Header(alias="token"),
@@ -784,22 +1393,22 @@ def remove_card(
     :param token_uuid: the token_uuid of the user who requested it
     :return: HTTP_200_OK or HTTP_500
     """
-    requester_user_id = ControllerDatabase.get_user_id_by_token_uuid(token_uuid)
-    card = ControllerDatabase.get_card_by_uuid(card_uuid)
-    card_parent_deck = ControllerDatabase.get_deck(card.deck_deck_id)
+    requester_user_id = await AsyncControllerDatabase.get_user_id_by_token_uuid(token_uuid)
+    card = await AsyncControllerDatabase.get_card_by_uuid(card_uuid)
+    card_parent_deck = await AsyncControllerDatabase.get_deck(card.deck_deck_id)
 
     # Check if user has permission
     if requester_user_id != card_parent_deck.creator_user_id:
         response.status_code = status.HTTP_403_FORBIDDEN
         return
     
-    is_successful = ControllerDatabase.delete_card(card)
+    is_successful = await AsyncControllerDatabase.delete_card(card)
 
     return {"is_successful": is_successful}
 
 
 @app.delete("/remove_deck", status_code=status.HTTP_200_OK)
-def remove_deck(
+async def remove_deck(
         response: Response,
         deck_uuid: str = Form(...),
         token_uuid: str = Header(alias="token"),
@@ -811,21 +1420,21 @@ def remove_deck(
     :param token_uuid: the token_uuid of the user who requested it
     :return: HTTP_200_OK or HTTP_500
     """
-    requester_user_id = ControllerDatabase.get_user_id_by_token_uuid(token_uuid)
-    deck = ControllerDatabase.get_deck_by_uuid(deck_uuid)
+    requester_user_id = await AsyncControllerDatabase.get_user_id_by_token_uuid(token_uuid)
+    deck = await AsyncControllerDatabase.get_deck_by_uuid(deck_uuid)
 
     # Check if user has permission
     if requester_user_id != deck.creator_user_id:
         response.status_code = status.HTTP_403_FORBIDDEN
         return
     
-    is_successful = ControllerDatabase.delete_deck(deck)
+    is_successful = await AsyncControllerDatabase.delete_deck(deck)
 
     return {"is_successful": is_successful}
 
 
 @app.delete("/remove_study_set", status_code=status.HTTP_200_OK)
-def remove_study_set(
+async def remove_study_set(
         response: Response,
         study_set_uuid: str = Form(...),
         token_uuid: str = Header(alias="token"),
@@ -837,21 +1446,21 @@ def remove_study_set(
     :param token_uuid: the token_uuid of the user who requested it
     :return: HTTP_200_OK or HTTP_500
     """
-    requester_user_id = ControllerDatabase.get_user_id_by_token_uuid(token_uuid)
-    study_set = ControllerDatabase.get_study_set_by_uuid(study_set_uuid)
+    requester_user_id = await AsyncControllerDatabase.get_user_id_by_token_uuid(token_uuid)
+    study_set = await AsyncControllerDatabase.get_study_set_by_uuid(study_set_uuid)
 
     # Check if user has permission
     if requester_user_id != study_set.creator_user_id:
         response.status_code = status.HTTP_403_FORBIDDEN
         return
     
-    is_successful = ControllerDatabase.delete_study_set(study_set)
+    is_successful = await AsyncControllerDatabase.delete_study_set(study_set)
 
     return {"is_successful": is_successful}
 
 
 @app.delete("/remove_user_from_study_set", status_code=status.HTTP_200_OK)
-def remove_user_from_study_set(
+async def remove_user_from_study_set(
         response: Response,
         study_set_uuid: str = Form(...),
         user_uuid: str = Form(...),
@@ -865,16 +1474,16 @@ def remove_user_from_study_set(
     :param token_uuid: the token_uuid of the user who requested it
     :return: HTTP_200_OK or HTTP_500
     """
-    requester_user_id = ControllerDatabase.get_user_id_by_token_uuid(token_uuid)
-    study_set = ControllerDatabase.get_study_set_by_uuid(study_set_uuid)
-    user_id = ControllerDatabase.get_user_id_by_uuid(user_uuid)
+    requester_user_id = await AsyncControllerDatabase.get_user_id_by_token_uuid(token_uuid)
+    study_set = await AsyncControllerDatabase.get_study_set_by_uuid(study_set_uuid)
+    user_id = await AsyncControllerDatabase.get_user_id_by_uuid(user_uuid)
     
     # Check if user has permission
     if requester_user_id != study_set.creator_user_id:
         response.status_code = status.HTTP_403_FORBIDDEN
         return
     
-    is_successful = ControllerDatabase.remove_user_from_study_set(
+    is_successful = await AsyncControllerDatabase.remove_user_from_study_set(
         study_set.study_set_id, user_id
     )
     
@@ -0,0 +1,32 @@
+-- Per user xp totals, kept current by ControllerDatabase.update_user_xp.
+-- period is 'total' (period_start = '-infinity'), 'week' (monday) or 'day'.
+CREATE TABLE IF NOT EXISTS xp_rollups
+(
+    user_user_id INTEGER     NOT NULL REFERENCES users (user_id),
+    period       VARCHAR(5)  NOT NULL CHECK (period IN ('total', 'week', 'day')),
+    period_start DATE        NOT NULL,
+    xp_count     BIGINT      NOT NULL DEFAULT 0,
+    modified     TIMESTAMP   NOT NULL DEFAULT now(),
+    PRIMARY KEY (user_user_id, period, period_start)
+);
+
+CREATE INDEX IF NOT EXISTS xp_rollups_period_idx
+    ON xp_rollups (period, period_start, xp_count DESC);
+
+-- Backfill, same as scripts/rebuild_xp_rollups.py
+INSERT INTO xp_rollups (user_user_id, period, period_start, xp_count)
+SELECT user_user_id, 'total', '-infinity'::DATE, SUM(xp_count)
+FROM xp
+WHERE is_deleted = false
+GROUP BY user_user_id
+UNION ALL
+SELECT user_user_id, 'week', date_trunc('week', created)::DATE, SUM(xp_count)
+FROM xp
+WHERE is_deleted = false
+GROUP BY user_user_id, date_trunc('week', created)::DATE
+UNION ALL
+SELECT user_user_id, 'day', created::DATE, SUM(xp_count)
+FROM xp
+WHERE is_deleted = false
+GROUP BY user_user_id, created::DATE
+ON CONFLICT (user_user_id, period, period_start) DO NOTHING;
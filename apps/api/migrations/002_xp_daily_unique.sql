@@ -0,0 +1,39 @@
+-- One xp row per user and day, so update_user_xp can upsert it.
+-- Run with -v ON_ERROR_STOP=1, everything is one transaction, so a failure leaves xp as it was.
+BEGIN;
+
+-- Xp writes wait until the unique index exists, so no duplicate can be added after the merge
+LOCK TABLE xp IN SHARE ROW EXCLUSIVE MODE;
+
+ALTER TABLE xp ADD COLUMN IF NOT EXISTS xp_date DATE;
+
+UPDATE xp
+SET xp_date = created::DATE
+WHERE xp_date IS NULL;
+
+-- Merge duplicate daily rows into the oldest one of the day
+WITH days AS (
+    SELECT xp_id,
+           MIN(xp_id) OVER (PARTITION BY user_user_id, xp_date)       AS kept_xp_id,
+           SUM(xp_count) OVER (PARTITION BY user_user_id, xp_date)    AS day_xp_count,
+           COUNT(*) OVER (PARTITION BY user_user_id, xp_date)         AS day_rows
+    FROM xp
+    WHERE is_deleted = false
+)
+UPDATE xp
+SET xp_count   = CASE WHEN xp.xp_id = days.kept_xp_id THEN days.day_xp_count ELSE xp.xp_count END,
+    is_deleted = xp.xp_id <> days.kept_xp_id,
+    modified   = now()
+FROM days
+WHERE xp.xp_id = days.xp_id
+  AND days.day_rows > 1;
+
+ALTER TABLE xp
+    ALTER COLUMN xp_date SET DEFAULT CURRENT_DATE,
+    ALTER COLUMN xp_date SET NOT NULL;
+
+CREATE UNIQUE INDEX IF NOT EXISTS xp_user_day_idx
+    ON xp (user_user_id, xp_date)
+    WHERE is_deleted = false;
+
+COMMIT;
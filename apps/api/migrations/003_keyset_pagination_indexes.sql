@@ -0,0 +1,28 @@
+-- Indexes for the keyset pagination on (created, id) of the list endpoints.
+CREATE INDEX IF NOT EXISTS cards_deck_created_idx
+    ON cards (deck_deck_id, created, card_id)
+    WHERE is_deleted = false;
+
+CREATE INDEX IF NOT EXISTS decks_creator_created_idx
+    ON decks (creator_user_id, created, deck_id)
+    WHERE is_deleted = false;
+
+CREATE INDEX IF NOT EXISTS study_sets_creator_created_idx
+    ON study_sets (creator_user_id, created, study_set_id)
+    WHERE is_deleted = false;
+
+CREATE INDEX IF NOT EXISTS friend_requests_sender_created_idx
+    ON friend_requests (sender_user_id, created, friend_request_id)
+    WHERE is_deleted = false;
+
+CREATE INDEX IF NOT EXISTS friend_requests_receiver_created_idx
+    ON friend_requests (receiver_user_id, created, friend_request_id)
+    WHERE is_deleted = false;
+
+CREATE INDEX IF NOT EXISTS users_name_created_idx
+    ON users (user_name, created, user_id)
+    WHERE is_deleted = false;
+
+CREATE INDEX IF NOT EXISTS users_email_created_idx
+    ON users (user_email, created, user_id)
+    WHERE is_deleted = false;
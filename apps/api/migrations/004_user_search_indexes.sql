@@ -0,0 +1,12 @@
+-- Indexes for the ranked and typeahead user search.
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- Fuzzy matching with the % operator and similarity()
+CREATE INDEX IF NOT EXISTS users_name_trgm_idx
+    ON users USING GIN (lower(user_name) gin_trgm_ops)
+    WHERE is_deleted = false;
+
+-- Prefix matching and ordering, LIKE 'abc%' can use a "C" collation btree
+CREATE INDEX IF NOT EXISTS users_name_prefix_idx
+    ON users ((lower(user_name) COLLATE "C"), user_id)
+    WHERE is_deleted = false;
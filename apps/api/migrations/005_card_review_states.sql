@@ -0,0 +1,20 @@
+-- Spaced repetition state of a card for a user, kept by ControllerDatabase.review_cards.
+-- Cards without a row have never been reviewed by the user.
+CREATE TABLE IF NOT EXISTS card_review_states
+(
+    user_user_id  INTEGER   NOT NULL REFERENCES users (user_id),
+    card_card_id  INTEGER   NOT NULL REFERENCES cards (card_id),
+    deck_deck_id  INTEGER   NOT NULL REFERENCES decks (deck_id),
+    repetitions   INTEGER   NOT NULL DEFAULT 0,
+    interval_days REAL      NOT NULL DEFAULT 0,
+    ease_factor   REAL      NOT NULL DEFAULT 2.5,
+    due           TIMESTAMP NOT NULL,
+    last_reviewed TIMESTAMP NOT NULL,
+    created       TIMESTAMP NOT NULL DEFAULT now(),
+    modified      TIMESTAMP NOT NULL DEFAULT now(),
+    PRIMARY KEY (user_user_id, card_card_id)
+);
+
+-- The due queue of a user in a deck
+CREATE INDEX IF NOT EXISTS card_review_states_due_idx
+    ON card_review_states (user_user_id, deck_deck_id, due);
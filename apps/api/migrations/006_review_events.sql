@@ -0,0 +1,39 @@
+-- Append only log of card reviews, written in bulk by ControllerDatabase.copy_review_events.
+-- Partitioned by month of reviewed_at. Partitions are made ahead of time by
+-- scripts/create_review_event_partitions.py, reviews outside of them go to the default partition
+-- and are moved out of it when their month is created.
+CREATE TABLE IF NOT EXISTS review_events
+(
+    user_user_id INTEGER   NOT NULL,
+    card_uuid    UUID      NOT NULL,
+    grade        SMALLINT  NOT NULL,
+    latency_ms   INTEGER   NOT NULL,
+    reviewed_at  TIMESTAMP NOT NULL,
+    received_at  TIMESTAMP NOT NULL DEFAULT now()
+) PARTITION BY RANGE (reviewed_at);
+
+-- The current and the next month, so events do not go to the default partition
+-- before the script runs for the first time
+DO
+$$
+    DECLARE
+        month_start DATE := date_trunc('month', now())::DATE;
+    BEGIN
+        FOR i IN 0..1
+            LOOP
+                EXECUTE format(
+                        'CREATE TABLE IF NOT EXISTS %I PARTITION OF review_events FOR VALUES FROM (%L) TO (%L)',
+                        'review_events_' || to_char(month_start, 'YYYY_MM'),
+                        month_start,
+                        (month_start + INTERVAL '1 month')::DATE
+                    );
+                month_start := (month_start + INTERVAL '1 month')::DATE;
+            END LOOP;
+    END
+$$;
+
+CREATE TABLE IF NOT EXISTS review_events_default
+    PARTITION OF review_events DEFAULT;
+
+CREATE INDEX IF NOT EXISTS review_events_user_reviewed_at_idx
+    ON review_events (user_user_id, reviewed_at);
@@ -0,0 +1,26 @@
+-- Rebuild the rollups by the day the xp was earned, same as scripts/rebuild_xp_rollups.py.
+-- 001_xp_rollups.sql filled them by created, before xp had its xp_date.
+BEGIN;
+
+LOCK TABLE xp IN SHARE MODE;
+LOCK TABLE xp_rollups IN EXCLUSIVE MODE;
+
+DELETE FROM xp_rollups;
+
+INSERT INTO xp_rollups (user_user_id, period, period_start, xp_count)
+SELECT user_user_id, 'total', '-infinity'::DATE, SUM(xp_count)
+FROM xp
+WHERE is_deleted = false
+GROUP BY user_user_id
+UNION ALL
+SELECT user_user_id, 'week', date_trunc('week', xp_date)::DATE, SUM(xp_count)
+FROM xp
+WHERE is_deleted = false
+GROUP BY user_user_id, date_trunc('week', xp_date)::DATE
+UNION ALL
+SELECT user_user_id, 'day', xp_date, SUM(xp_count)
+FROM xp
+WHERE is_deleted = false
+GROUP BY user_user_id, xp_date;
+
+COMMIT;
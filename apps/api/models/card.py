@@ -2,6 +2,8 @@ from dataclasses_json import dataclass_json
 from pydantic.dataclasses import dataclass
 from datetime import datetime
 
+from models.row import Row
+
 
 @dataclass_json
 @dataclass
@@ -14,3 +16,41 @@ class Card:
     created: datetime = datetime.utcnow()
     modified: datetime = datetime.utcnow()
     is_deleted: bool = False
+
+
+class CardRow(Row):
+    """
+    A card read from the database.
+    The arguments are in the order of the columns of the card queries, so a row can be unpacked into it
+    """
+
+    __slots__ = (
+        "card_id",
+        "card_uuid",
+        "front_text",
+        "back_text",
+        "deck_deck_id",
+        "created",
+        "modified",
+        "is_deleted",
+    )
+
+    def __init__(
+            self,
+            card_id: int,
+            front_text: str,
+            back_text: str,
+            card_uuid: str,
+            created: datetime,
+            modified: datetime,
+            is_deleted: bool,
+            deck_deck_id: int,
+    ):
+        self.card_id = card_id
+        self.card_uuid = str(card_uuid)
+        self.front_text = front_text
+        self.back_text = back_text
+        self.deck_deck_id = deck_deck_id
+        self.created = created
+        self.modified = modified
+        self.is_deleted = is_deleted
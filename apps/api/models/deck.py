@@ -6,6 +6,7 @@ from pydantic.dataclasses import dataclass
 from datetime import datetime
 
 from models.label import Label
+from models.row import Row
 
 
 @dataclass_json
@@ -25,3 +26,54 @@ class Deck:
     created: datetime = datetime.utcnow()
     modified: datetime = datetime.utcnow()
     is_deleted: bool = False
+
+
+class DeckRow(Row):
+    """
+    A deck read from the database.
+    The arguments are in the order of the columns of the deck queries, so a row can be unpacked into it
+    """
+
+    __slots__ = (
+        "card_count",
+        "can_edit",
+        "labels",
+        "deck_id",
+        "deck_uuid",
+        "deck_name",
+        "creator_user_id",
+        "is_in_set",
+        "study_set_study_set_id",
+        "is_public",
+        "created",
+        "modified",
+        "is_deleted",
+    )
+
+    def __init__(
+            self,
+            deck_id: int,
+            deck_name: str,
+            deck_uuid: str,
+            created: datetime,
+            modified: datetime,
+            is_deleted: bool,
+            creator_user_id: int,
+            is_in_set: bool,
+            is_public: bool,
+            study_set_study_set_id: int = 0,
+            card_count: int = 0,
+    ):
+        self.card_count = card_count
+        self.can_edit = False
+        self.labels: List[Label] = []
+        self.deck_id = deck_id
+        self.deck_uuid = str(deck_uuid)
+        self.deck_name = deck_name
+        self.creator_user_id = creator_user_id
+        self.is_in_set = is_in_set
+        self.study_set_study_set_id = study_set_study_set_id or 0
+        self.is_public = is_public
+        self.created = created
+        self.modified = modified
+        self.is_deleted = is_deleted
@@ -6,6 +6,9 @@ from datetime import datetime
 @dataclass_json
 @dataclass
 class FriendRequest:
+    sender_user_uuid: str = ""
+    receiver_user_uuid: str = ""
+
     friend_request_id: int = 0
     friend_request_uuid: str = ""
     sender_user_id: int = 0
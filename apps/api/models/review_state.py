@@ -0,0 +1,16 @@
+from dataclasses_json import dataclass_json
+from pydantic.dataclasses import dataclass
+from datetime import datetime
+
+
+@dataclass_json
+@dataclass
+class ReviewState:
+    user_user_id: int = 0
+    card_card_id: int = 0
+    deck_deck_id: int = 0
+    repetitions: int = 0
+    interval_days: float = 0
+    ease_factor: float = 2.5
+    due: datetime = datetime.utcnow()
+    last_reviewed: datetime = datetime.utcnow()
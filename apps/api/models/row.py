@@ -0,0 +1,22 @@
+from typing import Any, Dict
+
+
+class Row:
+    """
+    Base of the lightweight models for rows read from the database.
+    The fields are kept in __slots__ and are not validated,
+    the pydantic models are still used for anything made from user input.
+    """
+
+    __slots__ = ()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __eq__(self, other: Any) -> bool:
+        return type(self) is type(other) and self.to_dict() == other.to_dict()
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+
+        return f"{type(self).__name__}({fields})"
@@ -1,6 +1,7 @@
 from dataclasses_json import dataclass_json
 from pydantic.dataclasses import dataclass
-from datetime import datetime
+from datetime import datetime, date
+from typing import Optional
 
 
 @dataclass_json
@@ -9,6 +10,7 @@ class Xp:
     xp_id: int = 0
     xp_count: int = 0
     user_user_id: int = 0
+    xp_date: Optional[date] = None
     created: datetime = datetime.utcnow()
     modified: datetime = datetime.utcnow()
     is_deleted: bool = False
@@ -0,0 +1,88 @@
+"""
+Compares building and serializing the cards of a 10k card deck
+with the validated Card model and with the lightweight CardRow.
+Does not need a database.
+Run from apps/api with: python -m scripts.benchmark_rows [card_count] [repeats]
+"""
+import datetime
+import sys
+import timeit
+import tracemalloc
+import uuid
+from typing import Callable, List, Tuple
+
+from models.card import Card, CardRow
+
+
+def make_rows(card_count: int) -> List[Tuple]:
+    """
+    Used for making rows like the ones fetched by ControllerDatabase.get_deck_cards
+    :param card_count: the amount of rows
+    :return: list of row tuples
+    """
+    now = datetime.datetime.utcnow()
+
+    return [
+        (card_id, f"front {card_id}", f"back {card_id}", str(uuid.uuid4()), now, now, False, 1)
+        for card_id in range(1, card_count + 1)
+    ]
+
+
+def build_cards(rows: List[Tuple]) -> List[Card]:
+    return [
+        Card(
+            card_id=card_id,
+            front_text=front_text,
+            back_text=back_text,
+            card_uuid=card_uuid,
+            created=created,
+            modified=modified,
+            is_deleted=is_deleted,
+            deck_deck_id=deck_deck_id,
+        )
+        for card_id, front_text, back_text, card_uuid, created, modified, is_deleted, deck_deck_id in rows
+    ]
+
+
+def build_card_rows(rows: List[Tuple]) -> List[CardRow]:
+    return [CardRow(*row) for row in rows]
+
+
+def peak_memory(func: Callable) -> int:
+    """
+    :param func: the function to measure
+    :return: the peak amount of bytes allocated while it ran
+    """
+    tracemalloc.start()
+    result = func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+
+    return peak
+
+
+if __name__ == "__main__":
+    card_count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    rows = make_rows(card_count)
+    cards = build_cards(rows)
+    card_rows = build_card_rows(rows)
+
+    benchmarks = [
+        ("construction", lambda: build_cards(rows), lambda: build_card_rows(rows)),
+        ("to_dict", lambda: [card.to_dict() for card in cards], lambda: [card.to_dict() for card in card_rows]),
+    ]
+
+    print(f"{card_count} cards, best of {repeats}")
+    print(f"{'':<16}{'Card':>12}{'CardRow':>12}{'speedup':>10}")
+
+    for name, model_func, row_func in benchmarks:
+        model_time = min(timeit.repeat(model_func, number=1, repeat=repeats))
+        row_time = min(timeit.repeat(row_func, number=1, repeat=repeats))
+        print(f"{name:<16}{model_time * 1000:>10.1f}ms{row_time * 1000:>10.1f}ms{model_time / row_time:>9.1f}x")
+
+    model_memory = peak_memory(lambda: build_cards(rows))
+    row_memory = peak_memory(lambda: build_card_rows(rows))
+    print(f"{'peak memory':<16}{model_memory / 1024:>10.0f}kB{row_memory / 1024:>10.0f}kB")
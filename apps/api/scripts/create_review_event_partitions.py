@@ -0,0 +1,16 @@
+"""
+Creates the monthly partitions of the review_events table for the coming months.
+Should be run regularly, for example daily with cron.
+Run from apps/api with: python -m scripts.create_review_event_partitions
+"""
+import sys
+
+from controllers.controller_database import ControllerDatabase
+from utils.common_utils import CommonUtils
+
+
+if __name__ == "__main__":
+    is_successful = ControllerDatabase.create_review_event_partitions(months_ahead=3)
+    CommonUtils.close_pool()
+
+    sys.exit(0 if is_successful else 1)
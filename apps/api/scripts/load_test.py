@@ -0,0 +1,160 @@
+"""
+Sends a mix of requests to a running API as users made by scripts.seed_data
+and reports the throughput and the p50, p95 and p99 latency of every route.
+Every virtual user logs in once, then repeatedly lists its decks, opens one of them,
+loads its leaderboard and uploads xp.
+Run from apps/api with: python -m scripts.load_test --base-url http://localhost:8000 --concurrency 20
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+# route, weight
+SCENARIO = (
+    ("/get_user_decks", 4),
+    ("/get_deck_details", 3),
+    ("/get_user_leaderboard", 2),
+    ("/update_user_xp", 3),
+)
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Load tests the API")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--concurrency", type=int, default=20, help="amount of virtual users")
+    parser.add_argument("--duration", type=float, default=60, help="seconds to send requests for")
+    parser.add_argument("--users", type=int, default=1000, help="amount of seeded users to pick from")
+    parser.add_argument("--prefix", default="seed")
+    parser.add_argument("--password", default="password")
+    parser.add_argument("--seed", type=int, default=1)
+
+    return parser.parse_args()
+
+
+class Results:
+    """
+    Latencies and errors of every route, shared by the virtual users
+    """
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def add(self, route: str, latency: float, is_error: bool) -> None:
+        with self._lock:
+            self.latencies.setdefault(route, []).append(latency)
+            if is_error:
+                self.errors[route] = self.errors.get(route, 0) + 1
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+
+    index = min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)
+
+    return sorted_values[index]
+
+
+def post(
+        base_url: str,
+        route: str,
+        form: Dict,
+        token_uuid: str,
+        results: Results,
+) -> Optional[Dict]:
+    """
+    Used for sending one form request and recording its latency
+    :return: the JSON response, or None if the request failed
+    """
+    request = urllib.request.Request(
+        base_url + route,
+        data=urllib.parse.urlencode(form).encode("utf-8"),
+        headers={"token": token_uuid},
+        method="POST",
+    )
+    result = None
+
+    start_time = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            body = response.read()
+            result = json.loads(body) if body else {}
+    except (urllib.error.URLError, ValueError):
+        result = None
+
+    results.add(route, time.perf_counter() - start_time, result is None)
+
+    return result
+
+
+def run_virtual_user(arguments: argparse.Namespace, user_number: int, deadline: float, results: Results) -> None:
+    rng = random.Random(arguments.seed * 100003 + user_number)
+    email = f"{arguments.prefix}_user_{rng.randrange(arguments.users)}@example.com"
+
+    login = post(arguments.base_url, "/login", {"email": email, "password": arguments.password}, "", results)
+    if not login:
+        return
+
+    user_uuid = login["user_uuid"]
+    token_uuid = login["token_uuid"]
+    deck_uuids = []
+    routes = [route for route, _ in SCENARIO]
+    weights = [weight for _, weight in SCENARIO]
+
+    while time.monotonic() < deadline:
+        route = rng.choices(routes, weights)[0]
+
+        if route == "/get_user_decks":
+            response = post(arguments.base_url, route, {"user_uuid": user_uuid}, token_uuid, results)
+            if response:
+                deck_uuids = [deck["deck_uuid"] for deck in response.get("decks", [])]
+        elif route == "/get_deck_details" and deck_uuids:
+            post(arguments.base_url, route, {"deck_uuid": rng.choice(deck_uuids)}, token_uuid, results)
+        elif route == "/get_user_leaderboard":
+            post(arguments.base_url, route, {"user_uuid": user_uuid}, token_uuid, results)
+        elif route == "/update_user_xp":
+            post(arguments.base_url, route, {"xp_count": rng.randint(1, 50)}, token_uuid, results)
+
+
+def print_report(results: Results, duration: float) -> None:
+    print(f"{'route':<24}{'requests':>10}{'errors':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+
+    all_latencies = []
+    for route in sorted(results.latencies):
+        latencies = sorted(results.latencies[route])
+        all_latencies.extend(latencies)
+        print(
+            f"{route:<24}{len(latencies):>10}{results.errors.get(route, 0):>8}{len(latencies) / duration:>9.1f}"
+            f"{percentile(latencies, 0.5) * 1000:>9.1f}{percentile(latencies, 0.95) * 1000:>9.1f}"
+            f"{percentile(latencies, 0.99) * 1000:>9.1f}"
+        )
+
+    all_latencies.sort()
+    print(
+        f"{'total':<24}{len(all_latencies):>10}{sum(results.errors.values()):>8}{len(all_latencies) / duration:>9.1f}"
+        f"{percentile(all_latencies, 0.5) * 1000:>9.1f}{percentile(all_latencies, 0.95) * 1000:>9.1f}"
+        f"{percentile(all_latencies, 0.99) * 1000:>9.1f}"
+    )
+
+
+if __name__ == "__main__":
+    arguments = parse_arguments()
+    results = Results()
+
+    start_time = time.monotonic()
+    deadline = start_time + arguments.duration
+
+    with ThreadPoolExecutor(max_workers=arguments.concurrency) as executor:
+        for user_number in range(arguments.concurrency):
+            executor.submit(run_virtual_user, arguments, user_number, deadline, results)
+
+    print_report(results, time.monotonic() - start_time)
@@ -0,0 +1,15 @@
+"""
+Recomputes the xp_rollups table from the rows in the xp table.
+Run from apps/api with: python -m scripts.rebuild_xp_rollups
+"""
+import sys
+
+from controllers.controller_database import ControllerDatabase
+from utils.common_utils import CommonUtils
+
+
+if __name__ == "__main__":
+    is_successful = ControllerDatabase.rebuild_xp_rollups()
+    CommonUtils.close_pool()
+
+    sys.exit(0 if is_successful else 1)
@@ -0,0 +1,265 @@
+"""
+Fills a local database with synthetic users, friends, decks, cards, study sets, labels and xp,
+for benchmarks and load tests. The same arguments always make the same data.
+Every user can log in with the email seed_user_<number>@example.com (see --prefix) and --password.
+Should only be run on an empty local database.
+Run from apps/api with: python -m scripts.seed_data --users 1000
+"""
+import argparse
+import datetime
+import random
+import sys
+import time
+from typing import Dict, List, Tuple
+
+from loguru import logger
+from psycopg2.extras import execute_values
+
+from controllers.controller_database import ControllerDatabase
+from controllers.controller_user import ControllerUser
+from utils.common_utils import CommonUtils
+
+WORDS = (
+    "apple", "river", "planet", "verb", "atom", "history", "theorem", "enzyme", "sonnet", "market",
+    "glacier", "neuron", "border", "vector", "empire", "melody", "fossil", "harbor", "prism", "saga",
+)
+LABEL_NAMES = (
+    "math", "biology", "chemistry", "physics", "history", "geography", "english", "latvian",
+    "german", "french", "music", "art", "programming", "economics", "law", "medicine",
+)
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Fills the database with synthetic data")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--friends-per-user", type=int, default=10)
+    parser.add_argument("--decks-per-user", type=int, default=5)
+    parser.add_argument("--cards-per-deck", type=int, default=50)
+    parser.add_argument("--study-sets-per-user", type=int, default=1)
+    parser.add_argument("--labels-per-deck", type=int, default=2)
+    parser.add_argument("--xp-days", type=int, default=90, help="days of xp history per user")
+    parser.add_argument("--prefix", default="seed", help="prefix of the user names and emails")
+    parser.add_argument("--password", default="password")
+    parser.add_argument("--seed", type=int, default=1)
+
+    return parser.parse_args()
+
+
+def random_text(rng: random.Random, word_count: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(word_count))
+
+
+def insert_users(cur, rng: random.Random, arguments: argparse.Namespace) -> List[int]:
+    salt = "".join(rng.choice("0123456789abcdef") for _ in range(8))
+    hashed_password = ControllerUser.hash_password(arguments.password, salt)
+
+    rows = execute_values(
+        cur,
+        "INSERT INTO users "
+        "(user_name, user_email, hashed_password, password_salt, email_verified) "
+        "VALUES %s "
+        "RETURNING user_id ",
+        [
+            (f"{arguments.prefix}_user_{number}", f"{arguments.prefix}_user_{number}@example.com",
+             hashed_password, salt, True)
+            for number in range(arguments.users)
+        ],
+        fetch=True,
+    )
+
+    return [user_id for (user_id, ) in rows]
+
+
+def insert_friend_requests(cur, rng: random.Random, user_ids: List[int], friends_per_user: int) -> int:
+    pairs = set()
+
+    for sender_user_id in user_ids:
+        receiver_user_ids = rng.sample(user_ids, min(friends_per_user + 1, len(user_ids)))
+        receiver_user_ids = [user_id for user_id in receiver_user_ids if user_id != sender_user_id]
+
+        for receiver_user_id in receiver_user_ids[:friends_per_user]:
+            pairs.add(tuple(sorted((sender_user_id, receiver_user_id))))
+
+    execute_values(
+        cur,
+        "INSERT INTO friend_requests "
+        "(sender_user_id, receiver_user_id, is_accepted) "
+        "VALUES %s ",
+        [(sender_user_id, receiver_user_id, rng.random() < 0.8) for sender_user_id, receiver_user_id in pairs],
+        page_size=1000,
+    )
+
+    return len(pairs)
+
+
+def insert_study_sets(cur, rng: random.Random, user_ids: List[int], study_sets_per_user: int) -> Dict[int, List[int]]:
+    rows = execute_values(
+        cur,
+        "INSERT INTO study_sets "
+        "(creator_user_id, study_set_name, is_public) "
+        "VALUES %s "
+        "RETURNING study_set_id, creator_user_id ",
+        [
+            (user_id, random_text(rng, 2), rng.random() < 0.5)
+            for user_id in user_ids
+            for _ in range(study_sets_per_user)
+        ],
+        page_size=1000,
+        fetch=True,
+    )
+
+    result = {}
+    for study_set_id, creator_user_id in rows:
+        result.setdefault(creator_user_id, []).append(study_set_id)
+
+    return result
+
+
+def insert_decks(
+        cur,
+        rng: random.Random,
+        user_ids: List[int],
+        decks_per_user: int,
+        study_sets_by_user: Dict[int, List[int]],
+) -> List[int]:
+    decks = []
+
+    for user_id in user_ids:
+        for _ in range(decks_per_user):
+            study_set_ids = study_sets_by_user.get(user_id, [])
+            study_set_id = rng.choice(study_set_ids) if study_set_ids and rng.random() < 0.5 else None
+            decks.append((random_text(rng, 2), user_id, study_set_id is not None, study_set_id, rng.random() < 0.5))
+
+    rows = execute_values(
+        cur,
+        "INSERT INTO decks "
+        "(deck_name, creator_user_id, is_in_set, study_set_study_set_id, is_public) "
+        "VALUES %s "
+        "RETURNING deck_id ",
+        decks,
+        page_size=1000,
+        fetch=True,
+    )
+
+    return [deck_id for (deck_id, ) in rows]
+
+
+def insert_cards(cur, rng: random.Random, deck_ids: List[int], cards_per_deck: int) -> int:
+    cards = (
+        (random_text(rng, rng.randint(1, 4)), random_text(rng, rng.randint(2, 12)), deck_id)
+        for deck_id in deck_ids
+        for _ in range(cards_per_deck)
+    )
+
+    execute_values(
+        cur,
+        "INSERT INTO cards "
+        "(front_text, back_text, deck_deck_id) "
+        "VALUES %s ",
+        cards,
+        page_size=5000,
+    )
+
+    return len(deck_ids) * cards_per_deck
+
+
+def insert_labels(
+        cur,
+        rng: random.Random,
+        deck_ids: List[int],
+        study_set_ids: List[int],
+        labels_per_deck: int,
+) -> None:
+    rows = execute_values(
+        cur,
+        "INSERT INTO labels "
+        "(label_name) "
+        "VALUES %s "
+        "RETURNING label_id ",
+        [(label_name, ) for label_name in LABEL_NAMES],
+        fetch=True,
+    )
+    label_ids = [label_id for (label_id, ) in rows]
+    labels_per_deck = min(labels_per_deck, len(label_ids))
+
+    execute_values(
+        cur,
+        "INSERT INTO labels_in_decks "
+        "(label_label_id, deck_deck_id) "
+        "VALUES %s ",
+        [(label_id, deck_id) for deck_id in deck_ids for label_id in rng.sample(label_ids, labels_per_deck)],
+        page_size=5000,
+    )
+    execute_values(
+        cur,
+        "INSERT INTO labels_in_study_sets "
+        "(label_label_id, study_set_study_set_id) "
+        "VALUES %s ",
+        [(rng.choice(label_ids), study_set_id) for study_set_id in study_set_ids],
+        page_size=5000,
+    )
+
+
+def insert_xp(cur, rng: random.Random, user_ids: List[int], xp_days: int) -> int:
+    today = datetime.date.today()
+    xp_rows: List[Tuple] = []
+
+    for user_id in user_ids:
+        # Some users study almost every day, others rarely
+        activity = rng.random()
+        for days_ago in range(xp_days):
+            if rng.random() < activity:
+                xp_date = today - datetime.timedelta(days=days_ago)
+                xp_rows.append((user_id, rng.randint(10, 500), xp_date, xp_date))
+
+    execute_values(
+        cur,
+        "INSERT INTO xp "
+        "(user_user_id, xp_count, xp_date, created) "
+        "VALUES %s ",
+        xp_rows,
+        page_size=5000,
+    )
+
+    return len(xp_rows)
+
+
+if __name__ == "__main__":
+    arguments = parse_arguments()
+    rng = random.Random(arguments.seed)
+    is_successful = False
+    start_time = time.perf_counter()
+
+    try:
+        with CommonUtils.connection() as conn:
+            with conn.cursor() as cur:
+                user_ids = insert_users(cur, rng, arguments)
+                logger.info(f"Inserted {len(user_ids)} users")
+
+                friend_request_count = insert_friend_requests(cur, rng, user_ids, arguments.friends_per_user)
+                logger.info(f"Inserted {friend_request_count} friend requests")
+
+                study_sets_by_user = insert_study_sets(cur, rng, user_ids, arguments.study_sets_per_user)
+                study_set_ids = [study_set_id for ids in study_sets_by_user.values() for study_set_id in ids]
+                logger.info(f"Inserted {len(study_set_ids)} study sets")
+
+                deck_ids = insert_decks(cur, rng, user_ids, arguments.decks_per_user, study_sets_by_user)
+                logger.info(f"Inserted {len(deck_ids)} decks")
+
+                card_count = insert_cards(cur, rng, deck_ids, arguments.cards_per_deck)
+                logger.info(f"Inserted {card_count} cards")
+
+                insert_labels(cur, rng, deck_ids, study_set_ids, arguments.labels_per_deck)
+                logger.info("Inserted labels")
+
+                xp_count = insert_xp(cur, rng, user_ids, arguments.xp_days)
+                logger.info(f"Inserted {xp_count} xp rows")
+
+        is_successful = ControllerDatabase.rebuild_xp_rollups()
+    except Exception as e:
+        logger.exception(e)
+
+    CommonUtils.close_pool()
+    logger.info(f"Seeding took {time.perf_counter() - start_time:.1f}s")
+
+    sys.exit(0 if is_successful else 1)
@@ -0,0 +1,156 @@
+import os
+import sys
+from typing import Callable, List, Optional, Tuple
+
+import pytest
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("EMAIL_PASSWORD", "")
+os.environ.setdefault("SERVER_NAME", "localhost")
+
+from utils.common_utils import CommonUtils  # noqa: E402
+
+# Gets the query and its parameters, returns the rows of the result
+Responder = Callable[[str, object], List[Tuple]]
+
+
+class FakeCursor:
+    """
+    Stands in for a psycopg2 cursor. Results come from the responder of the database
+    """
+
+    def __init__(self, database: "FakeDatabase", connection: "FakeConnection", name: Optional[str] = None):
+        self.database = database
+        self.connection = connection
+        self.name = name
+        self.itersize = 2000
+        self.rowcount = -1
+        self._rows: List[Tuple] = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def execute(self, query, parameters=None) -> None:
+        query_str = query.decode("utf-8") if isinstance(query, bytes) else str(query)
+        self.database.executed.append((query_str, parameters))
+        self._rows = list(self.database.responder(query_str, parameters) or [])
+        self.rowcount = len(self._rows)
+
+    def fetchone(self) -> Optional[Tuple]:
+        return self._rows.pop(0) if self._rows else None
+
+    def fetchmany(self, size: int) -> List[Tuple]:
+        rows, self._rows = self._rows[:size], self._rows[size:]
+        return rows
+
+    def fetchall(self) -> List[Tuple]:
+        rows, self._rows = self._rows, []
+        return rows
+
+    def close(self) -> None:
+        pass
+
+
+class FakeAsyncCursor(FakeCursor):
+    """
+    Stands in for the cursor of an asynchronous connection, whose execute is awaited
+    """
+
+    async def execute(self, query, parameters=None) -> None:
+        FakeCursor.execute(self, query, parameters)
+
+
+class FakeConnection:
+    def __init__(self, database: "FakeDatabase", cursor_factory: type = FakeCursor):
+        self.database = database
+        self.cursor_factory = cursor_factory
+        self.closed = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *args):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+
+    def cursor(self, name: Optional[str] = None, **kwargs) -> FakeCursor:
+        return self.cursor_factory(self.database, self, name)
+
+    def commit(self) -> None:
+        self.database.commits += 1
+
+    def rollback(self) -> None:
+        self.database.rollbacks += 1
+
+    def get_transaction_status(self) -> int:
+        return TRANSACTION_STATUS_IDLE
+
+    def close(self) -> None:
+        self.closed = 1
+
+
+class FakeAsyncPool:
+    def __init__(self, database: "FakeDatabase"):
+        self.database = database
+        self._connection = FakeConnection(database, FakeAsyncCursor)
+
+    async def getconn(self) -> FakeConnection:
+        return self._connection
+
+    async def putconn(self, conn: FakeConnection) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+
+class FakeDatabase:
+    """
+    Stands in for both connection pools and records every query that is run
+    """
+
+    def __init__(self, responder: Responder):
+        self.responder = responder
+        self.executed: List[Tuple[str, object]] = []
+        self.commits = 0
+        self.rollbacks = 0
+        self.max_size = 4
+        self._connection = FakeConnection(self)
+
+    def getconn(self) -> FakeConnection:
+        return self._connection
+
+    def putconn(self, conn: FakeConnection) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+    def queries(self, prefix: str = "") -> List[str]:
+        """
+        :return: the queries that were run, only the ones that start with prefix if it is given
+        """
+        return [query_str for query_str, _ in self.executed if query_str.lstrip().startswith(prefix)]
+
+
+@pytest.fixture
+def fake_database(monkeypatch) -> Callable[[Responder], FakeDatabase]:
+    """
+    Used for replacing the connection pools with a FakeDatabase.
+    Every call makes a new database, so prepared statements start over
+    """
+    def make(responder: Responder) -> FakeDatabase:
+        database = FakeDatabase(responder)
+        monkeypatch.setattr(CommonUtils, "_pool", database)
+        monkeypatch.setattr(CommonUtils, "_async_pool", FakeAsyncPool(database))
+
+        return database
+
+    yield make
@@ -0,0 +1,243 @@
+import asyncio
+import socket
+
+import pytest
+from psycopg2.extensions import (
+    POLL_OK,
+    POLL_READ,
+    POLL_WRITE,
+    TRANSACTION_STATUS_IDLE,
+    TRANSACTION_STATUS_INTRANS,
+    TRANSACTION_STATUS_UNKNOWN,
+)
+
+from utils.async_connection_pool import AsyncConnectionPool, wait
+from utils.connection_pool import PoolTimeoutError
+
+
+class Connection:
+    def __init__(self):
+        self.closed = 0
+        self.is_executing = False
+        self.transaction_status = TRANSACTION_STATUS_IDLE
+        self.queries = []
+        self.is_ping_failing = False
+
+    def poll(self) -> int:
+        return POLL_OK
+
+    def isexecuting(self) -> bool:
+        return self.is_executing
+
+    def get_transaction_status(self) -> int:
+        return self.transaction_status
+
+    def close(self) -> None:
+        self.closed = 1
+
+    def cursor(self):
+        return Cursor(self)
+
+
+class Cursor:
+    def __init__(self, conn: Connection):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def execute(self, query_str: str) -> None:
+        self.conn.queries.append(query_str)
+        if query_str == "ROLLBACK":
+            self.conn.transaction_status = TRANSACTION_STATUS_IDLE
+        if query_str == "SELECT 1" and self.conn.is_ping_failing:
+            raise RuntimeError("server closed the connection unexpectedly")
+
+
+class Connector:
+    def __init__(self):
+        self.connections = []
+
+    async def __call__(self) -> Connection:
+        conn = Connection()
+        self.connections.append(conn)
+
+        return conn
+
+
+def run(test):
+    """
+    Runs the coroutine function test with a new pool and its connector, the pool is made on the event loop
+    """
+    def wrapper(**kwargs):
+        async def main():
+            connect = Connector()
+            await test(lambda **pool_kwargs: AsyncConnectionPool(connect=connect, **pool_kwargs), connect, **kwargs)
+
+        asyncio.run(main())
+
+    wrapper.__name__ = test.__name__
+
+    return wrapper
+
+
+@run
+async def test_connections_are_reused(make_pool, connect):
+    pool = make_pool()
+
+    conn = await pool.getconn()
+    await pool.putconn(conn)
+
+    assert await pool.getconn() is conn
+    assert len(connect.connections) == 1
+    assert pool.size == 1
+
+
+@run
+async def test_checkout_times_out_when_full(make_pool, connect):
+    pool = make_pool(max_size=1, checkout_timeout=0.05)
+    await pool.getconn()
+
+    with pytest.raises(PoolTimeoutError):
+        await pool.getconn()
+
+
+@run
+async def test_returned_connection_wakes_up_a_waiter(make_pool, connect):
+    pool = make_pool(max_size=1, checkout_timeout=5)
+    conn = await pool.getconn()
+
+    waiter = asyncio.ensure_future(pool.getconn())
+    await asyncio.sleep(0.01)
+
+    assert not waiter.done()
+
+    await pool.putconn(conn)
+
+    assert await waiter is conn
+
+
+@run
+async def test_connection_left_in_a_transaction_is_rolled_back(make_pool, connect):
+    pool = make_pool()
+    conn = await pool.getconn()
+    conn.transaction_status = TRANSACTION_STATUS_INTRANS
+
+    await pool.putconn(conn)
+
+    assert conn.queries == ["ROLLBACK"]
+    assert await pool.getconn() is conn
+
+
+@run
+async def test_connection_left_running_a_query_is_discarded(make_pool, connect):
+    pool = make_pool()
+    conn = await pool.getconn()
+    conn.is_executing = True
+
+    await pool.putconn(conn)
+
+    assert conn.closed
+    assert pool.size == 0
+
+
+@run
+async def test_broken_idle_connection_is_replaced(make_pool, connect):
+    pool = make_pool()
+    conn = await pool.getconn()
+    await pool.putconn(conn)
+    conn.transaction_status = TRANSACTION_STATUS_UNKNOWN
+
+    assert await pool.getconn() is not conn
+    assert conn.closed
+    assert pool.size == 1
+
+
+@run
+async def test_long_idle_connection_is_pinged(make_pool, connect):
+    pool = make_pool(health_check_after=0)
+    conn = await pool.getconn()
+    await pool.putconn(conn)
+
+    assert await pool.getconn() is conn
+    assert conn.queries == ["SELECT 1"]
+
+    await pool.putconn(conn)
+    conn.is_ping_failing = True
+
+    assert await pool.getconn() is not conn
+    assert conn.closed
+
+
+@run
+async def test_failed_connect_releases_the_slot(make_pool, connect):
+    async def failing_connect():
+        raise RuntimeError("could not connect")
+
+    pool = AsyncConnectionPool(connect=failing_connect, max_size=1)
+
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            await pool.getconn()
+
+    assert pool.size == 0
+
+
+@run
+async def test_close(make_pool, connect):
+    pool = make_pool()
+    idle_conn = await pool.getconn()
+    borrowed_conn = await pool.getconn()
+    await pool.putconn(idle_conn)
+
+    await pool.close()
+
+    assert idle_conn.closed
+    assert not borrowed_conn.closed
+
+    await pool.putconn(borrowed_conn)
+
+    assert borrowed_conn.closed
+    assert pool.size == 0
+
+    with pytest.raises(PoolTimeoutError):
+        await pool.getconn()
+
+
+class PollingConnection:
+    """
+    Asks to wait until its socket is writable, then until it is readable
+    """
+
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+        self.states = [POLL_WRITE, POLL_READ, POLL_OK]
+
+    def poll(self) -> int:
+        return self.states.pop(0)
+
+    def fileno(self) -> int:
+        return self.sock.fileno()
+
+
+def test_wait():
+    async def main():
+        sock, other_sock = socket.socketpair()
+        conn = PollingConnection(sock)
+
+        with sock, other_sock:
+            waiter = asyncio.ensure_future(wait(conn))
+            await asyncio.sleep(0.01)
+
+            assert not waiter.done()
+            assert conn.states == [POLL_OK]
+
+            other_sock.send(b"x")
+            await asyncio.wait_for(waiter, 1)
+
+        assert conn.states == []
+
+    asyncio.run(main())
@@ -0,0 +1,108 @@
+import asyncio
+import datetime
+import uuid
+
+import pytest
+
+from controllers.controller_database import ControllerDatabase
+from controllers.controller_database_async import AsyncControllerDatabase
+from models.card import Card
+from models.friend_request import FriendRequest
+from models.user import User
+
+CREATED = datetime.datetime(2022, 1, 1)
+CARD_UUID = str(uuid.uuid4())
+DECK_UUID = str(uuid.uuid4())
+STUDY_SET_UUID = str(uuid.uuid4())
+
+# Method names and arguments of the methods that both layers implement
+NATIVE_CALLS = [
+    ("load_searched_users", ("bob", "", 5)),
+    ("search_users_ranked", ("bo", 5)),
+    ("load_typeahead_users", ("bo", 5)),
+    ("get_friend_request", (3, )),
+    ("get_friend_request_by_uuid", (str(uuid.uuid4()), )),
+    ("get_friend_request_id_by_uuid", (str(uuid.uuid4()), )),
+    ("insert_friend_request", (FriendRequest(sender_user_id=1, receiver_user_id=2), )),
+    ("delete_friend_request", (FriendRequest(friend_request_id=4), )),
+    ("accept_friend_request", (FriendRequest(friend_request_id=4), )),
+    ("get_user_friend_requests", (1, True, "", 5)),
+    ("get_user_decks", (1, True, "", 5)),
+    ("insert_card", (Card(front_text="front", back_text="back", deck_deck_id=2), )),
+    ("get_deck_cards", (2, "", 5)),
+    ("delete_card", (Card(card_id=3), )),
+    ("edit_card", (Card(card_id=3, front_text="front", back_text="back", card_uuid=CARD_UUID), )),
+    ("apply_card_operations", (2, [("front", "back")], [(CARD_UUID, "front", "back")], [CARD_UUID])),
+    ("get_due_cards", (1, 2, 10, CREATED)),
+    ("get_user_study_sets", (1, True, "", 5)),
+    ("update_user_xp", (1, 20, CREATED.date())),
+    ("get_user_total_xp", (1, )),
+    ("get_user_xp_in_timeframe", (1, CREATED.date(), CREATED.date() + datetime.timedelta(days=6))),
+    ("get_user_leader_board", (User(user_id=1), 10, [2])),
+]
+
+
+def respond(query_str, parameters):
+    if "FROM decks as d" in query_str:
+        return [(1, "Deck", DECK_UUID, CREATED, CREATED, False, 1, False, True, None, 3)]
+    if "FROM study_sets as s" in query_str:
+        return [(1, 1, CREATED, CREATED, False, "Set", True, STUDY_SET_UUID, 3)]
+    if "FROM labels AS l" in query_str:
+        return [(1, 1, "Label", CREATED, CREATED, False)]
+    if "RETURNING card_id, front_text" in query_str:
+        return [(3, "front", "back", CARD_UUID, CREATED, CREATED, False, 2)]
+
+    return []
+
+
+@pytest.fixture
+def no_executor(monkeypatch):
+    """
+    Makes every method that would run on the executor fail
+    """
+    def executor():
+        raise AssertionError("The executor was used")
+
+    monkeypatch.setattr(AsyncControllerDatabase, "executor", staticmethod(executor))
+
+
+@pytest.mark.parametrize("name, args", NATIVE_CALLS, ids=[name for name, _ in NATIVE_CALLS])
+def test_layers_run_the_same_queries(fake_database, no_executor, name, args):
+    database = fake_database(respond)
+    sync_result = getattr(ControllerDatabase, name)(*args)
+    sync_executed = database.executed
+
+    database = fake_database(respond)
+    async_result = asyncio.run(getattr(AsyncControllerDatabase, name)(*args))
+    async_executed = [executed for executed in database.executed if executed[0] not in ("BEGIN", "COMMIT")]
+
+    assert async_result == sync_result
+    assert async_executed == sync_executed
+    assert sync_executed
+
+
+def test_card_operations_run_in_one_transaction(fake_database, no_executor):
+    database = fake_database(respond)
+
+    result = asyncio.run(AsyncControllerDatabase.apply_card_operations(2, [("front", "back")], [], [CARD_UUID]))
+
+    assert result is not None
+    assert database.queries()[0] == "BEGIN"
+    assert database.queries()[-1] == "COMMIT"
+    assert len(database.queries()) == 4
+
+
+def test_failed_card_operations_are_not_committed(fake_database, no_executor):
+    def fail_on_delete(query_str, parameters):
+        if "SET is_deleted = true" in query_str:
+            raise ValueError("The update failed")
+
+        return []
+
+    database = fake_database(fail_on_delete)
+
+    result = asyncio.run(AsyncControllerDatabase.apply_card_operations(2, [("front", "back")], [], [CARD_UUID]))
+
+    assert result is None
+    assert "COMMIT" not in database.queries()
+
@@ -0,0 +1,188 @@
+import threading
+
+import pytest
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_INTRANS, TRANSACTION_STATUS_UNKNOWN
+
+from utils.connection_pool import ConnectionPool, PoolTimeoutError
+
+
+class Connection:
+    def __init__(self):
+        self.closed = 0
+        self.transaction_status = TRANSACTION_STATUS_IDLE
+        self.rollback_count = 0
+        self.ping_count = 0
+        self.is_ping_failing = False
+
+    def get_transaction_status(self) -> int:
+        return self.transaction_status
+
+    def rollback(self) -> None:
+        self.rollback_count += 1
+        self.transaction_status = TRANSACTION_STATUS_IDLE
+
+    def close(self) -> None:
+        self.closed = 1
+
+    def cursor(self):
+        return Cursor(self)
+
+
+class Cursor:
+    def __init__(self, conn: Connection):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def execute(self, query_str: str) -> None:
+        self.conn.ping_count += 1
+        if self.conn.is_ping_failing:
+            raise RuntimeError("server closed the connection unexpectedly")
+
+
+class Connector:
+    def __init__(self):
+        self.connections = []
+
+    def __call__(self) -> Connection:
+        conn = Connection()
+        self.connections.append(conn)
+
+        return conn
+
+
+def make_pool(**kwargs):
+    connect = Connector()
+
+    return ConnectionPool(connect=connect, **kwargs), connect
+
+
+def test_connections_are_reused():
+    pool, connect = make_pool()
+
+    conn = pool.getconn()
+    pool.putconn(conn)
+
+    assert pool.getconn() is conn
+    assert len(connect.connections) == 1
+    assert pool.size == 1
+
+
+def test_checkout_times_out_when_full():
+    pool, _ = make_pool(max_size=1, checkout_timeout=0.05)
+    pool.getconn()
+
+    with pytest.raises(PoolTimeoutError):
+        pool.getconn()
+
+
+def test_returned_connection_wakes_up_a_waiter():
+    pool, _ = make_pool(max_size=1, checkout_timeout=5)
+    conn = pool.getconn()
+    timer = threading.Timer(0.05, pool.putconn, args=(conn, ))
+    timer.start()
+
+    assert pool.getconn() is conn
+
+    timer.join()
+
+
+def test_connection_left_in_a_transaction_is_rolled_back():
+    pool, _ = make_pool()
+    conn = pool.getconn()
+    conn.transaction_status = TRANSACTION_STATUS_INTRANS
+
+    pool.putconn(conn)
+
+    assert conn.rollback_count == 1
+    assert pool.getconn() is conn
+
+
+def test_closed_connection_is_discarded():
+    pool, connect = make_pool(max_size=1)
+    conn = pool.getconn()
+    conn.close()
+
+    pool.putconn(conn)
+
+    assert pool.size == 0
+    assert pool.getconn() is not conn
+    assert len(connect.connections) == 2
+
+
+def test_broken_idle_connection_is_replaced():
+    pool, connect = make_pool()
+    conn = pool.getconn()
+    pool.putconn(conn)
+    conn.transaction_status = TRANSACTION_STATUS_UNKNOWN
+
+    new_conn = pool.getconn()
+
+    assert new_conn is not conn
+    assert conn.closed
+    assert pool.size == 1
+
+
+def test_long_idle_connection_is_pinged():
+    pool, _ = make_pool(health_check_after=0)
+    conn = pool.getconn()
+    pool.putconn(conn)
+
+    assert pool.getconn() is conn
+    assert conn.ping_count == 1
+
+    pool.putconn(conn)
+    conn.is_ping_failing = True
+
+    assert pool.getconn() is not conn
+    assert conn.closed
+
+
+def test_idle_connections_above_min_size_are_recycled():
+    pool, _ = make_pool(min_size=1, max_idle=0)
+    first_conn = pool.getconn()
+    second_conn = pool.getconn()
+    pool.putconn(first_conn)
+    pool.putconn(second_conn)
+
+    pool.getconn()
+
+    assert first_conn.closed
+    assert pool.size == 1
+
+
+def test_failed_connect_releases_the_slot():
+    def connect():
+        raise RuntimeError("could not connect")
+
+    pool = ConnectionPool(connect=connect, max_size=1)
+
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            pool.getconn()
+
+    assert pool.size == 0
+
+
+def test_close():
+    pool, _ = make_pool()
+    idle_conn = pool.getconn()
+    borrowed_conn = pool.getconn()
+    pool.putconn(idle_conn)
+
+    pool.close()
+
+    assert idle_conn.closed
+    assert not borrowed_conn.closed
+
+    pool.putconn(borrowed_conn)
+
+    assert borrowed_conn.closed
+    assert pool.size == 0
+
+    with pytest.raises(PoolTimeoutError):
+        pool.getconn()
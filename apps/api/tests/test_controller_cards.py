@@ -0,0 +1,166 @@
+import datetime
+import io
+import json
+import os
+import sqlite3
+import uuid
+import zipfile
+
+import pytest
+
+from controllers.controller_cards import (
+    ControllerCards,
+    MAX_CARD_OPERATIONS,
+    MAX_CARD_TEXT_LENGTH,
+    MAX_REVIEW_EVENT_AGE,
+    MAX_REVIEW_LATENCY_MS,
+)
+
+CARD_UUID = str(uuid.uuid4())
+OTHER_CARD_UUID = str(uuid.uuid4())
+
+
+def test_read_delimited_rows():
+    file = io.BytesIO("\ufefffront,back\n\n\"a, b\",c\n".encode("utf-8"))
+
+    assert list(ControllerCards.read_delimited_rows(file, ",")) == [(1, ["front", "back"]), (3, ["a, b", "c"])]
+
+
+def test_read_delimited_rows_skips_the_header():
+    file = io.BytesIO(b"front\tback\nquestion\tanswer\n")
+
+    assert list(ControllerCards.read_delimited_rows(file, "\t", has_header=True)) == [(2, ["question", "answer"])]
+
+
+def test_read_anki_rows(tmp_path):
+    collection_path = os.path.join(tmp_path, "collection.anki2")
+    conn = sqlite3.connect(collection_path)
+    conn.execute("CREATE TABLE notes (id INTEGER PRIMARY KEY, flds TEXT)")
+    conn.executemany("INSERT INTO notes VALUES (?, ?)", [(2, "second\x1fback 2"), (1, "first\x1fback 1\x1fextra")])
+    conn.commit()
+    conn.close()
+
+    apkg = io.BytesIO()
+    with zipfile.ZipFile(apkg, "w") as zip_file:
+        zip_file.write(collection_path, "collection.anki2")
+    apkg.seek(0)
+
+    assert list(ControllerCards.read_anki_rows(apkg)) == [
+        (1, ["first", "back 1", "extra"]),
+        (2, ["second", "back 2"]),
+    ]
+
+
+@pytest.mark.parametrize("fields, is_valid", [
+    (["front", "back"], True),
+    (["front", ""], True),
+    (["front"], False),
+    ([" ", "back"], False),
+    (["front", "x" * (MAX_CARD_TEXT_LENGTH + 1)], False),
+])
+def test_validate_card_fields(fields, is_valid):
+    assert (ControllerCards.validate_card_fields(fields) == "") == is_valid
+
+
+def test_parse_card_operations():
+    operations = [
+        {"action": "create", "front_text": "front", "back_text": "back"},
+        {"action": "edit", "card_uuid": CARD_UUID.upper(), "front_text": "new front", "back_text": ""},
+        {"action": "delete", "card_uuid": OTHER_CARD_UUID},
+    ]
+
+    assert ControllerCards.parse_card_operations(json.dumps(operations)) == (
+        [("front", "back")],
+        [(CARD_UUID, "new front", "")],
+        [OTHER_CARD_UUID],
+    )
+
+
+@pytest.mark.parametrize("operations_json", [
+    "not json",
+    json.dumps({"action": "create"}),
+    json.dumps(["create"]),
+    json.dumps([{"action": "move", "card_uuid": CARD_UUID}]),
+    json.dumps([{"action": "create", "front_text": "front"}]),
+    json.dumps([{"action": "create", "front_text": " ", "back_text": "back"}]),
+    json.dumps([{"action": "create", "front_text": 1, "back_text": "back"}]),
+    json.dumps([{"action": "create", "front_text": "x" * (MAX_CARD_TEXT_LENGTH + 1), "back_text": ""}]),
+    json.dumps([{"action": "edit", "card_uuid": "not a uuid", "front_text": "front", "back_text": "back"}]),
+    json.dumps([{"action": "delete"}]),
+    json.dumps([{"action": "delete", "card_uuid": CARD_UUID}] * (MAX_CARD_OPERATIONS + 1)),
+])
+def test_parse_card_operations_invalid(operations_json):
+    assert ControllerCards.parse_card_operations(operations_json) is None
+
+
+def test_parse_card_grades():
+    reviews = [
+        {"card_uuid": CARD_UUID, "grade": 1},
+        {"card_uuid": OTHER_CARD_UUID, "grade": 5},
+        {"card_uuid": CARD_UUID, "grade": 4},
+    ]
+
+    assert ControllerCards.parse_card_grades(json.dumps(reviews)) == {CARD_UUID: 4, OTHER_CARD_UUID: 5}
+
+
+@pytest.mark.parametrize("grades_json", [
+    "not json",
+    json.dumps({"card_uuid": CARD_UUID, "grade": 3}),
+    json.dumps([{"card_uuid": CARD_UUID, "grade": 6}]),
+    json.dumps([{"card_uuid": CARD_UUID, "grade": -1}]),
+    json.dumps([{"card_uuid": CARD_UUID, "grade": 3.5}]),
+    json.dumps([{"card_uuid": CARD_UUID, "grade": True}]),
+    json.dumps([{"card_uuid": CARD_UUID}]),
+    json.dumps([{"card_uuid": "not a uuid", "grade": 3}]),
+])
+def test_parse_card_grades_invalid(grades_json):
+    assert ControllerCards.parse_card_grades(grades_json) is None
+
+
+def test_parse_review_events():
+    reviewed_at = datetime.datetime.utcnow().replace(microsecond=0) - datetime.timedelta(minutes=5)
+    events = [
+        {"card_uuid": CARD_UUID, "grade": 4, "latency_ms": 1200, "reviewed_at": reviewed_at.isoformat()},
+        {"card_uuid": OTHER_CARD_UUID, "grade": 0},
+    ]
+
+    before = datetime.datetime.utcnow()
+    result = ControllerCards.parse_review_events(3, json.dumps(events))
+    after = datetime.datetime.utcnow()
+
+    assert result[0] == (3, CARD_UUID, 4, 1200, reviewed_at)
+    assert result[1][:4] == (3, OTHER_CARD_UUID, 0, 0)
+    assert before <= result[1][4] <= after
+
+
+def test_parse_review_events_converts_to_utc():
+    reviewed_at = datetime.datetime.now(datetime.timezone(datetime.timedelta(hours=2))).replace(microsecond=0)
+    events = [{"card_uuid": CARD_UUID, "grade": 3, "reviewed_at": reviewed_at.isoformat()}]
+
+    (event, ) = ControllerCards.parse_review_events(3, json.dumps(events))
+
+    assert event[4] == reviewed_at.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+
+
+@pytest.mark.parametrize("event", [
+    {"card_uuid": CARD_UUID, "grade": 6},
+    {"card_uuid": CARD_UUID, "grade": "3"},
+    {"card_uuid": CARD_UUID, "grade": 3, "latency_ms": -1},
+    {"card_uuid": CARD_UUID, "grade": 3, "latency_ms": MAX_REVIEW_LATENCY_MS + 1},
+    {"card_uuid": CARD_UUID, "grade": 3, "latency_ms": False},
+    {"card_uuid": "not a uuid", "grade": 3},
+    {"card_uuid": CARD_UUID, "grade": 3, "reviewed_at": "yesterday"},
+    {"card_uuid": CARD_UUID, "grade": 3, "reviewed_at": 1650000000},
+    {
+        "card_uuid": CARD_UUID,
+        "grade": 3,
+        "reviewed_at": (datetime.datetime.utcnow() - MAX_REVIEW_EVENT_AGE - datetime.timedelta(days=1)).isoformat(),
+    },
+    {
+        "card_uuid": CARD_UUID,
+        "grade": 3,
+        "reviewed_at": (datetime.datetime.utcnow() + datetime.timedelta(days=1)).isoformat(),
+    },
+])
+def test_parse_review_events_invalid(event):
+    assert ControllerCards.parse_review_events(3, json.dumps([event])) is None
@@ -0,0 +1,157 @@
+import datetime
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+
+from controllers.controller_database import ControllerDatabase
+
+USER_ID = 7
+USER_UUID = str(uuid.uuid4())
+TOKEN_UUID = str(uuid.uuid4())
+
+
+def decks_responder(deck_count: int):
+    """
+    :return: a responder for a user with deck_count decks, each with two labels
+    """
+    created = datetime.datetime(2022, 1, 1)
+    deck_rows = [
+        (deck_id, f"Deck {deck_id}", str(uuid.uuid4()), created, created, False, USER_ID, False, True, None, 3)
+        for deck_id in range(1, deck_count + 1)
+    ]
+    label_rows = [
+        (deck_id, label_id, f"Label {label_id}", created, created, False)
+        for deck_id in range(1, deck_count + 1)
+        for label_id in (1, 2)
+    ]
+
+    def respond(query_str, parameters):
+        if "FROM decks as d" in query_str:
+            return deck_rows
+        if "FROM labels AS l" in query_str:
+            return label_rows
+        if "FROM users" in query_str or query_str.startswith("EXECUTE"):
+            return [(USER_ID, )]
+
+        return []
+
+    return respond
+
+
+def study_sets_responder(study_set_count: int):
+    """
+    :return: a responder for a user with study_set_count study_sets, each with two labels
+    """
+    created = datetime.datetime(2022, 1, 1)
+    study_set_rows = [
+        (study_set_id, USER_ID, created, created, False, f"Set {study_set_id}", True, str(uuid.uuid4()), 3)
+        for study_set_id in range(1, study_set_count + 1)
+    ]
+    label_rows = [
+        (study_set_id, label_id, f"Label {label_id}", created, created, False)
+        for study_set_id in range(1, study_set_count + 1)
+        for label_id in (1, 2)
+    ]
+
+    def respond(query_str, parameters):
+        if "FROM study_sets as s" in query_str:
+            return study_set_rows
+        if "FROM labels AS l" in query_str:
+            return label_rows
+        if "FROM users" in query_str or query_str.startswith("EXECUTE"):
+            return [(USER_ID, )]
+
+        return []
+
+    return respond
+
+
+@pytest.mark.parametrize("deck_count", [1, 25])
+def test_get_user_decks_query_count(fake_database, deck_count):
+    database = fake_database(decks_responder(deck_count))
+
+    decks = ControllerDatabase.get_user_decks(USER_ID, is_owner=True)
+
+    assert len(decks) == deck_count
+    assert all(deck.card_count == 3 for deck in decks)
+    assert all(len(deck.labels) == 2 for deck in decks)
+    assert len(database.executed) == 2
+
+
+def test_get_user_decks_without_decks(fake_database):
+    database = fake_database(decks_responder(0))
+
+    assert ControllerDatabase.get_user_decks(USER_ID) == []
+    assert len(database.executed) == 1
+
+
+def test_get_user_decks_endpoint_query_count(fake_database):
+    from main import app
+
+    client = TestClient(app)
+    query_counts = []
+
+    for deck_count in (1, 25):
+        ControllerDatabase.token_cache.clear()
+        database = fake_database(decks_responder(deck_count))
+
+        response = client.post(
+            "/get_user_decks",
+            data={"user_uuid": USER_UUID},
+            headers={"token": TOKEN_UUID},
+        )
+
+        assert response.status_code == 200
+        assert len(response.json()["decks"]) == deck_count
+        assert all(len(deck["labels"]) == 2 for deck in response.json()["decks"])
+        query_counts.append(len(database.executed))
+
+    ControllerDatabase.token_cache.clear()
+
+    assert query_counts[0] == query_counts[1]
+
+
+@pytest.mark.parametrize("study_set_count", [1, 25])
+def test_get_user_study_sets_query_count(fake_database, study_set_count):
+    database = fake_database(study_sets_responder(study_set_count))
+
+    study_sets = ControllerDatabase.get_user_study_sets(USER_ID, is_owner=True)
+
+    assert len(study_sets) == study_set_count
+    assert all(study_set.deck_count == 3 for study_set in study_sets)
+    assert all(len(study_set.labels) == 2 for study_set in study_sets)
+    assert len(database.executed) == 2
+
+
+def test_get_user_study_sets_without_study_sets(fake_database):
+    database = fake_database(study_sets_responder(0))
+
+    assert ControllerDatabase.get_user_study_sets(USER_ID) == []
+    assert len(database.executed) == 1
+
+
+def test_get_user_study_sets_endpoint_query_count(fake_database):
+    from main import app
+
+    client = TestClient(app)
+    query_counts = []
+
+    for study_set_count in (1, 25):
+        ControllerDatabase.token_cache.clear()
+        database = fake_database(study_sets_responder(study_set_count))
+
+        response = client.post(
+            "/get_user_study_sets",
+            data={"user_uuid": USER_UUID},
+            headers={"Authorization": f"Bearer {TOKEN_UUID}"},
+        )
+
+        assert response.status_code == 200
+        assert len(response.json()["study_sets"]) == study_set_count
+        assert all(len(study_set["labels"]) == 2 for study_set in response.json()["study_sets"])
+        query_counts.append(len(database.executed))
+
+    ControllerDatabase.token_cache.clear()
+
+    assert query_counts[0] == query_counts[1]
@@ -0,0 +1,189 @@
+"""
+The same tests for ControllerDatabase and AsyncControllerDatabase, against a local Postgres
+with every migration applied. They are skipped unless DB_HOST, DB_NAME, DB_USER and DB_PASSWORD are set.
+The rows they make are left in the database, so it should only be a local one
+"""
+import asyncio
+import datetime
+import uuid
+from os import environ
+
+import pytest
+
+from controllers.controller_database import ControllerDatabase
+from controllers.controller_database_async import AsyncControllerDatabase
+from models.card import Card
+from models.deck import Deck
+from models.friend_request import FriendRequest
+from models.study_set import StudySet
+from models.token import Token
+from models.user import User
+from utils.common_utils import CommonUtils
+
+pytestmark = pytest.mark.skipif(
+    not all(environ.get(name) for name in ("DB_HOST", "DB_NAME", "DB_USER", "DB_PASSWORD")),
+    reason="needs a local Postgres",
+)
+
+
+@pytest.fixture(params=["sync", "async"])
+def database(request):
+    """
+    :return: a function that calls a method of the layer by name and returns its result
+    """
+    ControllerDatabase.token_cache.clear()
+
+    if request.param == "sync":
+        yield lambda name, *args, **kwargs: getattr(ControllerDatabase, name)(*args, **kwargs)
+        return
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    yield lambda name, *args, **kwargs: loop.run_until_complete(getattr(AsyncControllerDatabase, name)(*args, **kwargs))
+
+    loop.run_until_complete(CommonUtils.close_async_pool())
+    AsyncControllerDatabase.shutdown()
+    asyncio.set_event_loop(None)
+    loop.close()
+
+
+def insert_user() -> User:
+    user_name = f"layer_test_{uuid.uuid4().hex[:12]}"
+
+    return ControllerDatabase.insert_user(User(
+        user_name=user_name,
+        user_email=f"{user_name}@example.com",
+        hashed_password="hashed_password",
+        password_salt="salt",
+    ))
+
+
+@pytest.fixture
+def user() -> User:
+    return insert_user()
+
+
+@pytest.fixture
+def friend() -> User:
+    return insert_user()
+
+
+@pytest.fixture
+def deck(user):
+    return ControllerDatabase.insert_deck(Deck(deck_name="Layer test deck", creator_user_id=user.user_id))
+
+
+@pytest.fixture
+def card(deck):
+    return ControllerDatabase.insert_card(Card(front_text="front", back_text="back", deck_deck_id=deck.deck_id))
+
+
+@pytest.fixture
+def study_set(user):
+    return ControllerDatabase.insert_study_set(StudySet(study_set_name="Layer test set", creator_user_id=user.user_id))
+
+
+def test_get_user(database, user):
+    assert database("get_user", user.user_id) == user
+    assert database("get_user_by_uuid", user.user_uuid) == user
+    assert database("get_user_by_email", user.user_email) == user
+    assert database("get_user_id_by_uuid", user.user_uuid) == user.user_id
+
+
+def test_get_unknown_user(database):
+    unknown_uuid = str(uuid.uuid4())
+
+    assert database("get_user_by_uuid", unknown_uuid) is None
+    assert database("get_user_id_by_uuid", unknown_uuid) == 0
+
+
+def test_get_user_id_by_token_uuid(database, user):
+    token = ControllerDatabase.insert_token(Token(user_user_id=user.user_id))
+
+    assert database("get_user_id_by_token_uuid", token.token_uuid) == user.user_id
+    assert database("get_user_id_by_token_uuid", f"Bearer {token.token_uuid}") == user.user_id
+    assert database("get_user_id_by_token_uuid", str(uuid.uuid4())) == 0
+
+
+def test_deleted_token_is_not_valid(database, user):
+    token = ControllerDatabase.insert_token(Token(user_user_id=user.user_id))
+    ControllerDatabase.delete_token(token)
+
+    assert database("get_user_id_by_token_uuid", token.token_uuid) == 0
+
+
+def test_get_deck(database, deck):
+    assert database("get_deck", deck.deck_id) == deck
+    assert database("get_deck_by_uuid", deck.deck_uuid) == deck
+    assert database("get_deck_by_uuid", str(uuid.uuid4())) is None
+
+
+def test_get_card(database, card):
+    assert database("get_card", card.card_id) == card
+    assert database("get_card_by_uuid", card.card_uuid) == card
+    assert database("get_card_by_uuid", str(uuid.uuid4())) is None
+
+
+def test_get_study_set(database, study_set):
+    assert database("get_study_set", study_set.study_set_id) == study_set
+    assert database("get_study_set_by_uuid", study_set.study_set_uuid) == study_set
+    assert database("get_study_set_by_uuid", str(uuid.uuid4())) is None
+
+
+def test_listings(database, user, card, study_set):
+    decks = database("get_user_decks", user.user_id, is_owner=True)
+    study_sets = database("get_user_study_sets", user.user_id, is_owner=True)
+
+    assert [deck.deck_id for deck in decks] == [card.deck_deck_id]
+    assert [study_set.study_set_id for study_set in study_sets] == [study_set.study_set_id]
+    assert database("get_deck_cards", card.deck_deck_id) == [card]
+
+
+def test_card_changes(database, deck):
+    card = database("insert_card", Card(front_text="front", back_text="back", deck_deck_id=deck.deck_id))
+    assert (card.front_text, card.back_text) == ("front", "back")
+
+    card.front_text = "new front"
+    assert database("edit_card", card).front_text == "new front"
+
+    result = database("apply_card_operations", deck.deck_id, [("created", "card")], [], [str(card.card_uuid)])
+    assert len(result["created_card_uuids"]) == 1
+    assert result["deleted_card_uuids"] == [str(card.card_uuid)]
+
+    created_card = database("get_card_by_uuid", result["created_card_uuids"][0])
+    assert database("delete_card", created_card)
+    assert database("get_deck_cards", deck.deck_id) == []
+
+
+def test_friend_requests(database, user, friend):
+    friend_request = FriendRequest(sender_user_id=user.user_id, receiver_user_id=friend.user_id)
+    assert database("insert_friend_request", friend_request)
+
+    (friend_request, ) = database("get_user_friend_requests", friend.user_id, is_accepted=False)
+    assert (friend_request.sender_user_uuid, friend_request.receiver_user_uuid) == (user.user_uuid, friend.user_uuid)
+    assert database("get_friend_request_id_by_uuid", friend_request.friend_request_uuid) \
+        == friend_request.friend_request_id
+
+    assert database("accept_friend_request", friend_request)
+    assert database("get_friend_request", friend_request.friend_request_id).is_accepted
+    assert len(database("get_user_friend_requests", user.user_id, is_accepted=True)) == 1
+
+    assert database("delete_friend_request", friend_request)
+    assert database("get_friend_request_by_uuid", friend_request.friend_request_uuid) is None
+
+
+def test_xp(database, user, friend):
+    today = datetime.date.today()
+    ControllerDatabase.insert_friend_request(
+        FriendRequest(sender_user_id=user.user_id, receiver_user_id=friend.user_id)
+    )
+
+    assert database("update_user_xp", user.user_id, 20)
+    assert database("update_users_xp", {(user.user_id, today): 5, (friend.user_id, today): 30})
+
+    assert database("get_user_total_xp", user.user_id) == 25
+    assert [xp.xp_count for xp in database("get_user_xp_in_timeframe", user.user_id, today, today)] == [25]
+
+    leader_board = database("get_user_leader_board", user)
+    assert [(leader.user_id, leader.xp_count) for leader in leader_board] == [(friend.user_id, 30), (user.user_id, 25)]
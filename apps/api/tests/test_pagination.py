@@ -0,0 +1,61 @@
+import datetime
+from dataclasses import dataclass
+
+from utils.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, Pagination
+
+
+@dataclass
+class Row:
+    row_id: int
+    created: datetime.datetime
+
+
+def test_cursor_round_trip():
+    created = datetime.datetime(2022, 5, 1, 10, 30, 15, 123456)
+
+    cursor = Pagination.encode_cursor(created, 42)
+
+    assert Pagination.decode_cursor(cursor) == (created, 42)
+
+
+def test_invalid_cursor():
+    assert Pagination.decode_cursor("") is None
+    assert Pagination.decode_cursor("not a cursor") is None
+    assert Pagination.decode_cursor("WzFd") is None
+
+
+def test_page_size():
+    assert Pagination.page_size(None) == DEFAULT_PAGE_SIZE
+    assert Pagination.page_size(0) == DEFAULT_PAGE_SIZE
+    assert Pagination.page_size(-5) == DEFAULT_PAGE_SIZE
+    assert Pagination.page_size(10) == 10
+    assert Pagination.page_size(MAX_PAGE_SIZE + 1) == MAX_PAGE_SIZE
+
+
+def test_keyset_query_str():
+    cursor = Pagination.encode_cursor(datetime.datetime(2022, 1, 1), 1)
+
+    assert Pagination.keyset_query_str("d.created", "d.deck_id", "") == ""
+    assert Pagination.keyset_query_str("d.created", "d.deck_id", "invalid") == ""
+    assert Pagination.keyset_query_str("d.created", "d.deck_id", cursor) == \
+        "AND (d.created, d.deck_id) > (%(cursor_created)s, %(cursor_id)s) "
+
+
+def test_keyset_parameters():
+    created = datetime.datetime(2022, 1, 1)
+    cursor = Pagination.encode_cursor(created, 3)
+
+    assert Pagination.keyset_parameters(cursor, 20) == {"cursor_created": created, "cursor_id": 3, "page_size": 20}
+    assert Pagination.keyset_parameters("", None) == {
+        "cursor_created": None,
+        "cursor_id": None,
+        "page_size": DEFAULT_PAGE_SIZE,
+    }
+
+
+def test_next_cursor():
+    rows = [Row(row_id, datetime.datetime(2022, 1, row_id)) for row_id in (1, 2, 3)]
+
+    assert Pagination.next_cursor(rows, 4, "row_id") == ""
+    assert Pagination.next_cursor([], 4, "row_id") == ""
+    assert Pagination.decode_cursor(Pagination.next_cursor(rows, 3, "row_id")) == (rows[-1].created, 3)
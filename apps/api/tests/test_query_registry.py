@@ -0,0 +1,73 @@
+import pytest
+
+from controllers.controller_database import ControllerDatabase
+from utils.query_registry import QueryRegistry
+
+QueryRegistry.register(
+    "test_label_by_name",
+    "SELECT label_id FROM labels WHERE label_name = %(label_name)s AND label_name LIKE 'a%%' "
+    "OR label_id = %(label_id)s OR %(label_name)s = '' "
+)
+
+
+def test_register_uses_positional_parameters():
+    assert QueryRegistry.query_str("test_label_by_name") == \
+        "SELECT label_id FROM labels WHERE label_name = $1 AND label_name LIKE 'a%' OR label_id = $2 OR $1 = '' "
+    assert QueryRegistry.query_str("unknown") == ""
+
+
+def test_register_rejects_invalid_names():
+    with pytest.raises(ValueError):
+        QueryRegistry.register("label by name", "SELECT 1")
+
+
+def test_query_is_prepared_once_per_connection(fake_database):
+    database = fake_database(lambda query_str, parameters: [])
+    calls_before = QueryRegistry.stats()["test_label_by_name"]["calls"]
+
+    with database.getconn().cursor() as cur:
+        QueryRegistry.execute(cur, "test_label_by_name", {"label_name": "math", "label_id": 3})
+        QueryRegistry.execute(cur, "test_label_by_name", {"label_name": "art", "label_id": 4})
+
+    assert database.executed == [
+        (f"PREPARE test_label_by_name AS {QueryRegistry.query_str('test_label_by_name')}", None),
+        ("EXECUTE test_label_by_name (%s, %s)", ["math", 3]),
+        ("EXECUTE test_label_by_name (%s, %s)", ["art", 4]),
+    ]
+    assert QueryRegistry.stats()["test_label_by_name"]["calls"] == calls_before + 2
+
+    database = fake_database(lambda query_str, parameters: [])
+
+    with database.getconn().cursor() as cur:
+        QueryRegistry.execute(cur, "test_label_by_name", {"label_name": "math", "label_id": 3})
+
+    assert len(database.queries("PREPARE")) == 1
+
+
+@pytest.mark.parametrize("method, query_name", [
+    ("get_token", "token_by_id"),
+    ("get_friend_request", "friend_request_by_id"),
+    ("get_label", "label_by_id"),
+])
+def test_lookups_run_registered_queries(fake_database, method, query_name):
+    database = fake_database(lambda query_str, parameters: [])
+
+    getattr(ControllerDatabase, method)(1)
+
+    assert database.queries() == [
+        f"PREPARE {query_name} AS {QueryRegistry.query_str(query_name)}",
+        f"EXECUTE {query_name} (%s)",
+    ]
+
+
+@pytest.mark.parametrize("is_owner", [True, False])
+def test_listing_query_text_does_not_depend_on_the_owner(fake_database, is_owner):
+    database = fake_database(lambda query_str, parameters: [])
+
+    ControllerDatabase.get_user_decks(1, is_owner=is_owner)
+    ControllerDatabase.get_user_study_sets(1, is_owner=is_owner)
+
+    (decks_query_str, decks_parameters), (study_sets_query_str, study_sets_parameters) = database.executed
+
+    assert "%(public_only)s" in decks_query_str and "%(public_only)s" in study_sets_query_str
+    assert decks_parameters["public_only"] is study_sets_parameters["public_only"] is (not is_owner)
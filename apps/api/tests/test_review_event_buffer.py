@@ -0,0 +1,81 @@
+import datetime
+
+from utils.review_event_buffer import ReviewEventBuffer
+
+REVIEWED_AT = datetime.datetime(2022, 3, 1, 12, 0, 0)
+
+
+def events(*card_uuids):
+    return [(1, card_uuid, 4, 1500, REVIEWED_AT) for card_uuid in card_uuids]
+
+
+class FlushRecorder:
+    def __init__(self, is_successful: bool = True):
+        self.is_successful = is_successful
+        self.flushed = []
+
+    def __call__(self, review_events) -> bool:
+        self.flushed.append(list(review_events))
+
+        return self.is_successful
+
+
+def test_flush_writes_events_in_order():
+    flush = FlushRecorder()
+    review_event_buffer = ReviewEventBuffer(flush)
+
+    assert review_event_buffer.add(events("a", "b"))
+    assert review_event_buffer.add(events("c"))
+    assert review_event_buffer.flush()
+    assert flush.flushed == [events("a", "b", "c")]
+    assert review_event_buffer.flush()
+    assert len(flush.flushed) == 1
+
+
+def test_batch_is_taken_whole_or_not_at_all():
+    flush = FlushRecorder()
+    review_event_buffer = ReviewEventBuffer(flush, max_size=3)
+
+    assert review_event_buffer.add(events("a", "b"))
+    assert not review_event_buffer.add(events("c", "d"))
+    assert review_event_buffer.add(events("c"))
+
+    review_event_buffer.flush()
+
+    assert flush.flushed == [events("a", "b", "c")]
+
+
+def test_failed_flush_puts_events_back_in_front():
+    flush = FlushRecorder(is_successful=False)
+    review_event_buffer = ReviewEventBuffer(flush)
+    review_event_buffer.add(events("a", "b"))
+
+    assert not review_event_buffer.flush()
+
+    review_event_buffer.add(events("c"))
+    flush.is_successful = True
+
+    assert review_event_buffer.flush()
+    assert flush.flushed[-1] == events("a", "b", "c")
+
+
+def test_raising_flush_puts_events_back():
+    def flush(review_events):
+        raise RuntimeError("database is down")
+
+    review_event_buffer = ReviewEventBuffer(flush)
+    review_event_buffer.add(events("a"))
+
+    assert not review_event_buffer.flush()
+    assert not review_event_buffer.add(events("b") * review_event_buffer.max_size)
+
+
+def test_stop_flushes_what_is_left():
+    flush = FlushRecorder()
+    review_event_buffer = ReviewEventBuffer(flush, flush_interval=60)
+    review_event_buffer.start()
+    review_event_buffer.add(events("a"))
+
+    review_event_buffer.stop()
+
+    assert flush.flushed == [events("a")]
@@ -0,0 +1,54 @@
+import datetime
+
+import numpy as np
+import pytest
+
+from utils.scheduler import DEFAULT_EASE_FACTOR, MIN_EASE_FACTOR, Scheduler
+
+
+def test_passed_reviews_grow_the_interval():
+    repetitions, interval_days, ease_factors = Scheduler.schedule(
+        repetitions=[0, 1, 2],
+        interval_days=[0, 1, 6],
+        ease_factors=[DEFAULT_EASE_FACTOR] * 3,
+        grades=[4, 4, 4],
+    )
+
+    assert repetitions.tolist() == [1, 2, 3]
+    assert interval_days.tolist() == [1.0, 6.0, 15.0]
+    assert ease_factors.tolist() == pytest.approx([DEFAULT_EASE_FACTOR] * 3)
+
+
+def test_failed_review_starts_over():
+    repetitions, interval_days, ease_factors = Scheduler.schedule(
+        repetitions=[5], interval_days=[40], ease_factors=[2.0], grades=[2],
+    )
+
+    assert repetitions.tolist() == [0]
+    assert interval_days.tolist() == [1.0]
+    assert ease_factors.tolist() == pytest.approx([1.68])
+
+
+def test_ease_factor():
+    _, _, ease_factors = Scheduler.schedule(
+        repetitions=[3, 3], interval_days=[10, 10], ease_factors=[2.5, 1.3], grades=[5, 0],
+    )
+
+    assert ease_factors.tolist() == pytest.approx([2.6, MIN_EASE_FACTOR])
+
+
+def test_grades_are_clipped():
+    repetitions, _, ease_factors = Scheduler.schedule(
+        repetitions=[0, 0], interval_days=[0, 0], ease_factors=[2.5, 2.5], grades=[9, -3],
+    )
+
+    assert repetitions.tolist() == [1, 0]
+    assert ease_factors.tolist() == pytest.approx([2.6, 1.7])
+
+
+def test_due_times():
+    now = datetime.datetime(2022, 1, 1, 12, 0, 0)
+
+    due_times = Scheduler.due_times(now, np.array([1.0, 0.5]))
+
+    assert due_times == [datetime.datetime(2022, 1, 2, 12, 0, 0), datetime.datetime(2022, 1, 2, 0, 0, 0)]
@@ -0,0 +1,95 @@
+import pytest
+
+from utils.slow_query_log import SlowQueryLog
+
+
+class ExplainCursor:
+    def __init__(self, conn: "ExplainConnection"):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def execute(self, query_str, parameters=None) -> None:
+        self.conn.queries.append(query_str)
+        if any(query_str.startswith(failing_query_str) for failing_query_str in self.conn.failing_query_strs):
+            raise RuntimeError(f"{query_str} failed")
+
+    def fetchall(self):
+        return [("Seq Scan on cards", ), ("Execution Time: 600 ms", )]
+
+
+class ExplainConnection:
+    def __init__(self, *failing_query_strs: str):
+        self.failing_query_strs = failing_query_strs
+        self.queries = []
+
+    def cursor(self, cursor_factory=None):
+        return ExplainCursor(self)
+
+
+class Cursor:
+    def __init__(self, conn: ExplainConnection):
+        self.connection = conn
+
+
+def test_explain():
+    conn = ExplainConnection()
+
+    plan = SlowQueryLog._explain(Cursor(conn), "SELECT * FROM cards", None)
+
+    assert plan == "Seq Scan on cards\nExecution Time: 600 ms"
+    assert conn.queries == [
+        "SAVEPOINT slow_query_explain",
+        "EXPLAIN (ANALYZE, BUFFERS) SELECT * FROM cards",
+        "RELEASE SAVEPOINT slow_query_explain",
+    ]
+
+
+def test_failed_explain_is_rolled_back():
+    conn = ExplainConnection("EXPLAIN")
+
+    assert SlowQueryLog._explain(Cursor(conn), "SELECT * FROM cards", None) is None
+    assert conn.queries[-1] == "ROLLBACK TO SAVEPOINT slow_query_explain"
+
+
+@pytest.mark.parametrize("failing_query_strs", [
+    ("SAVEPOINT", "ROLLBACK"),
+    ("EXPLAIN", "ROLLBACK"),
+    ("RELEASE", "ROLLBACK"),
+])
+def test_explain_never_raises(failing_query_strs):
+    conn = ExplainConnection(*failing_query_strs)
+
+    assert SlowQueryLog._explain(Cursor(conn), "SELECT * FROM cards", None) is None
+
+    if failing_query_strs[0] == "SAVEPOINT":
+        assert conn.queries == ["SAVEPOINT slow_query_explain"]
+
+
+def test_explain_without_a_connection():
+    class ClosedConnection:
+        def cursor(self, cursor_factory=None):
+            raise RuntimeError("connection already closed")
+
+    assert SlowQueryLog._explain(Cursor(ClosedConnection()), "SELECT 1", None) is None
+
+
+def test_redact_query():
+    query_str = "INSERT INTO xp (user_user_id, xp_count, note) VALUES (1, 2, 'a (b'), (3, 4, 'it''s') " \
+                "ON CONFLICT DO NOTHING RETURNING 'done'"
+
+    assert SlowQueryLog.redact_query(query_str) == \
+        "INSERT INTO xp (user_user_id, xp_count, note) VALUES <2 rows>  ON CONFLICT DO NOTHING RETURNING '?'"
+
+
+def test_redact():
+    assert SlowQueryLog.redact({"user_id": 1, "email": "a@example.com", "ids": [1, 2], "is_public": None}) == {
+        "user_id": 1,
+        "email": "<str of 13>",
+        "ids": "<list of 2>",
+        "is_public": None,
+    }
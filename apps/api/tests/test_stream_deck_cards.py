@@ -0,0 +1,52 @@
+import datetime
+import uuid
+
+import pytest
+
+from controllers.controller_database import ControllerDatabase
+
+CREATED = datetime.datetime(2022, 1, 1)
+
+
+def cards_responder(card_count: int):
+    """
+    :return: a responder for a deck of card_count cards, that reads them with the keyset of the query
+    """
+    rows = [
+        (uuid.uuid4(), f"front {card_id}", f"back {card_id}", CREATED + datetime.timedelta(seconds=card_id // 2), card_id)
+        for card_id in range(1, card_count + 1)
+    ]
+
+    def respond(query_str, parameters):
+        after = [
+            row for row in rows
+            if parameters["cursor_id"] is None or row[3:] > (parameters["cursor_created"], parameters["cursor_id"])
+        ]
+
+        return after[:parameters["batch_size"]]
+
+    return respond, rows
+
+
+@pytest.mark.parametrize("card_count, batch_count", [(0, 0), (3, 1), (10, 4), (12, 4)])
+def test_stream_deck_cards(fake_database, card_count, batch_count):
+    responder, rows = cards_responder(card_count)
+    database = fake_database(responder)
+
+    batches = list(ControllerDatabase.stream_deck_cards(1, batch_size=3))
+
+    assert len(batches) == batch_count
+    assert [card for batch in batches for card in batch] == [
+        (str(card_uuid), front_text, back_text) for card_uuid, front_text, back_text, _, _ in rows
+    ]
+    assert all("(created, card_id) >" in query_str for query_str in database.queries()[1:])
+
+
+def test_stream_deck_cards_raises(fake_database):
+    def respond(query_str, parameters):
+        raise RuntimeError("connection lost")
+
+    fake_database(respond)
+
+    with pytest.raises(RuntimeError):
+        list(ControllerDatabase.stream_deck_cards(1))
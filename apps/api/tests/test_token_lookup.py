@@ -0,0 +1,48 @@
+import asyncio
+import uuid
+
+import pytest
+
+from controllers.controller_database import ControllerDatabase
+from controllers.controller_database_async import AsyncControllerDatabase
+
+USER_ID = 7
+
+
+@pytest.fixture(params=["sync", "async"])
+def get_user_id_by_token_uuid(request):
+    ControllerDatabase.token_cache.clear()
+
+    if request.param == "sync":
+        yield ControllerDatabase.get_user_id_by_token_uuid
+    else:
+        yield lambda token_uuid: asyncio.run(AsyncControllerDatabase.get_user_id_by_token_uuid(token_uuid))
+
+    ControllerDatabase.token_cache.clear()
+
+
+@pytest.mark.parametrize("token_uuid", ["", "Bearer ", "not a uuid", "Bearer 1234"])
+def test_malformed_token_is_not_looked_up(fake_database, get_user_id_by_token_uuid, token_uuid):
+    database = fake_database(lambda query_str, parameters: [(USER_ID, )])
+
+    assert get_user_id_by_token_uuid(token_uuid) == 0
+    assert get_user_id_by_token_uuid(token_uuid) == 0
+    assert database.executed == []
+
+
+def test_token_is_looked_up_once(fake_database, get_user_id_by_token_uuid):
+    database = fake_database(lambda query_str, parameters: [(USER_ID, )])
+    token_uuid = str(uuid.uuid4())
+
+    assert get_user_id_by_token_uuid(f"Bearer {token_uuid}") == USER_ID
+    assert get_user_id_by_token_uuid(token_uuid) == USER_ID
+    assert len(database.queries("EXECUTE")) == 1
+
+
+def test_unknown_token_is_cached(fake_database, get_user_id_by_token_uuid):
+    database = fake_database(lambda query_str, parameters: [])
+    token_uuid = str(uuid.uuid4())
+
+    assert get_user_id_by_token_uuid(token_uuid) == 0
+    assert get_user_id_by_token_uuid(token_uuid) == 0
+    assert len(database.queries("EXECUTE")) == 1
@@ -0,0 +1,81 @@
+from utils.ttl_cache import TtlCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_get_and_set():
+    cache = TtlCache(max_size=10, ttl=60)
+
+    cache.set("a", 1)
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("b", default=0) == 0
+
+
+def test_cached_none_is_not_missing():
+    cache = TtlCache(max_size=10, ttl=60)
+
+    cache.set("a", None)
+
+    assert cache.get("a", default="missing") is None
+
+
+def test_entries_expire(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr("utils.ttl_cache.time.monotonic", clock)
+    cache = TtlCache(max_size=10, ttl=60)
+
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=5)
+    clock.now += 10
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+
+    clock.now += 60
+
+    assert cache.get("a") is None
+
+
+def test_non_positive_ttl_is_not_cached():
+    cache = TtlCache(max_size=10, ttl=60)
+
+    cache.set("a", 1, ttl=0)
+
+    assert cache.get("a") is None
+
+
+def test_least_recently_used_is_dropped():
+    cache = TtlCache(max_size=2, ttl=60)
+
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+
+
+def test_delete_and_clear():
+    cache = TtlCache(max_size=10, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+
+    cache.delete("a")
+    cache.delete("missing")
+
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+
+    cache.clear()
+
+    assert cache.get("b") is None
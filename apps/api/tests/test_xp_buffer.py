@@ -0,0 +1,100 @@
+import datetime
+
+from utils.xp_buffer import XpBuffer
+
+DAY = datetime.date(2022, 3, 1)
+NEXT_DAY = DAY + datetime.timedelta(days=1)
+
+
+class FlushRecorder:
+    def __init__(self, is_successful: bool = True):
+        self.is_successful = is_successful
+        self.flushed = []
+
+    def __call__(self, xp_counts) -> bool:
+        self.flushed.append(dict(xp_counts))
+
+        return self.is_successful
+
+
+def test_increments_are_summed_per_user_and_day():
+    flush = FlushRecorder()
+    xp_buffer = XpBuffer(flush)
+
+    xp_buffer.add(1, 5, DAY)
+    xp_buffer.add(1, 3, DAY)
+    xp_buffer.add(1, 2, NEXT_DAY)
+    xp_buffer.add(2, 1, DAY)
+
+    assert xp_buffer.pending(1) == {DAY: 8, NEXT_DAY: 2}
+    assert xp_buffer.pending(3) == {}
+    assert xp_buffer.flush()
+    assert flush.flushed == [{(1, DAY): 8, (1, NEXT_DAY): 2, (2, DAY): 1}]
+    assert xp_buffer.pending(1) == {}
+
+
+def test_empty_flush_does_not_write():
+    flush = FlushRecorder()
+    xp_buffer = XpBuffer(flush)
+
+    assert xp_buffer.flush()
+    assert flush.flushed == []
+
+
+def test_failed_flush_puts_the_xp_back():
+    flush = FlushRecorder(is_successful=False)
+    xp_buffer = XpBuffer(flush)
+    xp_buffer.add(1, 5, DAY)
+
+    assert not xp_buffer.flush()
+
+    xp_buffer.add(1, 2, DAY)
+
+    assert xp_buffer.pending(1) == {DAY: 7}
+
+    flush.is_successful = True
+
+    assert xp_buffer.flush()
+    assert flush.flushed[-1] == {(1, DAY): 7}
+
+
+def test_raising_flush_puts_the_xp_back():
+    def flush(xp_counts):
+        raise RuntimeError("database is down")
+
+    xp_buffer = XpBuffer(flush)
+    xp_buffer.add(1, 5, DAY)
+
+    assert not xp_buffer.flush()
+    assert xp_buffer.pending(1) == {DAY: 5}
+
+
+def test_full_buffer_refuses_new_days():
+    xp_buffer = XpBuffer(FlushRecorder(), max_size=2)
+
+    assert xp_buffer.add(1, 1, DAY)
+    assert xp_buffer.add(2, 1, DAY)
+    assert not xp_buffer.add(3, 1, DAY)
+    assert not xp_buffer.add(1, 1, NEXT_DAY)
+    assert xp_buffer.add(1, 1, DAY)
+    assert xp_buffer.pending(1) == {DAY: 2}
+
+
+def test_pending_user_ids():
+    xp_buffer = XpBuffer(FlushRecorder())
+    xp_buffer.add(1, 1, DAY)
+    xp_buffer.add(2, 1, NEXT_DAY)
+
+    assert sorted(xp_buffer.pending_user_ids(DAY)) == [1, 2]
+    assert xp_buffer.pending_user_ids(NEXT_DAY) == [2]
+
+
+def test_stop_flushes_what_is_left():
+    flush = FlushRecorder()
+    xp_buffer = XpBuffer(flush, flush_interval=60)
+    xp_buffer.start()
+    xp_buffer.add(1, 4, DAY)
+
+    xp_buffer.stop()
+
+    assert flush.flushed == [{(1, DAY): 4}]
@@ -0,0 +1,231 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Tuple
+
+import psycopg2
+from loguru import logger
+from psycopg2.extensions import (
+    connection,
+    POLL_OK,
+    POLL_READ,
+    POLL_WRITE,
+    TRANSACTION_STATUS_IDLE,
+    TRANSACTION_STATUS_UNKNOWN,
+)
+
+from utils.connection_pool import PoolTimeoutError
+
+
+async def wait(conn: connection) -> None:
+    """
+    Used for waiting until an asynchronous connection finished what it was doing,
+    for example connecting or running a query. The event loop runs other coroutines meanwhile
+    :param conn: a psycopg2 connection opened with async_=True
+    """
+    loop = asyncio.get_running_loop()
+
+    while True:
+        state = conn.poll()
+
+        if state == POLL_OK:
+            return
+
+        if state == POLL_READ:
+            add_watcher, remove_watcher = loop.add_reader, loop.remove_reader
+        elif state == POLL_WRITE:
+            add_watcher, remove_watcher = loop.add_writer, loop.remove_writer
+        else:
+            raise psycopg2.OperationalError(f"Unexpected poll state {state}")
+
+        is_ready = loop.create_future()
+        fileno = conn.fileno()
+        add_watcher(fileno, lambda: is_ready.done() or is_ready.set_result(None))
+
+        try:
+            await is_ready
+        finally:
+            remove_watcher(fileno)
+
+
+class AsyncConnectionPool:
+    """
+    A pool of asynchronous psycopg2 connections for the coroutines of one event loop.
+    The connections are in autocommit mode, so every statement is its own transaction.
+    Connections are checked for health when they are borrowed
+    and idle connections above min_size are closed after max_idle seconds.
+    """
+
+    def __init__(
+            self,
+            connect: Callable[[], Awaitable[connection]],
+            min_size: int = 1,
+            max_size: int = 10,
+            max_idle: float = 300,
+            health_check_after: float = 30,
+            checkout_timeout: float = 30,
+    ):
+        """
+        Must be made while the event loop is running
+        :param connect: coroutine function that opens a new asynchronous connection
+        :param min_size: amount of idle connections that are never recycled
+        :param max_size: max amount of open connections
+        :param max_idle: seconds after which an idle connection is closed
+        :param health_check_after: seconds of idleness after which a connection is pinged before use
+        :param checkout_timeout: seconds to wait for a free connection
+        """
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self.health_check_after = health_check_after
+        self.checkout_timeout = checkout_timeout
+
+        self._idle: Deque[Tuple[connection, float]] = deque()
+        self._size = 0
+        self._closed = False
+        self._condition = asyncio.Condition()
+
+    @property
+    def size(self) -> int:
+        """
+        :return: the amount of open connections, idle and borrowed
+        """
+        return self._size
+
+    async def getconn(self) -> connection:
+        """
+        Used for borrowing a connection from the pool.
+        Opens a new connection if there are no idle ones and the pool is not full.
+        :return: a healthy asynchronous psycopg2 connection
+        """
+        conn = None
+        last_used = 0.0
+        deadline = time.monotonic() + self.checkout_timeout
+
+        async with self._condition:
+            while True:
+                if self._closed:
+                    raise PoolTimeoutError("The connection pool is closed")
+
+                self._recycle_idle()
+
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    break
+
+                if self._size < self.max_size:
+                    self._size += 1
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolTimeoutError(f"No free connection after {self.checkout_timeout}s")
+
+                try:
+                    await asyncio.wait_for(self._condition.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+
+        try:
+            if conn is not None and not await self._is_healthy(conn, last_used):
+                self._close(conn)
+                conn = None
+
+            if conn is None:
+                conn = await self._connect()
+        except BaseException:
+            await self._release_slot()
+            raise
+
+        return conn
+
+    async def putconn(self, conn: connection) -> None:
+        """
+        Used for returning a borrowed connection to the pool.
+        Broken connections, connections that were left running a query
+        and connections that can not leave a transaction are discarded.
+        :param conn: the connection to return
+        """
+        reusable = not conn.closed and not self._closed and not conn.isexecuting()
+
+        if reusable and conn.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("ROLLBACK")
+                    await wait(conn)
+            except Exception as e:
+                logger.exception(e)
+                reusable = False
+
+        if not reusable:
+            self._close(conn)
+            await self._release_slot()
+            return
+
+        async with self._condition:
+            self._idle.append((conn, time.monotonic()))
+            self._condition.notify()
+
+    async def close(self) -> None:
+        """
+        Used for closing every idle connection and refusing new checkouts.
+        Borrowed connections are closed when they are returned.
+        """
+        async with self._condition:
+            self._closed = True
+            while self._idle:
+                conn, _ = self._idle.popleft()
+                self._close(conn)
+                self._size -= 1
+            self._condition.notify_all()
+
+    async def _is_healthy(self, conn: connection, last_used: float) -> bool:
+        """
+        Checks if a connection can still be used.
+        Connections idle for longer than health_check_after are pinged.
+        :param conn: the connection to check
+        :param last_used: monotonic time of when the connection was returned
+        :return: True if the connection is usable
+        """
+        if conn.closed or conn.get_transaction_status() == TRANSACTION_STATUS_UNKNOWN:
+            return False
+
+        if time.monotonic() - last_used < self.health_check_after:
+            return True
+
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+                await wait(conn)
+        except Exception:
+            return False
+
+        return True
+
+    def _recycle_idle(self) -> None:
+        """
+        Closes connections that have been idle for longer than max_idle.
+        The oldest connections are at the left of the deque.
+        Must be called while holding the pool lock.
+        """
+        now = time.monotonic()
+
+        while len(self._idle) > self.min_size and now - self._idle[0][1] > self.max_idle:
+            conn, _ = self._idle.popleft()
+            self._close(conn)
+            self._size -= 1
+
+    async def _release_slot(self) -> None:
+        async with self._condition:
+            self._size -= 1
+            self._condition.notify()
+
+    @staticmethod
+    def _close(conn: connection) -> None:
+        try:
+            conn.close()
+        except Exception as e:
+            logger.exception(e)
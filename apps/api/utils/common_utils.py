@@ -1,18 +1,190 @@
+import hmac
+import threading
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Dict, Iterator
+
 import psycopg2
 from loguru import logger
 from psycopg2.extensions import connection
 from os import environ
 
+from utils.async_connection_pool import AsyncConnectionPool, wait
+from utils.connection_pool import ConnectionPool
+from utils.metrics import AsyncMetricsCursor, Metrics, MetricsCursor
+
 
 class CommonUtils:
+    _pool: ConnectionPool = None
+    _pool_lock = threading.Lock()
+    _async_pool: AsyncConnectionPool = None
+
+    @staticmethod
+    def connect_parameters() -> Dict[str, str]:
+        """
+        :return: the arguments of psycopg2.connect for the database
+        """
+        return {
+            "host": environ["DB_HOST"],
+            "database": environ["DB_NAME"],
+            "user": environ["DB_USER"],
+            "password": environ["DB_PASSWORD"],
+            "port": "7595",
+        }
+
+    @staticmethod
+    def connect() -> connection:
+        """
+        Opens a new connection to the database.
+        Should only be used by the connection pool
+        :return: a psycopg2 connection
+        """
+        conn = psycopg2.connect(**CommonUtils.connect_parameters(), cursor_factory=MetricsCursor)
+        Metrics.record_connection_opened()
+
+        return conn
+
     @staticmethod
-    def connection() -> connection:
-        conn = psycopg2.connect(
-            host=environ["DB_HOST"],
-            database=environ["DB_NAME"],
-            user=environ["DB_USER"],
-            password=environ["DB_PASSWORD"],
-            port="7595",
-        )
+    async def connect_async() -> connection:
+        """
+        Opens a new asynchronous connection to the database.
+        Should only be used by the asynchronous connection pool
+        :return: a psycopg2 connection in asynchronous mode, its cursors are AsyncMetricsCursors
+        """
+        conn = psycopg2.connect(**CommonUtils.connect_parameters(), async_=True, cursor_factory=AsyncMetricsCursor)
+        await wait(conn)
+        Metrics.record_connection_opened()
 
         return conn
+
+    @staticmethod
+    def pool() -> ConnectionPool:
+        """
+        Used for getting the process wide connection pool.
+        The pool is created on first use
+        :return: the ConnectionPool
+        """
+        if CommonUtils._pool is None:
+            with CommonUtils._pool_lock:
+                if CommonUtils._pool is None:
+                    CommonUtils._pool = ConnectionPool(
+                        connect=CommonUtils.connect,
+                        min_size=int(environ.get("DB_POOL_MIN_SIZE", 1)),
+                        max_size=int(environ.get("DB_POOL_MAX_SIZE", 10)),
+                        max_idle=float(environ.get("DB_POOL_MAX_IDLE", 300)),
+                    )
+
+        return CommonUtils._pool
+
+    @staticmethod
+    def close_pool() -> None:
+        """
+        Used for closing the connection pool on shutdown
+        """
+        with CommonUtils._pool_lock:
+            if CommonUtils._pool is not None:
+                CommonUtils._pool.close()
+                CommonUtils._pool = None
+
+    @staticmethod
+    def async_pool() -> AsyncConnectionPool:
+        """
+        Used for getting the connection pool of the coroutines.
+        The pool is created on first use and must only be used on the event loop that created it
+        :return: the AsyncConnectionPool
+        """
+        if CommonUtils._async_pool is None:
+            CommonUtils._async_pool = AsyncConnectionPool(
+                connect=CommonUtils.connect_async,
+                min_size=int(environ.get("DB_ASYNC_POOL_MIN_SIZE", 1)),
+                max_size=int(environ.get("DB_ASYNC_POOL_MAX_SIZE", 10)),
+                max_idle=float(environ.get("DB_POOL_MAX_IDLE", 300)),
+            )
+
+        return CommonUtils._async_pool
+
+    @staticmethod
+    async def close_async_pool() -> None:
+        """
+        Used for closing the connection pool of the coroutines on shutdown
+        """
+        async_pool, CommonUtils._async_pool = CommonUtils._async_pool, None
+
+        if async_pool is not None:
+            await async_pool.close()
+
+    @staticmethod
+    @contextmanager
+    def connection() -> Iterator[connection]:
+        """
+        Used for borrowing a connection from the pool.
+        The transaction is committed when the block exits
+        and rolled back if it raises. The connection is then returned to the pool
+        :return: a psycopg2 connection
+        """
+        pool = CommonUtils.pool()
+        conn = pool.getconn()
+
+        try:
+            with conn:
+                yield conn
+        finally:
+            pool.putconn(conn)
+
+    @staticmethod
+    @asynccontextmanager
+    async def async_connection() -> AsyncIterator[connection]:
+        """
+        Used for borrowing an asynchronous connection from the pool of the coroutines.
+        It is in autocommit mode, every statement is its own transaction.
+        The connection is returned to the pool when the block exits
+        :return: a psycopg2 connection in asynchronous mode
+        """
+        async_pool = CommonUtils.async_pool()
+        conn = await async_pool.getconn()
+
+        try:
+            yield conn
+        finally:
+            await async_pool.putconn(conn)
+
+    @staticmethod
+    @asynccontextmanager
+    async def async_transaction() -> AsyncIterator[connection]:
+        """
+        Used for running several statements on an asynchronous connection in one transaction.
+        The transaction is committed when the block exits. If the block raises,
+        the pool rolls it back when the connection is returned
+        :return: a psycopg2 connection in asynchronous mode, inside a transaction
+        """
+        async with CommonUtils.async_connection() as conn:
+            with conn.cursor() as cur:
+                await cur.execute("BEGIN")
+
+            yield conn
+
+            with conn.cursor() as cur:
+                await cur.execute("COMMIT")
+
+    @staticmethod
+    def is_admin_token(admin_token: str) -> bool:
+        """
+        Used for checking the token of admin only endpoints.
+        Admin endpoints are disabled when ADMIN_TOKEN is not set
+        :param admin_token: the token sent with the request
+        :return: bool of weather or not the token is the admin token
+        """
+        expected_admin_token = environ.get("ADMIN_TOKEN", "")
+
+        return bool(expected_admin_token) and hmac.compare_digest(admin_token or "", expected_admin_token)
+
+    @staticmethod
+    def like_prefix(phrase: str) -> str:
+        """
+        Used for making a LIKE pattern that matches strings starting with the phrase.
+        LIKE wildcards in the phrase are escaped
+        :param phrase: the start of the string
+        :return: the pattern
+        """
+        escaped_phrase = phrase.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+        return f"{escaped_phrase}%"
@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Optional, Tuple, Union
+
+# (model, id) keys hold the models, (model, uuid) keys hold the id of the model
+_identity_map: ContextVar[Optional[Dict[Tuple[type, Union[int, str]], Any]]] = ContextVar("identity_map", default=None)
+
+
+class IdentityMap:
+    """
+    Request scoped store of the models loaded from the database, by model type and id or uuid.
+    Outside a scope nothing is stored, so every lookup goes to the database.
+    """
+
+    @staticmethod
+    @contextmanager
+    def scope() -> Iterator[None]:
+        """
+        Used for starting an empty identity map, for example for one request.
+        The map is dropped when the block exits
+        """
+        token = _identity_map.set({})
+
+        try:
+            yield
+        finally:
+            _identity_map.reset(token)
+
+    @staticmethod
+    def get(model: type, entity_id: int) -> Any:
+        """
+        Used for getting a model that was already loaded in this scope
+        :param model: the model class, for example User
+        :param entity_id: the id of the model
+        :return: the model or None
+        """
+        identity_map = _identity_map.get()
+
+        if identity_map is None:
+            return None
+
+        return identity_map.get((model, entity_id))
+
+    @staticmethod
+    def get_by_uuid(model: type, entity_uuid: str) -> Any:
+        """
+        Used for getting a model that was already loaded in this scope
+        :param model: the model class, for example User
+        :param entity_uuid: the uuid of the model
+        :return: the model or None
+        """
+        identity_map = _identity_map.get()
+
+        if identity_map is None or not entity_uuid:
+            return None
+
+        entity_id = identity_map.get((model, str(entity_uuid)))
+
+        return identity_map.get((model, entity_id))
+
+    @staticmethod
+    def add(model: type, entity_id: int, entity: Any, entity_uuid: str = None) -> None:
+        """
+        Used for storing a model loaded from the database
+        :param model: the model class, for example User
+        :param entity_id: the id of the model
+        :param entity: the model
+        :param entity_uuid: the uuid of the model, so it can also be found by it
+        """
+        identity_map = _identity_map.get()
+
+        if identity_map is not None and entity_id:
+            identity_map[(model, entity_id)] = entity
+            if entity_uuid:
+                identity_map[(model, str(entity_uuid))] = entity_id
+
+    @staticmethod
+    def discard(model: type, entity_id: int) -> None:
+        """
+        Used for removing a model that was changed in the database.
+        It is then not found by its uuid either
+        :param model: the model class, for example User
+        :param entity_id: the id of the model
+        """
+        identity_map = _identity_map.get()
+
+        if identity_map is not None:
+            identity_map.pop((model, entity_id), None)
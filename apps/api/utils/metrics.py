@@ -0,0 +1,273 @@
+from __future__ import annotations
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from psycopg2.extensions import cursor
+
+from utils.async_connection_pool import wait
+from utils.query_registry import QueryRegistry
+from utils.slow_query_log import SlowQueryLog
+from utils.tracer import Tracer
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+class RequestMetrics:
+    """
+    What the database layer did during one request
+    """
+
+    __slots__ = ("queries", "db_time", "connections_opened")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.connections_opened = 0
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        if index < len(self.counts):
+            self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+
+class RouteMetrics:
+    __slots__ = ("latency", "queries", "db_time", "connections_opened")
+
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.queries = Histogram(QUERY_COUNT_BUCKETS)
+        self.db_time = 0.0
+        self.connections_opened = 0
+
+
+_request_metrics: ContextVar[Optional[RequestMetrics]] = ContextVar("request_metrics", default=None)
+
+
+class Metrics:
+    """
+    Per route request latency and database use, rendered in the Prometheus text format.
+    The database layer reports every query and opened connection
+    to the metrics of the request it runs for.
+    """
+
+    _routes: Dict[Tuple[str, str], RouteMetrics] = {}
+    _route_paths: Dict[object, str] = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    @contextmanager
+    def request() -> Iterator[RequestMetrics]:
+        """
+        Used for collecting the database use of one request.
+        Executor calls see the same metrics, because the context is copied into them
+        :return: the RequestMetrics of the request
+        """
+        request_metrics = RequestMetrics()
+        token = _request_metrics.set(request_metrics)
+
+        try:
+            yield request_metrics
+        finally:
+            _request_metrics.reset(token)
+
+    @staticmethod
+    def record_query(duration: float) -> None:
+        """
+        Used by the database layer for every query it runs
+        :param duration: the seconds the query took
+        """
+        request_metrics = _request_metrics.get()
+
+        if request_metrics is not None:
+            request_metrics.queries += 1
+            request_metrics.db_time += duration
+
+    @staticmethod
+    def record_connection_opened() -> None:
+        """
+        Used by the database layer when it opens a new connection
+        """
+        request_metrics = _request_metrics.get()
+
+        if request_metrics is not None:
+            request_metrics.connections_opened += 1
+
+    @staticmethod
+    def record_request(route: str, method: str, duration: float, request_metrics: RequestMetrics) -> None:
+        """
+        Used for adding a finished request to the metrics of its route
+        :param route: the path of the route, for example "/get_deck_details"
+        :param method: the http method
+        :param duration: the seconds the request took
+        :param request_metrics: the database use of the request
+        """
+        with Metrics._lock:
+            route_metrics = Metrics._routes.get((route, method))
+            if route_metrics is None:
+                route_metrics = RouteMetrics()
+                Metrics._routes[(route, method)] = route_metrics
+
+            route_metrics.latency.observe(duration)
+            route_metrics.queries.observe(request_metrics.queries)
+            route_metrics.db_time += request_metrics.db_time
+            route_metrics.connections_opened += request_metrics.connections_opened
+
+    @staticmethod
+    def route_path(scope: dict) -> str:
+        """
+        Used for getting the path template of the route that handled a request,
+        so paths with parameters are counted as one route
+        :param scope: the asgi scope of the request
+        :return: the path, or "unmatched" if no route handled it
+        """
+        endpoint = scope.get("endpoint")
+
+        if endpoint is None:
+            return "unmatched"
+
+        if endpoint not in Metrics._route_paths:
+            paths = [route.path for route in scope["app"].routes if getattr(route, "endpoint", None) is endpoint]
+            Metrics._route_paths[endpoint] = paths[0] if paths else scope["path"]
+
+        return Metrics._route_paths[endpoint]
+
+    @staticmethod
+    def render() -> str:
+        """
+        Used for getting every metric in the Prometheus text format
+        :return: the metrics
+        """
+        lines = []
+
+        with Metrics._lock:
+            routes = sorted(Metrics._routes.items())
+
+            Metrics._render_histogram(
+                lines,
+                "nocellos_request_duration_seconds",
+                "Time spent handling requests",
+                [(labels, route_metrics.latency) for labels, route_metrics in routes],
+            )
+            Metrics._render_histogram(
+                lines,
+                "nocellos_request_db_queries",
+                "Database queries run per request",
+                [(labels, route_metrics.queries) for labels, route_metrics in routes],
+            )
+
+            lines.append("# HELP nocellos_request_db_seconds_total Time spent in database queries")
+            lines.append("# TYPE nocellos_request_db_seconds_total counter")
+            for (route, method), route_metrics in routes:
+                lines.append(f'nocellos_request_db_seconds_total{{route="{route}",method="{method}"}} {route_metrics.db_time}')
+
+            lines.append("# HELP nocellos_request_db_connections_opened_total Database connections opened")
+            lines.append("# TYPE nocellos_request_db_connections_opened_total counter")
+            for (route, method), route_metrics in routes:
+                lines.append(
+                    f'nocellos_request_db_connections_opened_total{{route="{route}",method="{method}"}} '
+                    f"{route_metrics.connections_opened}"
+                )
+
+        query_stats = QueryRegistry.stats()
+
+        lines.append("# HELP nocellos_prepared_query_calls_total Calls of registered queries")
+        lines.append("# TYPE nocellos_prepared_query_calls_total counter")
+        for name, stats in query_stats.items():
+            lines.append(f'nocellos_prepared_query_calls_total{{query="{name}"}} {stats["calls"]}')
+
+        lines.append("# HELP nocellos_prepared_query_seconds_total Time spent in registered queries")
+        lines.append("# TYPE nocellos_prepared_query_seconds_total counter")
+        for name, stats in query_stats.items():
+            lines.append(f'nocellos_prepared_query_seconds_total{{query="{name}"}} {stats["total_time"]}')
+
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _render_histogram(
+            lines: List[str],
+            name: str,
+            description: str,
+            histograms: List[Tuple[Tuple[str, str], Histogram]],
+    ) -> None:
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} histogram")
+
+        for (route, method), histogram in histograms:
+            labels = f'route="{route}",method="{method}"'
+            cumulative_count = 0
+
+            for bucket, count in zip(histogram.buckets, histogram.counts):
+                cumulative_count += count
+                lines.append(f'{name}_bucket{{{labels},le="{bucket}"}} {cumulative_count}')
+
+            lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+            lines.append(f"{name}_sum{{{labels}}} {histogram.sum}")
+            lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+
+
+class MetricsCursor(cursor):
+    """
+    A psycopg2 cursor that reports every query it runs to Metrics and Tracer,
+    and the ones over the threshold to SlowQueryLog
+    """
+
+    def execute(self, query, vars=None):
+        start_time = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            self._record(query, vars, time.perf_counter() - start_time)
+
+    def executemany(self, query, vars_list):
+        start_time = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            self._record(query, None, time.perf_counter() - start_time)
+
+    def copy_expert(self, sql, file, size=8192):
+        start_time = time.perf_counter()
+        try:
+            return super().copy_expert(sql, file, size)
+        finally:
+            self._record(sql, None, time.perf_counter() - start_time)
+
+    def _record(self, query, parameters, duration: float) -> None:
+        Metrics.record_query(duration)
+        Tracer.record_query(self.rowcount)
+
+        if duration >= SlowQueryLog.threshold:
+            SlowQueryLog.record(self, query, parameters, duration)
+
+
+class AsyncMetricsCursor(MetricsCursor):
+    """
+    The cursor of the asynchronous connections. execute has to be awaited,
+    the results are then fetched as usual. Queries are reported like MetricsCursor does
+    """
+
+    async def execute(self, query, vars=None):
+        start_time = time.perf_counter()
+        try:
+            cursor.execute(self, query, vars)
+            await wait(self.connection)
+        finally:
+            self._record(query, vars, time.perf_counter() - start_time)
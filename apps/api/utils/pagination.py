@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import base64
+import binascii
+import datetime
+import json
+from typing import Dict, List, Optional, Tuple
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class Pagination:
+    """
+    Keyset pagination on (created, id).
+    A page continues after the last row of the previous page,
+    which is sent to the client as an opaque cursor.
+    """
+
+    @staticmethod
+    def encode_cursor(created: datetime.datetime, row_id: int) -> str:
+        """
+        Used for making the cursor that points after a row
+        :param created: the created timestamp of the row
+        :param row_id: the id of the row
+        :return: the cursor string
+        """
+        cursor_json = json.dumps([created.isoformat(), row_id])
+
+        return base64.urlsafe_b64encode(cursor_json.encode("utf-8")).decode("ascii")
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> Optional[Tuple[datetime.datetime, int]]:
+        """
+        Used for reading a cursor sent by the client
+        :param cursor: the cursor string
+        :return: tuple of created and id, or None if the cursor is empty or invalid
+        """
+        result = None
+
+        if cursor:
+            try:
+                created, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+                result = (datetime.datetime.fromisoformat(created), int(row_id))
+            except (ValueError, TypeError, binascii.Error):
+                result = None
+
+        return result
+
+    @staticmethod
+    def page_size(page_size: Optional[int]) -> int:
+        """
+        Used for bounding the page size requested by the client
+        :param page_size: the requested page size
+        :return: a page size between 1 and MAX_PAGE_SIZE
+        """
+        if not page_size or page_size < 1:
+            return DEFAULT_PAGE_SIZE
+
+        return min(page_size, MAX_PAGE_SIZE)
+
+    @staticmethod
+    def keyset_query_str(created_column: str, id_column: str, cursor: str) -> str:
+        """
+        Used for getting the WHERE condition that skips the rows before the cursor
+        :param created_column: the created column, for example "d.created"
+        :param id_column: the id column, for example "d.deck_id"
+        :param cursor: the cursor string
+        :return: the condition, or an empty string for the first page
+        """
+        if not Pagination.decode_cursor(cursor):
+            return ""
+
+        return f"AND ({created_column}, {id_column}) > (%(cursor_created)s, %(cursor_id)s) "
+
+    @staticmethod
+    def keyset_parameters(cursor: str, page_size: Optional[int]) -> Dict:
+        """
+        Used for getting the query parameters for keyset_query_str and the LIMIT
+        :param cursor: the cursor string
+        :param page_size: the requested page size
+        :return: a dictionary with cursor_created, cursor_id and page_size
+        """
+        cursor_created, cursor_id = Pagination.decode_cursor(cursor) or (None, None)
+
+        return {
+            "cursor_created": cursor_created,
+            "cursor_id": cursor_id,
+            "page_size": Pagination.page_size(page_size),
+        }
+
+    @staticmethod
+    def next_cursor(rows: List, page_size: Optional[int], id_field: str) -> str:
+        """
+        Used for getting the cursor of the next page
+        :param rows: the models of the current page, they must have a created field
+        :param page_size: the requested page size
+        :param id_field: the name of the id field, for example "deck_id"
+        :return: the cursor, or an empty string if this is the last page
+        """
+        if not rows or len(rows) < Pagination.page_size(page_size):
+            return ""
+
+        last_row = rows[-1]
+
+        return Pagination.encode_cursor(last_row.created, getattr(last_row, id_field))
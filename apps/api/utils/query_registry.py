@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Set, Tuple
+from weakref import WeakKeyDictionary
+
+from loguru import logger
+from psycopg2.extensions import connection, cursor
+
+_parameter_pattern = re.compile(r"%\((\w+)\)s")
+_name_pattern = re.compile(r"^[a-z_][a-z0-9_]*$")
+
+
+class QueryRegistry:
+    """
+    Named queries that are prepared once per connection and then run by name,
+    so postgres does not parse and plan them again on every call.
+    Queries use the same %(name)s parameters as cursor.execute.
+    Execution counts and times are kept per query.
+    """
+
+    _queries: Dict[str, Tuple[str, Tuple[str, ...]]] = {}
+    _prepared: WeakKeyDictionary[connection, Set[str]] = WeakKeyDictionary()
+    _stats: Dict[str, Dict[str, float]] = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def register(name: str, query_str: str) -> None:
+        """
+        Used for adding a query to the registry, usually when a module is imported
+        :param name: the name of the query, also used as the name of the prepared statement
+        :param query_str: the query, with %(name)s parameters
+        """
+        if not _name_pattern.match(name):
+            raise ValueError(f"Invalid query name: {name}")
+
+        parameter_names = []
+
+        def to_positional(match: re.Match) -> str:
+            if match.group(1) not in parameter_names:
+                parameter_names.append(match.group(1))
+            return f"${parameter_names.index(match.group(1)) + 1}"
+
+        prepared_query_str = _parameter_pattern.sub(to_positional, query_str).replace("%%", "%")
+
+        with QueryRegistry._lock:
+            QueryRegistry._queries[name] = (prepared_query_str, tuple(parameter_names))
+            QueryRegistry._stats[name] = {
+                "calls": 0,
+                "errors": 0,
+                "prepares": 0,
+                "total_time": 0.0,
+                "max_time": 0.0,
+            }
+
+    @staticmethod
+    def execute(cur: cursor, name: str, parameters: dict = None) -> None:
+        """
+        Used for running a registered query. The query is prepared
+        on the connection of the cursor the first time it is run there
+        :param cur: the cursor, its results can be fetched as usual
+        :param name: the name of the query
+        :param parameters: a dictionary of values for the query
+        """
+        with QueryRegistry._measure(name):
+            prepare_query_str = QueryRegistry._prepare_query_str(cur.connection, name)
+            if prepare_query_str:
+                cur.execute(prepare_query_str)
+                QueryRegistry._set_prepared(cur.connection, name)
+
+            cur.execute(*QueryRegistry._execute_query(name, parameters))
+
+    @staticmethod
+    async def execute_async(cur: cursor, name: str, parameters: dict = None) -> None:
+        """
+        Used for running a registered query on an asynchronous connection,
+        like execute does. The execute of the cursor has to be a coroutine
+        :param cur: the cursor, its results can be fetched as usual
+        :param name: the name of the query
+        :param parameters: a dictionary of values for the query
+        """
+        with QueryRegistry._measure(name):
+            prepare_query_str = QueryRegistry._prepare_query_str(cur.connection, name)
+            if prepare_query_str:
+                await cur.execute(prepare_query_str)
+                QueryRegistry._set_prepared(cur.connection, name)
+
+            await cur.execute(*QueryRegistry._execute_query(name, parameters))
+
+    @staticmethod
+    def query_str(name: str) -> str:
+        """
+        Used for getting the text of a registered query, with positional parameters
+        :param name: the name of the query
+        :return: the query, or an empty string if it is not registered
+        """
+        prepared_query_str, _ = QueryRegistry._queries.get(name, ("", ()))
+
+        return prepared_query_str
+
+    @staticmethod
+    def stats() -> Dict[str, Dict[str, float]]:
+        """
+        Used for getting the execution statistics of every registered query
+        :return: a dictionary of query names and their calls, errors, prepares,
+            total_time, max_time and mean_time, times are in seconds
+        """
+        result = {}
+
+        with QueryRegistry._lock:
+            for name, stats in QueryRegistry._stats.items():
+                result[name] = dict(stats)
+                result[name]["mean_time"] = stats["total_time"] / stats["calls"] if stats["calls"] else 0.0
+
+        return result
+
+    @staticmethod
+    def log_stats() -> None:
+        """
+        Used for writing the statistics of the queries that were run to the log
+        """
+        for name, stats in QueryRegistry.stats().items():
+            if stats["calls"]:
+                logger.info(
+                    f"Query {name}: {stats['calls']:.0f} calls, {stats['errors']:.0f} errors, "
+                    f"{stats['prepares']:.0f} prepares, mean {stats['mean_time'] * 1000:.2f} ms, "
+                    f"max {stats['max_time'] * 1000:.2f} ms"
+                )
+
+    @staticmethod
+    def _prepare_query_str(conn: connection, name: str) -> str:
+        """
+        :return: the PREPARE statement of the query, or an empty string if it is prepared on the connection
+        """
+        with QueryRegistry._lock:
+            is_prepared = name in QueryRegistry._prepared.get(conn, ())
+
+        if is_prepared:
+            return ""
+
+        prepared_query_str, _ = QueryRegistry._queries[name]
+
+        # Prepared statements outlive the transaction, they last as long as the connection
+        return f"PREPARE {name} AS {prepared_query_str}"
+
+    @staticmethod
+    def _set_prepared(conn: connection, name: str) -> None:
+        with QueryRegistry._lock:
+            QueryRegistry._prepared.setdefault(conn, set()).add(name)
+            QueryRegistry._stats[name]["prepares"] += 1
+
+    @staticmethod
+    def _execute_query(name: str, parameters: dict = None) -> Tuple[str, List]:
+        """
+        :return: the EXECUTE statement of the query and its positional parameters
+        """
+        _, parameter_names = QueryRegistry._queries[name]
+        parameters = parameters or {}
+
+        if not parameter_names:
+            return f"EXECUTE {name}", []
+
+        placeholders = ", ".join(["%s"] * len(parameter_names))
+
+        return f"EXECUTE {name} ({placeholders})", [parameters[parameter_name] for parameter_name in parameter_names]
+
+    @staticmethod
+    @contextmanager
+    def _measure(name: str) -> Iterator[None]:
+        """
+        Used for counting a run of a query and its errors and time
+        """
+        stats = QueryRegistry._stats[name]
+        start_time = time.perf_counter()
+
+        try:
+            yield
+        except Exception:
+            with QueryRegistry._lock:
+                stats["errors"] += 1
+            raise
+        finally:
+            duration = time.perf_counter() - start_time
+            with QueryRegistry._lock:
+                stats["calls"] += 1
+                stats["total_time"] += duration
+                stats["max_time"] = max(stats["max_time"], duration)
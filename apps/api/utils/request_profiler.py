@@ -0,0 +1,180 @@
+from __future__ import annotations
+
+import cProfile
+import datetime
+import io
+import pstats
+import threading
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+MAX_STORED_PROFILES = 20
+CALL_TREE_LINES = 40
+
+# Category and the parts of the file or function names that belong to it.
+# Generated dataclass __init__ methods of the models are in "<string>"
+CATEGORIES = (
+    ("psycopg2", ("psycopg2", )),
+    ("dataclasses_json serialization", ("dataclasses_json", )),
+    ("model construction", ("pydantic", "/models/", "<string>")),
+    ("form parsing", ("formparsers", "multipart", "fastapi/dependencies/utils")),
+    ("event loop waiting", ("select.epoll", "select.kqueue", "select.select")),
+)
+
+
+class RequestProfile:
+    """
+    The cProfile profiles of one request, one per thread it ran code on
+    """
+
+    def __init__(self):
+        self.profiles: List[cProfile.Profile] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def profile(self) -> Iterator[None]:
+        """
+        Used for profiling the code of the request that runs in the current thread
+        """
+        profile = cProfile.Profile()
+        profile.enable()
+
+        try:
+            yield
+        finally:
+            profile.disable()
+            with self._lock:
+                self.profiles.append(profile)
+
+    def summary(self) -> Dict:
+        """
+        Used for getting the time spent per category and the functions that took the longest
+        :return: {
+            "total_time": float,
+            "categories": {category: float, "other": float},
+            "call_tree": the functions with the highest cumulative time, as text,
+        }, times are in seconds
+        """
+        output = io.StringIO()
+        stats = pstats.Stats(*self.profiles, stream=output)
+
+        categories = {name: 0.0 for name, _ in CATEGORIES}
+        categories["other"] = 0.0
+
+        for (filename, _, function_name), (_, _, self_time, _, _) in stats.stats.items():
+            location = f"{filename} {function_name}"
+            category = next(
+                (name for name, parts in CATEGORIES if any(part in location for part in parts)),
+                "other",
+            )
+            categories[category] += self_time
+
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(CALL_TREE_LINES)
+
+        return {
+            "total_time": stats.total_tt,
+            "categories": categories,
+            "call_tree": output.getvalue(),
+        }
+
+
+_request_profile: ContextVar[Optional[RequestProfile]] = ContextVar("request_profile", default=None)
+
+
+class RequestProfiler:
+    """
+    Profiles single requests with cProfile on demand.
+    The event loop thread is profiled while the request runs, which also includes
+    other requests handled at the same time, and the database calls of the request
+    are profiled in the executor threads. The latest summaries are kept in memory
+    """
+
+    _profiles: OrderedDict[str, Dict] = OrderedDict()
+    _lock = threading.Lock()
+    _is_loop_profiled = False
+
+    @staticmethod
+    @contextmanager
+    def request() -> Iterator[RequestProfile]:
+        """
+        Used for profiling a request. Only one request at a time profiles the event loop thread
+        :return: the RequestProfile of the request
+        """
+        request_profile = RequestProfile()
+        token = _request_profile.set(request_profile)
+
+        with RequestProfiler._lock:
+            is_loop_profiled = not RequestProfiler._is_loop_profiled
+            RequestProfiler._is_loop_profiled = True
+
+        try:
+            if is_loop_profiled:
+                with request_profile.profile():
+                    yield request_profile
+            else:
+                yield request_profile
+        finally:
+            _request_profile.reset(token)
+            if is_loop_profiled:
+                with RequestProfiler._lock:
+                    RequestProfiler._is_loop_profiled = False
+
+    @staticmethod
+    def is_active() -> bool:
+        """
+        :return: bool of weather or not the current request is profiled
+        """
+        return _request_profile.get() is not None
+
+    @staticmethod
+    def call(func: Callable, *args, **kwargs) -> Any:
+        """
+        Used for running a function of a profiled request in another thread
+        :param func: the function
+        :return: the return value of the function
+        """
+        request_profile = _request_profile.get()
+
+        if request_profile is None:
+            return func(*args, **kwargs)
+
+        with request_profile.profile():
+            return func(*args, **kwargs)
+
+    @staticmethod
+    def store(method: str, path: str, request_profile: RequestProfile) -> str:
+        """
+        Used for keeping the summary of a profiled request
+        :param method: the http method of the request
+        :param path: the path of the request
+        :param request_profile: the profile of the request
+        :return: the id of the stored profile
+        """
+        profile_id = str(uuid.uuid4())
+        profile = {
+            "profile_id": profile_id,
+            "method": method,
+            "path": path,
+            "time": datetime.datetime.utcnow().isoformat(),
+            **request_profile.summary(),
+        }
+
+        with RequestProfiler._lock:
+            RequestProfiler._profiles[profile_id] = profile
+            while len(RequestProfiler._profiles) > MAX_STORED_PROFILES:
+                RequestProfiler._profiles.popitem(last=False)
+
+        return profile_id
+
+    @staticmethod
+    def get(profile_id: str) -> Optional[Dict]:
+        """
+        Used for getting a stored profile
+        :param profile_id: the id of the profile
+        :return: the profile, or None if it is not stored anymore
+        """
+        with RequestProfiler._lock:
+            return RequestProfiler._profiles.get(profile_id)
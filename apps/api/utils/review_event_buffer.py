@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import datetime
+import threading
+from typing import Callable, List, Tuple
+
+from loguru import logger
+
+# user_id, card_uuid, grade, latency_ms, reviewed_at
+ReviewEventRow = Tuple[int, str, int, int, datetime.datetime]
+
+
+class ReviewEventBuffer:
+    """
+    Collects review events in memory and appends them to the event log in bulk.
+    Events are flushed by a background thread every flush_interval seconds
+    or as soon as flush_size events are waiting. When max_size events are waiting,
+    new batches are refused so the caller can tell the client to retry later.
+    """
+
+    def __init__(
+            self,
+            flush: Callable[[List[ReviewEventRow]], bool],
+            flush_interval: float = 1,
+            flush_size: int = 5000,
+            max_size: int = 100000,
+    ):
+        """
+        :param flush: function that writes the events, returns bool of weather or not it was successful
+        :param flush_interval: max amount of seconds an event waits before being written
+        :param flush_size: amount of events that triggers an early flush
+        :param max_size: amount of events after which add refuses new batches
+        """
+        self._flush = flush
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.max_size = max_size
+
+        self._pending: List[ReviewEventRow] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake_up = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def add(self, events: List[ReviewEventRow]) -> bool:
+        """
+        Used for buffering a batch of review events. Never blocks on the database.
+        The batch is buffered whole or not at all
+        :param events: the events
+        :return: False if the buffer is too full to take the batch
+        """
+        with self._lock:
+            if len(self._pending) + len(events) > self.max_size:
+                self._wake_up.set()
+                return False
+
+            self._pending.extend(events)
+
+            if len(self._pending) >= self.flush_size:
+                self._wake_up.set()
+
+        return True
+
+    def flush(self) -> bool:
+        """
+        Used for writing every buffered event.
+        If the write fails, the events are put back in front of the buffer
+        :return: bool of weather or not the write was successful
+        """
+        with self._flush_lock:
+            with self._lock:
+                events, self._pending = self._pending, []
+
+            if not events:
+                return True
+
+            is_successful = False
+            try:
+                is_successful = self._flush(events)
+            except Exception as e:
+                logger.exception(e)
+
+            if not is_successful:
+                with self._lock:
+                    self._pending[:0] = events
+
+        return is_successful
+
+    def start(self) -> None:
+        """
+        Used for starting the background flush thread
+        """
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="review_event_buffer", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Used for stopping the background thread and writing what is left
+        """
+        self._stopped.set()
+        self._wake_up.set()
+
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+        self.flush()
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            self._wake_up.wait(self.flush_interval)
+            self._wake_up.clear()
+            self.flush()
@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import datetime
+from typing import List, Tuple
+
+import numpy as np
+
+MIN_GRADE = 0
+MAX_GRADE = 5
+PASSING_GRADE = 3
+MIN_EASE_FACTOR = 1.3
+DEFAULT_EASE_FACTOR = 2.5
+
+
+class Scheduler:
+    """
+    SM-2 spaced repetition.
+    A review is graded from 0 (forgot) to 5 (perfect). A passed card is shown again
+    after 1 day, then 6 days, then the previous interval times the ease factor.
+    A failed card starts over. All reviews of a batch are computed at once.
+    """
+
+    @staticmethod
+    def schedule(
+            repetitions: np.ndarray,
+            interval_days: np.ndarray,
+            ease_factors: np.ndarray,
+            grades: np.ndarray,
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Used for getting the next state of reviewed cards
+        :param repetitions: the amount of passed reviews in a row of every card
+        :param interval_days: the current interval of every card
+        :param ease_factors: the current ease factor of every card
+        :param grades: the grade of every review
+        :return: tuple of the new repetitions, interval_days and ease_factors
+        """
+        repetitions = np.asarray(repetitions, dtype=np.int64)
+        interval_days = np.asarray(interval_days, dtype=np.float64)
+        ease_factors = np.asarray(ease_factors, dtype=np.float64)
+        grades = np.clip(np.asarray(grades, dtype=np.int64), MIN_GRADE, MAX_GRADE)
+
+        is_passed = grades >= PASSING_GRADE
+
+        passed_interval_days = np.select(
+            [repetitions == 0, repetitions == 1],
+            [1.0, 6.0],
+            default=np.round(interval_days * ease_factors),
+        )
+        new_interval_days = np.where(is_passed, passed_interval_days, 1.0)
+        new_repetitions = np.where(is_passed, repetitions + 1, 0)
+
+        missed_points = MAX_GRADE - grades
+        new_ease_factors = np.maximum(
+            ease_factors + 0.1 - missed_points * (0.08 + missed_points * 0.02),
+            MIN_EASE_FACTOR,
+        )
+
+        return new_repetitions, new_interval_days, new_ease_factors
+
+    @staticmethod
+    def due_times(now: datetime.datetime, interval_days: np.ndarray) -> List[datetime.datetime]:
+        """
+        Used for getting when cards are due again
+        :param now: the time of the review
+        :param interval_days: the interval of every card
+        :return: list of due times
+        """
+        interval_seconds = np.round(np.asarray(interval_days, dtype=np.float64) * 86400).astype("timedelta64[s]")
+
+        return (np.datetime64(now, "s") + interval_seconds).tolist()
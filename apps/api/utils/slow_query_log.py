@@ -0,0 +1,242 @@
+from __future__ import annotations
+
+import datetime
+import heapq
+import itertools
+import random
+import re
+import sys
+import threading
+from os import environ
+from typing import Any, Dict, List, Optional
+
+from loguru import logger
+from psycopg2.extensions import cursor, TRANSACTION_STATUS_INTRANS
+
+from utils.query_registry import QueryRegistry
+
+MAX_LOGGED_QUERY_LENGTH = 2000
+
+_execute_pattern = re.compile(r"^EXECUTE (\w+)")
+_whitespace_pattern = re.compile(r"\s+")
+_values_pattern = re.compile(r"\bVALUES\s*(?=\()", re.IGNORECASE)
+_string_literal_pattern = re.compile(r"'(?:[^']|'')*'")
+_database_modules = ("controllers.controller_database", "controllers.controller_database_async")
+
+
+class SlowQueryLog:
+    """
+    Logs the queries that take longer than threshold seconds and keeps the top_n slowest in memory.
+    A share of the slow read queries, explain_rate, is run again with EXPLAIN (ANALYZE, BUFFERS)
+    in a savepoint of the same transaction, and the plan is logged with it.
+    """
+
+    threshold = float(environ.get("SLOW_QUERY_THRESHOLD_MS", 500)) / 1000
+    explain_rate = float(environ.get("SLOW_QUERY_EXPLAIN_RATE", 0.1))
+    top_n = int(environ.get("SLOW_QUERY_TOP_N", 20))
+
+    _slowest: List[tuple] = []
+    _counter = itertools.count()
+    _lock = threading.Lock()
+
+    @staticmethod
+    def record(cur: cursor, query: Any, parameters: Any, duration: float) -> None:
+        """
+        Used by the database cursor for a query that took longer than the threshold
+        :param cur: the cursor that ran the query
+        :param query: the query
+        :param parameters: the parameters of the query
+        :param duration: the seconds the query took
+        """
+        query_str = query.decode("utf-8", "replace") if isinstance(query, bytes) else str(query)
+        logged_query_str = query_str
+        plan = None
+
+        # Queries like the ones of execute_values have their values in the query itself
+        if parameters is None:
+            logged_query_str = SlowQueryLog.redact_query(query_str)
+
+        if random.random() < SlowQueryLog.explain_rate and logged_query_str == query_str \
+                and SlowQueryLog._is_read_only(cur, query_str):
+            plan = SlowQueryLog._explain(cur, query_str, parameters)
+
+        entry = {
+            "method": SlowQueryLog._calling_method(),
+            "query": _whitespace_pattern.sub(" ", logged_query_str).strip()[:MAX_LOGGED_QUERY_LENGTH],
+            "parameters": SlowQueryLog.redact(parameters),
+            "duration_ms": round(duration * 1000, 2),
+            "time": datetime.datetime.utcnow().isoformat(),
+            "plan": plan,
+        }
+
+        logger.warning(
+            f"Slow query in {entry['method']} took {entry['duration_ms']} ms: "
+            f"{entry['query']} parameters: {entry['parameters']}"
+            + (f"\n{plan}" if plan else "")
+        )
+
+        with SlowQueryLog._lock:
+            item = (duration, next(SlowQueryLog._counter), entry)
+            if len(SlowQueryLog._slowest) < SlowQueryLog.top_n:
+                heapq.heappush(SlowQueryLog._slowest, item)
+            elif SlowQueryLog._slowest and duration > SlowQueryLog._slowest[0][0]:
+                heapq.heapreplace(SlowQueryLog._slowest, item)
+
+    @staticmethod
+    def slowest() -> List[Dict]:
+        """
+        Used for getting the slowest queries since the server started
+        :return: list of the logged entries, the slowest first
+        """
+        with SlowQueryLog._lock:
+            items = sorted(SlowQueryLog._slowest, reverse=True)
+
+        return [entry for _, _, entry in items]
+
+    @staticmethod
+    def redact(parameters: Any) -> Any:
+        """
+        Used for hiding the values of query parameters that could be personal or secret.
+        Numbers, booleans, dates and None are kept, strings and collections only keep their length
+        :param parameters: a dictionary or sequence of parameters
+        :return: the redacted parameters
+        """
+        if isinstance(parameters, dict):
+            return {name: SlowQueryLog._redact_value(value) for name, value in parameters.items()}
+
+        if isinstance(parameters, (list, tuple)) and not isinstance(parameters, str):
+            return [SlowQueryLog._redact_value(value) for value in parameters]
+
+        return SlowQueryLog._redact_value(parameters)
+
+    @staticmethod
+    def redact_query(query_str: str) -> str:
+        """
+        Used for hiding the values that are written in the query itself.
+        VALUES lists only keep their row count and string literals are replaced
+        :param query_str: the query
+        :return: the redacted query
+        """
+        parts = []
+        position = 0
+
+        for match in _values_pattern.finditer(query_str):
+            if match.start() < position:
+                continue
+
+            end = match.end()
+            row_count = 0
+            while end < len(query_str) and query_str[end] == "(":
+                end = SlowQueryLog._skip_parentheses(query_str, end)
+                row_count += 1
+
+                next_row = len(query_str) - len(query_str[end:].lstrip())
+                if query_str[next_row:next_row + 1] != ",":
+                    break
+                next_row += 1
+                next_row = len(query_str) - len(query_str[next_row:].lstrip())
+                if query_str[next_row:next_row + 1] != "(":
+                    break
+                end = next_row
+
+            parts.append(query_str[position:match.end()])
+            parts.append(f"<{row_count} rows> ")
+            position = end
+
+        parts.append(query_str[position:])
+
+        return _string_literal_pattern.sub("'?'", "".join(parts))
+
+    @staticmethod
+    def _skip_parentheses(query_str: str, start: int) -> int:
+        """
+        :return: the position after the parenthesis that closes the one at start, ignoring string literals
+        """
+        depth = 0
+        is_in_string = False
+
+        for position in range(start, len(query_str)):
+            character = query_str[position]
+
+            if character == "'":
+                is_in_string = not is_in_string
+            elif not is_in_string and character == "(":
+                depth += 1
+            elif not is_in_string and character == ")":
+                depth -= 1
+                if depth == 0:
+                    return position + 1
+
+        return len(query_str)
+
+    @staticmethod
+    def _redact_value(value: Any) -> Any:
+        if value is None or isinstance(value, (bool, int, float, datetime.date)):
+            return value
+
+        if isinstance(value, (str, bytes)):
+            return f"<{type(value).__name__} of {len(value)}>"
+
+        if isinstance(value, (list, tuple, set, dict)):
+            return f"<{type(value).__name__} of {len(value)}>"
+
+        return f"<{type(value).__name__}>"
+
+    @staticmethod
+    def _calling_method() -> str:
+        """
+        :return: the name of the ControllerDatabase or AsyncControllerDatabase method that ran the query
+        """
+        frame = sys._getframe(1)
+
+        while frame is not None:
+            if frame.f_globals.get("__name__") in _database_modules:
+                return frame.f_code.co_name
+            frame = frame.f_back
+
+        return "unknown"
+
+    @staticmethod
+    def _is_read_only(cur: cursor, query_str: str) -> bool:
+        """
+        Only plain SELECT queries are run again, running a write twice would change data
+        """
+        if cur.name is not None or cur.connection.get_transaction_status() != TRANSACTION_STATUS_INTRANS:
+            return False
+
+        query_str = query_str.lstrip(" (\n").upper()
+        match = _execute_pattern.match(query_str)
+
+        if match:
+            query_str = QueryRegistry.query_str(match.group(1).lower()).upper()
+
+        return query_str.startswith("SELECT")
+
+    @staticmethod
+    def _explain(cur: cursor, query_str: str, parameters: Any) -> Optional[str]:
+        """
+        Used for getting the plan of a query, in a savepoint so a failure
+        does not abort the transaction of the query.
+        Never raises, so it can not fail the query it explains
+        :return: the plan, or None if it could not be made
+        """
+        result = None
+        is_savepoint_created = False
+
+        try:
+            with cur.connection.cursor(cursor_factory=cursor) as explain_cur:
+                try:
+                    explain_cur.execute("SAVEPOINT slow_query_explain")
+                    is_savepoint_created = True
+                    explain_cur.execute(f"EXPLAIN (ANALYZE, BUFFERS) {query_str}", parameters)
+                    result = "\n".join(line for (line, ) in explain_cur.fetchall())
+                    explain_cur.execute("RELEASE SAVEPOINT slow_query_explain")
+                except Exception as e:
+                    logger.warning(f"Could not explain a slow query: {e}")
+                    result = None
+                    if is_savepoint_created:
+                        explain_cur.execute("ROLLBACK TO SAVEPOINT slow_query_explain")
+        except Exception as e:
+            logger.warning(f"Could not explain a slow query: {e}")
+
+        return result
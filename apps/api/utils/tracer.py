@@ -0,0 +1,213 @@
+from __future__ import annotations
+
+import functools
+import inspect
+import json
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from os import environ
+from typing import Callable, Deque, Dict, Iterator, List, Optional
+
+from loguru import logger
+
+
+class Span:
+    """
+    One timed operation of a trace, for example a ControllerDatabase call
+    """
+
+    __slots__ = ("trace", "span_id", "parent_id", "name", "start_time", "duration", "row_count", "query_count")
+
+    def __init__(self, trace: Trace, name: str, parent_id: Optional[str]):
+        self.trace = trace
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.name = name
+        self.start_time = time.perf_counter()
+        self.duration = 0.0
+        self.row_count = 0
+        self.query_count = 0
+
+    def finish(self) -> None:
+        self.duration = time.perf_counter() - self.start_time
+        self.trace.add(self)
+
+    def to_dict(self) -> Dict:
+        return {
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ms": round((self.start_time - self.trace.start_time) * 1000, 3),
+            "duration_ms": round(self.duration * 1000, 3),
+            "row_count": self.row_count,
+            "query_count": self.query_count,
+        }
+
+
+class Trace:
+    """
+    The finished spans of one sampled request
+    """
+
+    def __init__(self):
+        self.trace_id = uuid.uuid4().hex
+        self.start_time = time.perf_counter()
+        self.time = time.time()
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def add(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def to_dict(self) -> Dict:
+        """
+        :return: {
+            "trace_id": str,
+            "time": the unix time the request started,
+            "spans": the spans ordered by their start, with start_ms relative to the request start,
+        }
+        """
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span.start_time)
+
+        return {
+            "trace_id": self.trace_id,
+            "time": self.time,
+            "spans": [span.to_dict() for span in spans],
+        }
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+class Tracer:
+    """
+    Records spans of a sample of requests, nested under a root span per request.
+    Requests that are not sampled only cost a context variable lookup per span.
+    The latest traces are kept in memory and are also appended to file as JSON lines when it is set
+    """
+
+    sample_rate = float(environ.get("TRACE_SAMPLE_RATE", 0.01))
+    file = environ.get("TRACE_FILE", "")
+    max_traces = int(environ.get("TRACE_MAX_TRACES", 100))
+
+    _traces: Deque[Dict] = deque(maxlen=max_traces)
+    _lock = threading.Lock()
+
+    @staticmethod
+    @contextmanager
+    def request(name: str, is_forced: bool = False) -> Iterator[Optional[Span]]:
+        """
+        Used for the root span of a request
+        :param name: the name of the root span
+        :param is_forced: if the request is traced regardless of the sample rate
+        :return: the root span, or None if the request is not sampled
+        """
+        if not is_forced and random.random() >= Tracer.sample_rate:
+            yield None
+            return
+
+        root_span = Span(Trace(), name, None)
+        token = _current_span.set(root_span)
+
+        try:
+            yield root_span
+        finally:
+            _current_span.reset(token)
+            root_span.finish()
+            Tracer._export(root_span.trace)
+
+    @staticmethod
+    @contextmanager
+    def span(name: str) -> Iterator[Optional[Span]]:
+        """
+        Used for a span nested in the current span
+        :param name: the name of the span
+        :return: the span, or None if the request is not sampled
+        """
+        parent_span = _current_span.get()
+
+        if parent_span is None:
+            yield None
+            return
+
+        span = Span(parent_span.trace, name, parent_span.span_id)
+        token = _current_span.set(span)
+
+        try:
+            yield span
+        finally:
+            _current_span.reset(token)
+            span.finish()
+
+    @staticmethod
+    def traced(func: Callable) -> Callable:
+        """
+        Used for wrapping a function so every call is a span named after it.
+        The span of a coroutine function lasts until the coroutine is done
+        :param func: the function
+        :return: the wrapped function
+        """
+        name = func.__qualname__
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if _current_span.get() is None:
+                    return await func(*args, **kwargs)
+
+                with Tracer.span(name):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _current_span.get() is None:
+                return func(*args, **kwargs)
+
+            with Tracer.span(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    @staticmethod
+    def record_query(row_count: int) -> None:
+        """
+        Used by the database layer for every query it runs
+        :param row_count: the rows the query returned or changed, -1 if unknown
+        """
+        span = _current_span.get()
+
+        if span is not None:
+            span.query_count += 1
+            span.row_count += max(row_count, 0)
+
+    @staticmethod
+    def traces() -> List[Dict]:
+        """
+        :return: the latest traces, newest first
+        """
+        with Tracer._lock:
+            return list(reversed(Tracer._traces))
+
+    @staticmethod
+    def _export(trace: Trace) -> None:
+        trace_dict = trace.to_dict()
+
+        with Tracer._lock:
+            Tracer._traces.append(trace_dict)
+
+            if Tracer.file:
+                try:
+                    with open(Tracer.file, "a") as file:
+                        for span in trace_dict["spans"]:
+                            file.write(json.dumps({"trace_id": trace.trace_id, "time": trace.time, **span}) + "\n")
+                except Exception as e:
+                    logger.exception(e)
@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+
+
+class TtlCache:
+    """
+    A thread safe, size bounded cache whose entries expire.
+    When the cache is full, the least recently used entry is dropped.
+    """
+    _missing = object()
+
+    def __init__(self, max_size: int = 10000, ttl: float = 60):
+        """
+        :param max_size: max amount of entries
+        :param ttl: default amount of seconds an entry is valid for
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+
+        self._entries: OrderedDict[Hashable, Tuple[Any, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Used for getting a cached value
+        :param key: the key of the value
+        :param default: returned if the key is not cached or expired
+        :return: the cached value
+        """
+        with self._lock:
+            value, expires = self._entries.get(key, (self._missing, 0.0))
+
+            if value is self._missing:
+                return default
+
+            if expires < time.monotonic():
+                del self._entries[key]
+                return default
+
+            self._entries.move_to_end(key)
+
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """
+        Used for caching a value
+        :param key: the key of the value
+        :param value: the value
+        :param ttl: amount of seconds the value is valid for, the cache ttl if not given
+        """
+        if ttl is None:
+            ttl = self.ttl
+
+        if ttl <= 0 or self.max_size <= 0:
+            return
+
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        """
+        Used for removing a value from the cache
+        :param key: the key of the value
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+import datetime
+import threading
+from typing import Callable, Dict, List, Tuple
+
+from loguru import logger
+
+XpCounts = Dict[Tuple[int, datetime.date], int]
+UserXpCounts = Dict[int, Dict[datetime.date, int]]
+
+
+class XpBuffer:
+    """
+    Collects xp increments in memory and writes them in bulk.
+    Increments are summed per user and day, and flushed by a background thread
+    every flush_interval seconds or as soon as flush_size users and days are waiting.
+    """
+
+    def __init__(
+            self,
+            flush: Callable[[XpCounts], bool],
+            flush_interval: float = 5,
+            flush_size: int = 1000,
+            max_size: int = 50000,
+    ):
+        """
+        :param flush: function that writes the xp counts, returns bool of weather or not it was successful
+        :param flush_interval: max amount of seconds an increment waits before being written
+        :param flush_size: amount of users and days that triggers an early flush
+        :param max_size: amount of users and days after which add refuses new increments
+        """
+        self._flush = flush
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.max_size = max_size
+
+        self._pending: UserXpCounts = {}
+        self._pending_size = 0
+        self._flushing: UserXpCounts = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake_up = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def add(self, user_id: int, xp_count: int, day: datetime.date = None) -> bool:
+        """
+        Used for buffering xp a user earned. Never blocks on the database
+        :param user_id: the id of the user
+        :param xp_count: the amount of xp earned
+        :param day: the day the xp was earned on, today if not given
+        :return: False if the buffer is full and the xp must be written directly
+        """
+        day = day or datetime.datetime.now().date()
+
+        with self._lock:
+            user_pending = self._pending.get(user_id, {})
+
+            if day not in user_pending:
+                if self._pending_size >= self.max_size:
+                    self._wake_up.set()
+                    return False
+                self._pending_size += 1
+                self._pending[user_id] = user_pending
+
+            user_pending[day] = user_pending.get(day, 0) + xp_count
+
+            if self._pending_size >= self.flush_size:
+                self._wake_up.set()
+
+        return True
+
+    def pending(self, user_id: int) -> Dict[datetime.date, int]:
+        """
+        Used for getting the xp of a user that is not yet in the database,
+        so reads can add it to what they fetched
+        :param user_id: the id of the user
+        :return: a dictionary of days and the xp earned on them
+        """
+        result = {}
+
+        with self._lock:
+            for counts in (self._flushing, self._pending):
+                for day, xp_count in counts.get(user_id, {}).items():
+                    result[day] = result.get(day, 0) + xp_count
+
+        return result
+
+    def pending_user_ids(self, since: datetime.date) -> List[int]:
+        """
+        Used for finding the users whose totals are still going to change,
+        so reads that rank users can include them
+        :param since: the earliest day that counts
+        :return: a list of ids of users with buffered xp on or after the day
+        """
+        with self._lock:
+            return list({
+                user_id
+                for counts in (self._flushing, self._pending)
+                for user_id, user_counts in counts.items()
+                if any(day >= since for day in user_counts)
+            })
+
+    def flush(self) -> bool:
+        """
+        Used for writing every buffered increment.
+        If the write fails, the increments are put back into the buffer
+        :return: bool of weather or not the write was successful
+        """
+        with self._flush_lock:
+            with self._lock:
+                self._flushing, self._pending = self._pending, {}
+                self._pending_size = 0
+
+            xp_counts = {
+                (user_id, day): xp_count
+                for user_id, user_flushing in self._flushing.items()
+                for day, xp_count in user_flushing.items()
+            }
+
+            if not xp_counts:
+                return True
+
+            is_successful = False
+            try:
+                is_successful = self._flush(xp_counts)
+            except Exception as e:
+                logger.exception(e)
+
+            with self._lock:
+                if not is_successful:
+                    for (user_id, day), xp_count in xp_counts.items():
+                        user_pending = self._pending.setdefault(user_id, {})
+                        if day not in user_pending:
+                            self._pending_size += 1
+                        user_pending[day] = user_pending.get(day, 0) + xp_count
+                self._flushing = {}
+
+        return is_successful
+
+    def start(self) -> None:
+        """
+        Used for starting the background flush thread
+        """
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="xp_buffer", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Used for stopping the background thread and writing what is left
+        """
+        self._stopped.set()
+        self._wake_up.set()
+
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+        self.flush()
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            self._wake_up.wait(self.flush_interval)
+            self._wake_up.clear()
+            self.flush()
@@ -21,16 +21,24 @@ export function Index() {
   const router = useRouter();
 
   const { data: decks } = useQuery(['decks'], async () => {
-    const body = new FormData();
-    body.append('user_uuid', '5e67adbd-8941-421a-adb7-a8e9a78b8b24');
-    body.append('requester_user_uuid', '5e67adbd-8941-421a-adb7-a8e9a78b8b24');
-    const { data } = await axios.post<
-      unknown,
-      AxiosResponse<{ decks: Deck[] }>
-    >(`${HOST}/get_user_decks`, body, {
-      headers: { 'Content-Type': 'multipart/form-data' },
-    });
-    return data['decks'];
+    // The decks come in pages, next_cursor is empty after the last one
+    const decks: Deck[] = [];
+    let cursor = '';
+    do {
+      const body = new FormData();
+      body.append('user_uuid', '5e67adbd-8941-421a-adb7-a8e9a78b8b24');
+      body.append('requester_user_uuid', '5e67adbd-8941-421a-adb7-a8e9a78b8b24');
+      body.append('cursor', cursor);
+      const { data } = await axios.post<
+        unknown,
+        AxiosResponse<{ decks: Deck[]; next_cursor: string }>
+      >(`${HOST}/get_user_decks`, body, {
+        headers: { 'Content-Type': 'multipart/form-data' },
+      });
+      decks.push(...data['decks']);
+      cursor = data['next_cursor'];
+    } while (cursor);
+    return decks;
   });
 
   const deckOpenUUID = useMemo(() => {